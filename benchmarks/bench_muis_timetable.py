@@ -0,0 +1,55 @@
+"""
+Benchmark: indexed MUIS timetable vs. scanning the CSV on every lookup
+
+Run with:
+    python -m benchmarks.bench_muis_timetable
+"""
+
+import csv
+import os
+import random
+import timeit
+from datetime import date, timedelta
+
+# bot.utils imports config, which requires a token to be set
+os.environ.setdefault("API_TOKEN", "benchmark")
+
+from bot.utils.muis_prayer_csv import MUIS_CSV_PATH, MuisTimetable, row_to_timings  # noqa: E402
+
+ITERATIONS = 2000
+
+
+def legacy_scan(day: date):
+    """Previous implementation: open the CSV and scan it for every lookup"""
+    date_str = day.strftime("%Y-%m-%d")
+    with open(MUIS_CSV_PATH, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            if row['Date'] == date_str:
+                return row_to_timings(row)
+    return None
+
+
+def main():
+    store = MuisTimetable()
+    load_time = timeit.timeit(store.load, number=1)
+
+    start = date(2026, 1, 1)
+    days = [start + timedelta(days=random.randrange(365)) for _ in range(ITERATIONS)]
+
+    # Sanity check: both paths must agree
+    for day in days[:50]:
+        assert legacy_scan(day) == store.get(day), day
+
+    scan_time = timeit.timeit(lambda: [legacy_scan(d) for d in days], number=1)
+    index_time = timeit.timeit(lambda: [store.get(d) for d in days], number=1)
+    range_time = timeit.timeit(lambda: store.get_range(start, start + timedelta(days=30)), number=ITERATIONS)
+
+    print(f"Timetable load (once):     {load_time * 1e3:9.3f} ms")
+    print(f"CSV scan per lookup:       {scan_time / ITERATIONS * 1e6:9.2f} us")
+    print(f"Indexed lookup:            {index_time / ITERATIONS * 1e6:9.2f} us")
+    print(f"Indexed 31-day range:      {range_time / ITERATIONS * 1e6:9.2f} us")
+    print(f"Speedup (single day):      {scan_time / index_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Validate and benchmark the offline prayer time engine
+
+Compares bot.utils.prayer_calc against:
+- the official MUIS timetable (MUIS angles), and
+- recorded Aladhan responses (method 3 / MWL): either calendarByCity JSON
+  files given on the command line, or the persisted prayer times cache,
+  which stores real Aladhan answers with each city's coordinates and timezone
+
+Run with:
+    python -m benchmarks.validate_prayer_calc [aladhan_calendar.json ...]
+"""
+
+import json
+import os
+import sys
+import timeit
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# bot.utils imports config, which requires a token to be set
+os.environ.setdefault("API_TOKEN", "benchmark")
+
+from config import PRAYER_CACHE_PATH  # noqa: E402
+from bot.utils.muis_prayer_csv import MuisTimetable  # noqa: E402
+from bot.utils.prayer_calc import (  # noqa: E402
+    MUIS, MWL, SINGAPORE_COORDINATES, calculate_calendars, compute_prayer_times, date_range, utc_offset_table
+)
+
+PRAYERS = ('Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Maghrib', 'Isha')
+
+# Maximum allowed difference in minutes
+MUIS_TOLERANCE = 2
+ALADHAN_TOLERANCE = 1
+
+BENCH_CITIES = 5000
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(" ")[0].split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _report(title: str, diffs: dict, tolerance: int) -> bool:
+    print(f"\n{title}")
+    ok = True
+    for prayer in PRAYERS:
+        values = np.array(diffs.get(prayer, []))
+        if not len(values):
+            continue
+        # Times wrap around midnight in rare high-latitude cases
+        values = (values + 720) % 1440 - 720
+        worst = int(np.abs(values).max())
+        ok &= worst <= tolerance
+        print(
+            f"  {prayer:<8} n={len(values):<6} exact={np.mean(values == 0):6.1%} "
+            f"within 1 min={np.mean(np.abs(values) <= 1):6.1%} max={worst} min"
+        )
+    print(f"  {'PASS' if ok else 'FAIL'} (tolerance {tolerance} min)")
+    return ok
+
+
+def validate_muis() -> bool:
+    store = MuisTimetable()
+    if not store.load():
+        print("MUIS timetable not available, skipping")
+        return True
+    index = store._index
+    days = sorted(index)
+    calendar = calculate_calendars([SINGAPORE_COORDINATES], days, MUIS)[0]
+
+    diffs = defaultdict(list)
+    for day in days:
+        for prayer in PRAYERS:
+            diffs[prayer].append(_minutes(index[day][prayer]) - _minutes(calendar[day][prayer]))
+    return _report(f"MUIS timetable ({len(days)} days)", diffs, MUIS_TOLERANCE)
+
+
+def _recorded_from_files(paths):
+    """Yield (latitude, longitude, timezone, day, timings) from calendarByCity responses"""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for day_data in data["data"]:
+            meta = day_data["meta"]
+            day = datetime.strptime(day_data["date"]["gregorian"]["date"], "%d-%m-%Y").date()
+            yield float(meta["latitude"]), float(meta["longitude"]), meta["timezone"], day, day_data["timings"]
+
+
+def _recorded_from_cache(path):
+    """Yield (latitude, longitude, timezone, day, timings) from the persisted prayer times cache"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    cities = {(city, country): info for city, country, info in data.get("cities", [])}
+    for city, country, day, entry in data.get("entries", []):
+        info = cities.get((city, country))
+        if not info or info.get("latitude") is None or info.get("longitude") is None:
+            continue
+        yield (
+            float(info["latitude"]), float(info["longitude"]), info["timezone"],
+            date.fromisoformat(day), entry["timings"],
+        )
+
+
+def validate_aladhan(paths) -> bool:
+    records = list(_recorded_from_files(paths) if paths else _recorded_from_cache(PRAYER_CACHE_PATH))
+    if not records:
+        print("\nNo recorded Aladhan responses found, skipping")
+        return True
+
+    diffs = defaultdict(list)
+    for latitude, longitude, timezone, day, timings in records:
+        calculated = calculate_calendars([(latitude, longitude, timezone)], [day], MWL)[0][day]
+        for prayer in PRAYERS:
+            if prayer in timings:
+                diffs[prayer].append(_minutes(timings[prayer]) - _minutes(calculated[prayer]))
+    source = ", ".join(paths) if paths else PRAYER_CACHE_PATH
+    return _report(f"Recorded Aladhan responses ({len(records)} city-days from {source})", diffs, ALADHAN_TOLERANCE)
+
+
+def benchmark():
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-55, 60, BENCH_CITIES)
+    longitudes = rng.uniform(-180, 180, BENCH_CITIES)
+    days = date_range(date(2026, 1, 1), date(2026, 12, 31))
+    offsets = np.round(longitudes / 15)[:, None]
+
+    elapsed = timeit.timeit(lambda: compute_prayer_times(latitudes, longitudes, days, offsets, MWL), number=1)
+    zones = ["Europe/London", "America/New_York", "Asia/Kolkata", "Australia/Sydney"] * 25
+    offset_time = timeit.timeit(lambda: utc_offset_table(zones, days), number=1)
+
+    print(f"\n{BENCH_CITIES} cities x {len(days)} days:  {elapsed * 1e3:9.1f} ms")
+    print(f"Per city-day:                  {elapsed / (BENCH_CITIES * len(days)) * 1e9:9.1f} ns")
+    print(f"Offset table (100 x 365):      {offset_time * 1e3:9.1f} ms")
+
+
+def main():
+    ok = validate_muis()
+    ok &= validate_aladhan(sys.argv[1:])
+    benchmark()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
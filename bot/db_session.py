@@ -0,0 +1,138 @@
+"""Lazily opened database sessions for update handlers
+
+Most updates (/wirdamm, /resources, /feedback, menus, the fallback text
+handler, callbacks that only edit a message) never touch the database.
+Handlers that do declare a `session` argument and get a LazySession: a
+stand-in for AsyncSession that only opens the real session on first use,
+and closes it after the handler returns - so the rest don't cost a session,
+a pool checkout or a rollback.
+
+Sessions opened and statements executed are counted per update and
+aggregated per handler for the admin /stats summary.
+"""
+
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import Router
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+import database.db
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UpdateUsage:
+    """Database use of one update"""
+    sessions: int = 0
+    statements: int = 0
+
+
+# Usage of the update being handled in the current task (statements run by tasks it spawns count too)
+_current_usage: ContextVar[Optional[UpdateUsage]] = ContextVar("db_update_usage", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.statements += 1
+
+
+class LazySession:
+    """AsyncSession stand-in that opens the session the first time it is used"""
+
+    def __init__(self, usage: UpdateUsage):
+        self._usage = usage
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = database.db.async_session_maker()
+            self._usage.sessions += 1
+        return getattr(self._session, name)
+
+    async def close(self):
+        """Close the session if it was opened"""
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+
+class SessionStats:
+    """Per-handler counts of updates, sessions and statements"""
+
+    def __init__(self):
+        self.updates = 0
+        self.updates_with_session = 0
+        self._handlers: Dict[str, Dict[str, int]] = {}
+
+    def record(self, handler: str, usage: UpdateUsage):
+        self.updates += 1
+        self.updates_with_session += usage.sessions > 0
+        counts = self._handlers.setdefault(handler, {"updates": 0, "sessions": 0, "statements": 0})
+        counts["updates"] += 1
+        counts["sessions"] += usage.sessions
+        counts["statements"] += usage.statements
+
+    def stats(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "updates": self.updates,
+            "updates_with_session": self.updates_with_session,
+        }
+        # Busiest database users first
+        ranked = sorted(self._handlers.items(), key=lambda item: item[1]["statements"], reverse=True)
+        for handler, counts in ranked:
+            if counts["sessions"]:
+                summary[handler] = (
+                    f"{counts['updates']} updates, {counts['sessions']} sessions, "
+                    f"{counts['statements'] / counts['updates']:.1f} statements/update"
+                )
+        return summary
+
+
+session_stats = SessionStats()
+register_metrics_source("db_sessions", session_stats.stats)
+
+
+def _handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    return getattr(callback, "__name__", "unknown")
+
+
+async def db_session_middleware(
+    handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any, data: Dict[str, Any]
+) -> Any:
+    """Inner middleware giving the handler a lazy session and recording its database use"""
+    usage = UpdateUsage()
+    token = _current_usage.set(usage)
+    session = LazySession(usage)
+    data["session"] = session
+    try:
+        return await handler(event, data)
+    finally:
+        try:
+            await session.close()
+        finally:
+            _current_usage.reset(token)
+            name = _handler_name(data)
+            session_stats.record(name, usage)
+            if usage.sessions:
+                logger.debug(f"{name}: {usage.sessions} sessions, {usage.statements} statements")
+
+
+def register_db_session_middleware(*routers: Router):
+    """Give every handler of the routers a lazy session (inner middleware: only matched handlers)"""
+    for router in routers:
+        for name, observer in router.observers.items():
+            if name != "error":
+                observer.middleware(db_session_middleware)
@@ -4,9 +4,8 @@ import logging
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import UserSettings
+from bot.utils.user_settings import update_user_settings, set_allahu_allah
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 logger = logging.getLogger(__name__)
@@ -101,16 +100,7 @@ async def callback_morning_adkar(callback: CallbackQuery, session: AsyncSession)
     bot: Bot = callback.bot
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.morning_adkar = enable
+        settings = await update_user_settings(session, user_id, morning_adkar=enable)
         await session.commit()
         
         # Reschedule immediately
@@ -141,16 +131,7 @@ async def callback_evening_adkar(callback: CallbackQuery, session: AsyncSession)
     bot: Bot = callback.bot
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.evening_adkar = enable
+        settings = await update_user_settings(session, user_id, evening_adkar=enable)
         await session.commit()
         
         # Reschedule immediately
@@ -181,16 +162,7 @@ async def callback_sleep_adkar(callback: CallbackQuery, session: AsyncSession):
     bot: Bot = callback.bot
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.sleep_adkar = enable
+        settings = await update_user_settings(session, user_id, sleep_adkar=enable)
         await session.commit()
         
         # Reschedule immediately
@@ -228,26 +200,21 @@ async def callback_allahu_allah(callback: CallbackQuery, session: AsyncSession):
     interval = interval_map[callback.data]
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
+        from bot.schedulers.interval_scheduler import next_phase, apply_interval_change
         
-        settings.allahu_allah_interval = interval
+        # The reminder cycle restarts at the next slot, then repeats every interval
+        phase = next_phase(interval) if interval else None
+        settings, previous = await set_allahu_allah(session, user_id, interval, phase)
         await session.commit()
         
-        # Reschedule immediately (this will also send immediate message if enabled)
+        # Make sure the user's phase slot has a job
         if _scheduler:
-            from bot.schedulers.adkar_scheduler import schedule_adkar_for_user
-            await schedule_adkar_for_user(_scheduler, bot, user_id, settings)
+            current = (interval, settings.allahu_allah_phase) if interval else None
+            await apply_interval_change(_scheduler, bot, user_id, previous, current)
         
         if interval:
             logger.info(f"Allahu Allah dhikr enabled for user {user_id} - every {interval} hours")
-            text = f"💝 *Allahu Allah Dhikr Enabled*\n\nYou have received your first reminder. You will continue to receive reminders every {interval} hours."
+            text = f"💝 *Allahu Allah Dhikr Enabled*\n\nYour first reminder arrives within the next few minutes, then every {interval} hours."
         else:
             logger.info(f"Allahu Allah dhikr disabled for user {user_id}")
             text = "❌ *Allahu Allah Dhikr Disabled*"
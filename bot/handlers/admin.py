@@ -1,20 +1,29 @@
 """Admin command handlers for broadcasting messages"""
 
+import asyncio
 import logging
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramAPIError
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User, BroadcastMessage
 from config import ADMIN_IDS
 from bot.security import verify_critical_operation_allowed, log_critical_operation
+from bot.metrics import format_metrics_summary
+from bot.utils.reminder_latency import reminder_latency, format_latency_summary
+from bot.utils.delivery_queue import delivery_queue, PRIORITY_BULK
+from bot.utils.bulk import iter_chunks
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Sends are submitted to the delivery queue this many at a time
+BROADCAST_BATCH_SIZE = 50
+
 
 class BroadcastStates(StatesGroup):
     """States for broadcast message flow"""
@@ -66,6 +75,46 @@ async def cancel_broadcast(message: Message, state: FSMContext):
     await message.answer("❌ Broadcast cancelled.")
 
 
+async def send_broadcast_copy(bot: Bot, message: Message, user_id: int) -> Message:
+    """Copy a broadcast message to one user through the delivery queue"""
+    if message.text:
+        return await delivery_queue.send_message(
+            bot, user_id, message.text,
+            parse_mode=message.parse_mode, priority=PRIORITY_BULK
+        )
+    if message.photo:
+        return await delivery_queue.send(
+            bot, "send_photo", user_id, photo=message.photo[-1].file_id,
+            caption=message.caption, parse_mode=message.parse_mode, priority=PRIORITY_BULK
+        )
+    if message.video:
+        return await delivery_queue.send(
+            bot, "send_video", user_id, video=message.video.file_id,
+            caption=message.caption, parse_mode=message.parse_mode, priority=PRIORITY_BULK
+        )
+    if message.document:
+        return await delivery_queue.send_document(
+            bot, user_id, message.document.file_id,
+            caption=message.caption, parse_mode=message.parse_mode, priority=PRIORITY_BULK
+        )
+    # Try to copy the message as-is
+    return await delivery_queue.send(
+        bot, "copy_message", user_id, from_chat_id=message.chat.id,
+        message_id=message.message_id, priority=PRIORITY_BULK
+    )
+
+
+async def update_progress(bot: Bot, progress_msg: Message, text: str):
+    """Edit a progress message - a failed edit is logged and doesn't stop the operation"""
+    try:
+        await delivery_queue.send(
+            bot, "edit_message_text", progress_msg.chat.id,
+            message_id=progress_msg.message_id, text=text
+        )
+    except TelegramAPIError as e:
+        logger.warning(f"Failed to update progress message: {e}")
+
+
 @router.message(BroadcastStates.waiting_for_message)
 async def process_broadcast_message(message: Message, state: FSMContext, session: AsyncSession, bot: Bot):
     """Process and send the broadcast message to all users"""
@@ -75,12 +124,12 @@ async def process_broadcast_message(message: Message, state: FSMContext, session
     
     await state.clear()
     
-    # Get all users
+    # Users the bot can still reach, paged in by id as the broadcast goes (see iter_chunks)
     try:
-        result = await session.execute(select(User))
-        users = result.scalars().all()
+        reachable = select(User.id).where(User.is_active == True)
+        total = await session.scalar(select(func.count()).select_from(reachable.subquery()))
         
-        if not users:
+        if not total:
             await message.answer("No users found in the database.")
             return
         
@@ -93,80 +142,60 @@ async def process_broadcast_message(message: Message, state: FSMContext, session
         session.add(broadcast_msg)
         await session.commit()
         
-        # Send message to all users
+        # Send message to all users through the rate-limited delivery queue
         success_count = 0
         failed_count = 0
         
         progress_msg = await message.answer(
-            f"📤 Broadcasting message to {len(users)} users...\n"
+            f"📤 Broadcasting message to {total} users...\n"
             f"✅ Success: 0\n"
             f"❌ Failed: 0"
         )
         
-        for idx, user in enumerate(users):
-            try:
-                # Copy the message to each user
-                if message.text:
-                    sent_msg = await bot.send_message(
-                        user.id,
-                        message.text,
-                        parse_mode=message.parse_mode
-                    )
-                elif message.photo:
-                    sent_msg = await bot.send_photo(
-                        user.id,
-                        message.photo[-1].file_id,
-                        caption=message.caption,
-                        parse_mode=message.parse_mode
-                    )
-                elif message.video:
-                    sent_msg = await bot.send_video(
-                        user.id,
-                        message.video.file_id,
-                        caption=message.caption,
-                        parse_mode=message.parse_mode
-                    )
-                elif message.document:
-                    sent_msg = await bot.send_document(
-                        user.id,
-                        message.document.file_id,
-                        caption=message.caption,
-                        parse_mode=message.parse_mode
-                    )
-                else:
-                    # Try to copy the message as-is
-                    sent_msg = await message.copy_to(user.id)
+        from database.models import BroadcastMessageRecipient
+        
+        progress = 0
+        async for batch in iter_chunks(reachable, User.id, BROADCAST_BATCH_SIZE):
+            results = await asyncio.gather(
+                *(send_broadcast_copy(bot, message, user.id) for user in batch),
+                return_exceptions=True
+            )
+            
+            for user, sent_msg in zip(batch, results):
+                if isinstance(sent_msg, Exception):
+                    logger.error(f"Failed to send broadcast to user {user.id}: {sent_msg}")
+                    failed_count += 1
+                    continue
                 
                 # Store the sent message ID for potential deletion later
-                from database.models import BroadcastMessageRecipient
-                recipient = BroadcastMessageRecipient(
+                session.add(BroadcastMessageRecipient(
                     broadcast_id=broadcast_msg.id,
                     user_id=user.id,
                     sent_message_id=sent_msg.message_id
-                )
-                session.add(recipient)
-                
+                ))
                 success_count += 1
-                
-                # Update progress every 10 users
-                if (idx + 1) % 10 == 0:
-                    await progress_msg.edit_text(
-                        f"📤 Broadcasting message to {len(users)} users...\n"
+            # Committed per batch so recipients aren't held in the session until the end
+            await session.commit()
+            
+            # Update progress once per batch
+            progress += len(batch)
+            if progress < total:
+                await update_progress(
+                    bot, progress_msg,
+                    (
+                        f"📤 Broadcasting message to {total} users...\n"
                         f"✅ Success: {success_count}\n"
                         f"❌ Failed: {failed_count}\n"
-                        f"Progress: {idx + 1}/{len(users)}"
+                        f"Progress: {progress}/{total}"
                     )
-                
-            except Exception as e:
-                logger.error(f"Failed to send broadcast to user {user.id}: {e}")
-                failed_count += 1
+                )
         
         await session.commit()
         
         # Final report
         await progress_msg.edit_text(
             f"✅ *Broadcast Complete*\n\n"
-            f"Total users: {len(users)}\n"
+            f"Total users: {total}\n"
             f"✅ Successfully sent: {success_count}\n"
             f"❌ Failed: {failed_count}\n\n"
             f"Broadcast ID: `{broadcast_msg.id}`\n"
@@ -218,40 +247,51 @@ async def cmd_delete_broadcast(message: Message, session: AsyncSession, bot: Bot
             await message.answer(f"❌ Broadcast with ID {broadcast_id} not found.")
             return
         
-        # Get all recipients
-        result = await session.execute(
-            select(BroadcastMessageRecipient).where(
-                BroadcastMessageRecipient.broadcast_id == broadcast_id
-            )
-        )
-        recipients = result.scalars().all()
+        # Recipients are paged in by id as the deletion goes (see iter_chunks)
+        recipients = select(
+            BroadcastMessageRecipient.id, BroadcastMessageRecipient.user_id, BroadcastMessageRecipient.sent_message_id
+        ).where(BroadcastMessageRecipient.broadcast_id == broadcast_id)
+        total = await session.scalar(select(func.count()).select_from(recipients.subquery()))
         
         # Delete messages from all users
         deleted_count = 0
         failed_count = 0
         
         progress_msg = await message.answer(
-            f"🗑️ Deleting broadcast from {len(recipients)} users...\n"
+            f"🗑️ Deleting broadcast from {total} users...\n"
             f"✅ Deleted: 0\n"
             f"❌ Failed: 0"
         )
         
-        for idx, recipient in enumerate(recipients):
-            try:
-                await bot.delete_message(recipient.user_id, recipient.sent_message_id)
-                deleted_count += 1
-                
-                # Update progress every 10 deletions
-                if (idx + 1) % 10 == 0:
-                    await progress_msg.edit_text(
-                        f"🗑️ Deleting broadcast from {len(recipients)} users...\n"
+        progress = 0
+        async for batch in iter_chunks(recipients, BroadcastMessageRecipient.id, BROADCAST_BATCH_SIZE):
+            results = await asyncio.gather(
+                *(delivery_queue.send(
+                    bot, "delete_message", recipient.user_id,
+                    message_id=recipient.sent_message_id, priority=PRIORITY_BULK
+                ) for recipient in batch),
+                return_exceptions=True
+            )
+            
+            for recipient, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to delete message for user {recipient.user_id}: {result}")
+                    failed_count += 1
+                else:
+                    deleted_count += 1
+            
+            # Update progress once per batch
+            progress += len(batch)
+            if progress < total:
+                await update_progress(
+                    bot, progress_msg,
+                    (
+                        f"🗑️ Deleting broadcast from {total} users...\n"
                         f"✅ Deleted: {deleted_count}\n"
                         f"❌ Failed: {failed_count}\n"
-                        f"Progress: {idx + 1}/{len(recipients)}"
+                        f"Progress: {progress}/{total}"
                     )
-            except Exception as e:
-                logger.error(f"Failed to delete message for user {recipient.user_id}: {e}")
-                failed_count += 1
+                )
         
         # Mark broadcast as deleted
         broadcast.is_deleted = True
@@ -260,7 +300,7 @@ async def cmd_delete_broadcast(message: Message, session: AsyncSession, bot: Bot
         # Final report
         await progress_msg.edit_text(
             f"✅ *Broadcast Deletion Complete*\n\n"
-            f"Total recipients: {len(recipients)}\n"
+            f"Total recipients: {total}\n"
             f"✅ Successfully deleted: {deleted_count}\n"
             f"❌ Failed: {failed_count}",
             parse_mode="Markdown"
@@ -308,3 +348,23 @@ async def cmd_list_broadcasts(message: Message, session: AsyncSession):
     except Exception as e:
         logger.error(f"Error listing broadcasts: {e}")
         await message.answer("❌ An error occurred while listing broadcasts.")
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Show runtime metrics (delivery queue, etc.) - Admin only"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ This command is only available to administrators.")
+        return
+    
+    await message.answer(format_metrics_summary(), parse_mode="Markdown")
+
+
+@router.message(Command("latency"))
+async def cmd_latency(message: Message):
+    """Show reminder delivery lateness percentiles per reminder type - Admin only"""
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ This command is only available to administrators.")
+        return
+    
+    await message.answer(format_latency_summary(reminder_latency.summary()), parse_mode="Markdown")
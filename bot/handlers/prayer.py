@@ -7,16 +7,40 @@ from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Location
-from sqlalchemy import select
+from aiogram import Bot
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import UserSettings
 from bot.utils.prayer_api import get_prayer_times
 from bot.utils.mosque_finder import find_nearby_mosques
+from bot.utils.http_client import http_client
+from bot.utils.user_settings import get_user_settings, update_user_settings
+from bot.utils.settings_cache import SettingsSnapshot
 from config import DEFAULT_CITY, DEFAULT_COUNTRY
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Global scheduler reference (will be set during initialization)
+_scheduler: AsyncIOScheduler = None
+
+def set_scheduler(scheduler: AsyncIOScheduler):
+    """Set the scheduler reference for use in handlers"""
+    global _scheduler
+    _scheduler = scheduler
+
+
+async def reschedule_location_reminders(bot: Bot, settings: SettingsSnapshot):
+    """Apply a location or reminder change to the user's city group jobs"""
+    if not _scheduler:
+        return
+    try:
+        from bot.schedulers.prayer_scheduler import schedule_user_prayer_reminders
+        from bot.schedulers.adkar_scheduler import schedule_user_adkar_groups
+        await schedule_user_prayer_reminders(_scheduler, bot, settings.user_id)
+        await schedule_user_adkar_groups(_scheduler, bot, settings)
+    except Exception as e:
+        logger.error(f"Error rescheduling reminders for user {settings.user_id}: {e}")
+
 
 def format_prayer_time(time_24h: str) -> str:
     """
@@ -46,11 +70,8 @@ async def cmd_prayer_times(message: Message, session: AsyncSession):
     """Handle /prayertimes command"""
     user_id = message.from_user.id
     
-    # Get user's city/country settings
-    result = await session.execute(
-        select(UserSettings).where(UserSettings.user_id == user_id)
-    )
-    settings = result.scalar_one_or_none()
+    # Get user's city/country settings (cached)
+    settings = await get_user_settings(user_id, session)
     
     city = settings.city if settings else DEFAULT_CITY
     country = settings.country if settings else DEFAULT_COUNTRY
@@ -132,18 +153,9 @@ async def cmd_set_location(message: Message, session: AsyncSession, state: FSMCo
     
     try:
         # Update user settings
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.city = city
-        settings.country = country
+        settings = await update_user_settings(session, user_id, city=city, country=country)
         await session.commit()
+        await reschedule_location_reminders(message.bot, settings)
         
         logger.info(f"Location updated for user {user_id}: {city}, {country}")
         
@@ -193,18 +205,9 @@ async def callback_quick_location(callback: CallbackQuery, session: AsyncSession
     
     try:
         # Update user settings
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.city = city
-        settings.country = country
+        settings = await update_user_settings(session, user_id, city=city, country=country)
         await session.commit()
+        await reschedule_location_reminders(callback.bot, settings)
         
         logger.info(f"Location updated via button for user {user_id}: {city}, {country}")
         
@@ -262,18 +265,9 @@ async def handle_location_text_input(message: Message, session: AsyncSession, st
     
     try:
         # Update user settings
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.city = city
-        settings.country = country
+        settings = await update_user_settings(session, user_id, city=city, country=country)
         await session.commit()
+        await reschedule_location_reminders(message.bot, settings)
         
         logger.info(f"Location updated via text input for user {user_id}: {city}, {country}")
         
@@ -324,7 +318,6 @@ async def handle_location(message: Message, session: AsyncSession, state: FSMCon
     logger.info(f"Received location from user {user_id}: lat={latitude}, lon={longitude}")
     
     # Use reverse geocoding to get city/country from coordinates
-    import aiohttp
     city, country = None, None
     
     try:
@@ -338,41 +331,31 @@ async def handle_location(message: Message, session: AsyncSession, state: FSMCon
         }
         headers = {"User-Agent": "ROM_PeerBot/2.0"}
         
-        async with aiohttp.ClientSession() as http_session:
-            async with http_session.get(nominatim_url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    address = data.get('address', {})
+        async with http_client.get("nominatim", nominatim_url, params=params, headers=headers) as response:
+            if response.status == 200:
+                data = await response.json()
+                address = data.get('address', {})
+                
+                # Try to get city from various fields
+                city = (address.get('city') or 
+                       address.get('town') or 
+                       address.get('village') or 
+                       address.get('state') or 
+                       None)
+                country = address.get('country', None)
+                
+                if city and country:
+                    # Update user settings with location
+                    settings = await update_user_settings(session, user_id, city=city, country=country)
+                    await session.commit()
+                    await reschedule_location_reminders(message.bot, settings)
                     
-                    # Try to get city from various fields
-                    city = (address.get('city') or 
-                           address.get('town') or 
-                           address.get('village') or 
-                           address.get('state') or 
-                           None)
-                    country = address.get('country', None)
+                    logger.info(f"Location auto-saved for user {user_id}: {city}, {country}")
                     
-                    if city and country:
-                        # Update user settings with location
-                        result = await session.execute(
-                            select(UserSettings).where(UserSettings.user_id == user_id)
-                        )
-                        settings = result.scalar_one_or_none()
-                        
-                        if not settings:
-                            settings = UserSettings(user_id=user_id)
-                            session.add(settings)
-                        
-                        settings.city = city
-                        settings.country = country
-                        await session.commit()
-                        
-                        logger.info(f"Location auto-saved for user {user_id}: {city}, {country}")
-                        
-                        await message.answer(
-                            f"📍 *Location Saved*\n{city}, {country}\n\nSearching for nearby masājid...",
-                            parse_mode="Markdown"
-                        )
+                    await message.answer(
+                        f"📍 *Location Saved*\n{city}, {country}\n\nSearching for nearby masājid...",
+                        parse_mode="Markdown"
+                    )
     except Exception as e:
         logger.error(f"Reverse geocoding error: {e}")
     
@@ -450,14 +433,11 @@ async def cmd_unremind(message: Message, session: AsyncSession):
     user_id = message.from_user.id
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
+        settings = await update_user_settings(session, user_id, create=False, prayer_reminders=False)
         if settings:
-            settings.prayer_reminders = False
             await session.commit()
+            # Drops the user's reminder jobs (or the city's, if this was its last subscriber)
+            await reschedule_location_reminders(message.bot, settings)
             logger.info(f"Prayer reminders disabled for user {user_id}")
     except Exception as e:
         logger.error(f"Error disabling reminders for {user_id}: {e}")
@@ -478,20 +458,12 @@ async def callback_remind(callback: CallbackQuery, session: AsyncSession):
     enable = callback.data == "remind_on"
     
     try:
-        result = await session.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
-        )
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-        
-        settings.prayer_reminders = enable
+        settings = await update_user_settings(session, user_id, prayer_reminders=enable)
         await session.commit()
         
         if enable:
-            # Schedule prayer reminders (will be handled by scheduler)
+            # Make sure the user's city has reminder jobs
+            await reschedule_location_reminders(callback.bot, settings)
             logger.info(f"Prayer reminders enabled for user {user_id}")
             text = (
                 "🔔 *Ṣalāh Reminders Enabled*\n\n"
@@ -501,6 +473,8 @@ async def callback_remind(callback: CallbackQuery, session: AsyncSession):
                 "May Allah help us remain steadfast 🤍"
             )
         else:
+            # Drops the city's reminder jobs if this was its last subscriber
+            await reschedule_location_reminders(callback.bot, settings)
             logger.info(f"Prayer reminders disabled for user {user_id}")
             text = "❌ *Ṣalāh Reminders Disabled*"
         
@@ -4,9 +4,8 @@ import logging
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User, UserSettings
+from bot.utils.user_settings import register_user
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -17,32 +16,22 @@ async def cmd_start(message: Message, session: AsyncSession):
     """Handle /start and /help commands"""
     user_id = message.from_user.id
     
-    # Create or update user in database
+    # Create or update user in database (one upsert, no write if nothing changed)
     try:
-        result = await session.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            user = User(
-                id=user_id,
-                username=message.from_user.username,
-                first_name=message.from_user.first_name,
-                last_name=message.from_user.last_name
-            )
-            session.add(user)
-            
-            # Create default settings
-            settings = UserSettings(user_id=user_id)
-            session.add(settings)
-            
+        status = await register_user(
+            session,
+            user_id,
+            username=message.from_user.username,
+            first_name=message.from_user.first_name,
+            last_name=message.from_user.last_name
+        )
+        if status:
             await session.commit()
+        if status == "registered":
             logger.info(f"New user registered: {user_id}")
-        else:
-            # Update user info if changed
-            user.username = message.from_user.username
-            user.first_name = message.from_user.first_name
-            user.last_name = message.from_user.last_name
-            await session.commit()
+        elif status == "reactivated":
+            # A user who had blocked the bot is reachable again
+            logger.info(f"User {user_id} reactivated")
     except Exception as e:
         logger.error(f"Error creating/updating user {user_id}: {e}")
         await session.rollback()
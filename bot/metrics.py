@@ -0,0 +1,80 @@
+"""Runtime metrics registry
+
+Subsystems register a callable that returns a flat dict of their current
+metrics. The admin /stats command and logs read them through this module.
+"""
+
+import logging
+import math
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MetricsSource = Callable[[], Dict[str, Any]]
+
+_sources: Dict[str, MetricsSource] = {}
+
+# Latency histograms keep this many of their most recent samples for percentiles
+HISTOGRAM_WINDOW = 5000
+
+
+class LatencyHistogram:
+    """Latency samples (seconds) over a sliding window, with percentile summaries"""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentiles(self, points: Sequence[float] = (50, 95, 99)) -> Dict[float, Optional[float]]:
+        """Nearest-rank percentiles of the current window (None when empty)"""
+        ordered = sorted(self._samples)
+        if not ordered:
+            return {point: None for point in points}
+        return {
+            point: ordered[min(len(ordered) - 1, max(0, math.ceil(point / 100 * len(ordered)) - 1))]
+            for point in points
+        }
+
+
+def register_metrics_source(name: str, source: MetricsSource):
+    """Register (or replace) a named metrics source"""
+    _sources[name] = source
+
+
+def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    """Collect a snapshot from every registered source"""
+    snapshot = {}
+    for name, source in _sources.items():
+        try:
+            snapshot[name] = source()
+        except Exception as e:
+            logger.error(f"Error collecting metrics from {name}: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def format_metrics_summary() -> str:
+    """Render all metrics as a Markdown summary for admins"""
+    snapshot = collect_metrics()
+    if not snapshot:
+        return "📊 *Bot Metrics*\n\nNo metrics registered."
+
+    lines = ["📊 *Bot Metrics*"]
+    for name, metrics in snapshot.items():
+        lines.append(f"\n*{name}*")
+        for key, value in metrics.items():
+            lines.append(f"`{key}`: {_format_value(value)}")
+    return "\n".join(lines)
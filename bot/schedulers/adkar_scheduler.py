@@ -1,250 +1,340 @@
-"""Adkar scheduler for morning, evening, sleep, and Allahu Allah reminders"""
+"""Adkar scheduler for morning, evening, sleep, and Allahu Allah reminders
 
+Morning, evening and sleep adkar follow prayer times, so they are scheduled
+per city group (see city_groups) in the city's own timezone: one fan-out job
+per group and adkar type. Allahu Allah reminders are interval-based and
+scheduled per phase slot by interval_scheduler.
+"""
+
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
 import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
-from sqlalchemy import select
 import database.db
 from database.models import UserSettings
-from bot.utils.prayer_api import get_prayer_times
-from config import DEFAULT_CITY, DEFAULT_COUNTRY
+from bot.utils.prayer_api import get_prayer_times, get_location_timezone, prayer_lookup_key
+from bot.utils.delivery_queue import delivery_queue, DeliveryTrace
+from bot.utils.reminder_latency import reminder_latency
+from bot.utils.settings_cache import SettingsSnapshot
+from bot.schedulers.workers import leader_only
+from bot.schedulers.city_groups import (
+    CityGroup, GroupKey, LocalDayTracker, group_id, load_city_groups, load_location_group,
+    resolve_group_schedule, iter_group_recipients, sync_daily_job
+)
+from config import DEFAULT_CITY, DEFAULT_COUNTRY, REMINDER_BATCH_SIZE
 
 SINGAPORE_TZ = pytz.timezone('Asia/Singapore')
 
 logger = logging.getLogger(__name__)
 
+# Fan-out jobs (by job id) whose trigger follows their city's current local day
+_synced_days = LocalDayTracker()
+
+# Message payloads are built once and shared by reference between recipients;
+# only the morning adkar varies (today's Sunrise time in the recipient's city)
+MORNING_ADKAR_TEMPLATE = (
+    "🌅 *Morning Dhikr & Daily Adhkar*\n\n"
+    "🤲 *Dua Upon Waking Up*\n\n"
+    "الْحَمْدُ لِلَّهِ الَّذِي أَحْيَانَا بَعْدَ مَا أَمَاتَنَا وَإِلَيْهِ النُّشُورُ\n"
+    "_All praise is for Allah who gave us life after causing us to die, and unto Him is the resurrection._\n"
+    "_Al-hamdu lillahi alladhi ahyana ba'da ma amatana wa ilayhin-nushoor_\n\n"
+    "📋 *Daily Checklist:*\n"
+    "🤍 *Niyyah:* Seek closeness to Allah & purify the heart.\n"
+    "📿 *Wirdu Amm:*\n"
+    "  • 100x Istighfar\n"
+    "  • 500x Salawat upon the Prophet ﷺ\n"
+    "  • 125x La Ilaha Illallah\n"
+    "📖 *Quran:* Surah Yaseen OR min. 1 page Tafsir.\n"
+    "🕌 *Ishraq:* Pray 15-20mins after Syuruk (Today: {sunrise})\n"
+    "🔗 *Awrad Zuhooriyah:* https://tinyurl.com/awradzuhooriyah\n\n"
+    "📿 *After Every Fard Prayer*\n"
+    "اللَّهُمَّ أَعِنِّي عَلَى ذِكْرِكَ، وَشُكْرِكَ، وَحُسْنِ عِبَادَتِكَ\n"
+    "_Allahumma a'inni 'ala dhikrika, wa shukrika, wa husni 'ibadatika_\n"
+    "_(O Allah, help me to remember You, to be grateful to You, and to worship You in an excellent manner)_"
+)
+
+EVENING_ADKAR_TEXT = (
+    "🌇 *Evening Dhikr*\n\n"
+    "📿 *Adhkar:* Istighfar, Tahlil, Salawat, Muraqabah (10–100x)\n"
+    "🕯️ *Muhasabah:* Reflect on your day and your deeds.\n"
+    "🤍 *Forgiveness:* Forgive anyone you hold grudges against.\n"
+    "🍃 *Mindfulness:* Feel gratitude & the presence of Allah.\n"
+    "🕌 *Worship:* Engage in dhikr and remembrance\n\n"
+    "📖 *Evening Adhkar:*\n"
+    "أَمْسَيْنَا وَأَمْسَى الْمُلْكُ لِلَّهِ\n"
+    "_We have entered the evening and with it all the dominion is Allah's_\n"
+    "_Amsayna wa amsal-mulku lillah_\n\n"
+    "الْحَمْدُ لِلَّهِ الَّذِي عَافَانِي فِي جَسَدِي\n"
+    "_All praise is for Allah who has restored to me my health_\n"
+    "_Alhamdu lillahil-lazi 'afani fi jasadi_\n\n"
+    "🌬️ *Continuous Dhikr:* Make every breath a remembrance of Allah with Allahu Allah."
+)
+
+SLEEP_ADKAR_TEXT = (
+    "😴 *Before Sleep*\n\n"
+    "📿 *Adhkar:* Istighfar, Tahlil, Salawat, Muraqabah (10–100x)\n"
+    "🕯️ *Muhasabah:* Reflect on death (Mawt) & your deeds.\n"
+    "🤍 *Forgiveness:* Forgive anyone you hold grudges against.\n"
+    "🍃 *Mindfulness:* Feel gratitude & the presence of Allah.\n"
+    "🕌 *Worship:* Solat Sunnah Taubah + Surah As-Sajdah & Al-Mulk.\n"
+    "🤲 *Dua before sleeping:*\n"
+    "اللهم باسمك أموت وأحيا\n"
+    "_O Allah, with Your Name will I die and live (wake up)_\n"
+    "_Allahumma bismika amutu wa ahya_\n\n"
+    "Recite Last three verse of Surah Baqarah before sleeping.\n\n"
+    "🌙 *Niyyah:* Sleep with many good intentions of what you want to perform the next day.\n"
+    "🌬️ *Continuous Dhikr:* Make every breath a remembrance of Allah. Sleep with Allahu Allah."
+)
+
+ALLAHU_ALLAH_TEXT = (
+    "💝 *Allahu Allah (Dhikr Anfus) Reminder*\n\n"
+    "Continuous Dhikr — every breath can be remembrance of Allah:\n"
+    "• Breathe Allahu Allah silently and connect your breath to Allah\n"
+    "  To be in a state of gratitude for Allah for his providence of each breath\n"
+    "  And for one to recognise the neediness in each one is in every moment.\n\n"
+    "_From Allah, By Allah, With Allah, For Allah, Back to Allah._\n\n"
+    "• Ask Allah for help in maintaining this Dhikr and staying mindful throughout the day\n"
+    "• To also sleep with Allahu Allah"
+)
+
+# Rendered morning adkar per (city group, local date)
+_morning_messages: Dict[Tuple[GroupKey, date], str] = {}
+
+
+async def render_morning_adkar(city: str = DEFAULT_CITY, country: str = DEFAULT_COUNTRY) -> str:
+    """Morning adkar for a city with today's Sunrise time, rendered once per city and local date"""
+    tz_name = get_location_timezone(city, country)
+    if tz_name:
+        cached = _morning_messages.get((prayer_lookup_key(city, country), datetime.now(pytz.timezone(tz_name)).date()))
+        if cached:
+            return cached
+    
+    timings, _ = await get_prayer_times(city, country)
+    if not timings:
+        return MORNING_ADKAR_TEMPLATE.format(sunrise='N/A')
+    
+    tz_name = get_location_timezone(city, country) or 'Asia/Singapore'
+    today = datetime.now(pytz.timezone(tz_name)).date()
+    text = MORNING_ADKAR_TEMPLATE.format(sunrise=timings.get('Sunrise', 'N/A'))
+    
+    # Drop renders no city can still be on
+    for key in [key for key in _morning_messages if key[1] < today - timedelta(days=1)]:
+        del _morning_messages[key]
+    _morning_messages[(prayer_lookup_key(city, country), today)] = text
+    return text
+
 
-async def send_morning_adkar(bot: Bot, user_id: int):
-    """Send morning adkar reminder"""
+async def _send_adkar(bot: Bot, user_id: int, text: str, reminder_type: str, scheduled_at: Optional[datetime]):
+    trace = DeliveryTrace()
+    await delivery_queue.send_message(bot, user_id, text, parse_mode="Markdown", trace=trace)
+    reminder_latency.record(reminder_type, scheduled_at, trace)
+
+
+async def send_morning_adkar(
+    bot: Bot,
+    user_id: int,
+    city: str = DEFAULT_CITY,
+    country: str = DEFAULT_COUNTRY,
+    scheduled_at: Optional[datetime] = None,
+    text: Optional[str] = None,
+):
+    """Send morning adkar reminder (text: pre-rendered message, see render_morning_adkar)"""
     try:
-        timings, _ = await get_prayer_times(DEFAULT_CITY, DEFAULT_COUNTRY)
-        sunrise_time = timings.get('Sunrise', 'N/A') if timings else 'N/A'
-        
-        text = (
-            "🌅 *Morning Dhikr & Daily Adhkar*\n\n"
-            "🤲 *Dua Upon Waking Up*\n\n"
-            "الْحَمْدُ لِلَّهِ الَّذِي أَحْيَانَا بَعْدَ مَا أَمَاتَنَا وَإِلَيْهِ النُّشُورُ\n"
-            "_All praise is for Allah who gave us life after causing us to die, and unto Him is the resurrection._\n"
-            "_Al-hamdu lillahi alladhi ahyana ba'da ma amatana wa ilayhin-nushoor_\n\n"
-            "📋 *Daily Checklist:*\n"
-            "🤍 *Niyyah:* Seek closeness to Allah & purify the heart.\n"
-            "📿 *Wirdu Amm:*\n"
-            "  • 100x Istighfar\n"
-            "  • 500x Salawat upon the Prophet ﷺ\n"
-            "  • 125x La Ilaha Illallah\n"
-            "📖 *Quran:* Surah Yaseen OR min. 1 page Tafsir.\n"
-            f"🕌 *Ishraq:* Pray 15-20mins after Syuruk (Today: {sunrise_time})\n"
-            "🔗 *Awrad Zuhooriyah:* https://tinyurl.com/awradzuhooriyah\n\n"
-            "📿 *After Every Fard Prayer*\n"
-            "اللَّهُمَّ أَعِنِّي عَلَى ذِكْرِكَ، وَشُكْرِكَ، وَحُسْنِ عِبَادَتِكَ\n"
-            "_Allahumma a'inni 'ala dhikrika, wa shukrika, wa husni 'ibadatika_\n"
-            "_(O Allah, help me to remember You, to be grateful to You, and to worship You in an excellent manner)_"
-        )
-        
-        await bot.send_message(user_id, text, parse_mode="Markdown")
-        logger.info(f"Sent morning adkar to user {user_id}")
+        if text is None:
+            text = await render_morning_adkar(city, country)
+        await _send_adkar(bot, user_id, text, "adkar-morning", scheduled_at)
+        logger.debug(f"Sent morning adkar to user {user_id}")
     except Exception as e:
         logger.error(f"Error sending morning adkar to {user_id}: {e}")
 
 
-async def send_evening_adkar(bot: Bot, user_id: int):
+async def send_evening_adkar(bot: Bot, user_id: int, scheduled_at: Optional[datetime] = None):
     """Send evening adkar reminder"""
     try:
-        text = (
-            "🌇 *Evening Dhikr*\n\n"
-            "📿 *Adhkar:* Istighfar, Tahlil, Salawat, Muraqabah (10–100x)\n"
-            "🕯️ *Muhasabah:* Reflect on your day and your deeds.\n"
-            "🤍 *Forgiveness:* Forgive anyone you hold grudges against.\n"
-            "🍃 *Mindfulness:* Feel gratitude & the presence of Allah.\n"
-            "🕌 *Worship:* Engage in dhikr and remembrance\n\n"
-            "📖 *Evening Adhkar:*\n"
-            "أَمْسَيْنَا وَأَمْسَى الْمُلْكُ لِلَّهِ\n"
-            "_We have entered the evening and with it all the dominion is Allah's_\n"
-            "_Amsayna wa amsal-mulku lillah_\n\n"
-            "الْحَمْدُ لِلَّهِ الَّذِي عَافَانِي فِي جَسَدِي\n"
-            "_All praise is for Allah who has restored to me my health_\n"
-            "_Alhamdu lillahil-lazi 'afani fi jasadi_\n\n"
-            "🌬️ *Continuous Dhikr:* Make every breath a remembrance of Allah with Allahu Allah."
-        )
-        
-        await bot.send_message(user_id, text, parse_mode="Markdown")
-        logger.info(f"Sent evening adkar to user {user_id}")
+        await _send_adkar(bot, user_id, EVENING_ADKAR_TEXT, "adkar-evening", scheduled_at)
+        logger.debug(f"Sent evening adkar to user {user_id}")
     except Exception as e:
         logger.error(f"Error sending evening adkar to {user_id}: {e}")
 
 
-async def send_sleep_adkar(bot: Bot, user_id: int):
+async def send_sleep_adkar(bot: Bot, user_id: int, scheduled_at: Optional[datetime] = None):
     """Send sleep adkar reminder"""
     try:
-        text = (
-            "😴 *Before Sleep*\n\n"
-            "📿 *Adhkar:* Istighfar, Tahlil, Salawat, Muraqabah (10–100x)\n"
-            "🕯️ *Muhasabah:* Reflect on death (Mawt) & your deeds.\n"
-            "🤍 *Forgiveness:* Forgive anyone you hold grudges against.\n"
-            "🍃 *Mindfulness:* Feel gratitude & the presence of Allah.\n"
-            "🕌 *Worship:* Solat Sunnah Taubah + Surah As-Sajdah & Al-Mulk.\n"
-            "🤲 *Dua before sleeping:*\n"
-            "اللهم باسمك أموت وأحيا\n"
-            "_O Allah, with Your Name will I die and live (wake up)_\n"
-            "_Allahumma bismika amutu wa ahya_\n\n"
-            "Recite Last three verse of Surah Baqarah before sleeping.\n\n"
-            "🌙 *Niyyah:* Sleep with many good intentions of what you want to perform the next day.\n"
-            "🌬️ *Continuous Dhikr:* Make every breath a remembrance of Allah. Sleep with Allahu Allah."
-        )
-        
-        await bot.send_message(user_id, text, parse_mode="Markdown")
-        logger.info(f"Sent sleep adkar to user {user_id}")
+        await _send_adkar(bot, user_id, SLEEP_ADKAR_TEXT, "adkar-sleep", scheduled_at)
+        logger.debug(f"Sent sleep adkar to user {user_id}")
     except Exception as e:
         logger.error(f"Error sending sleep adkar to {user_id}: {e}")
 
 
-async def send_allahu_allah(bot: Bot, user_id: int):
+async def send_allahu_allah(bot: Bot, user_id: int, scheduled_at: Optional[datetime] = None):
     """Send Allahu Allah dhikr reminder"""
     try:
-        text = (
-            "💝 *Allahu Allah (Dhikr Anfus) Reminder*\n\n"
-            "Continuous Dhikr — every breath can be remembrance of Allah:\n"
-            "• Breathe Allahu Allah silently and connect your breath to Allah\n"
-            "  To be in a state of gratitude for Allah for his providence of each breath\n"
-            "  And for one to recognise the neediness in each one is in every moment.\n\n"
-            "_From Allah, By Allah, With Allah, For Allah, Back to Allah._\n\n"
-            "• Ask Allah for help in maintaining this Dhikr and staying mindful throughout the day\n"
-            "• To also sleep with Allahu Allah"
-        )
-        
-        await bot.send_message(user_id, text, parse_mode="Markdown")
-        logger.info(f"Sent Allahu Allah reminder to user {user_id}")
+        await _send_adkar(bot, user_id, ALLAHU_ALLAH_TEXT, "allahu-allah", scheduled_at)
+        logger.debug(f"Sent Allahu Allah reminder to user {user_id}")
     except Exception as e:
         logger.error(f"Error sending Allahu Allah reminder to {user_id}: {e}")
 
 
-async def schedule_adkar_for_user(scheduler: AsyncIOScheduler, bot: Bot, user_id: int, settings: UserSettings):
-    """Schedule adkar reminders for a specific user"""
-    # Remove existing jobs for this user first
-    for job_id in [f"morning_adkar_{user_id}", f"evening_adkar_{user_id}", 
-                   f"sleep_adkar_{user_id}", f"allahu_allah_{user_id}"]:
-        if scheduler.get_job(job_id):
-            scheduler.remove_job(job_id)
+# Settings column, the prayer each adkar follows, and how long after it
+ADKAR_SCHEDULES = {
+    "morning": (UserSettings.morning_adkar, 'Fajr', timedelta(minutes=15)),
+    "evening": (UserSettings.evening_adkar, 'Asr', timedelta(minutes=30)),
+    "sleep": (UserSettings.sleep_adkar, 'Isha', timedelta(hours=1)),
+}
+
+
+def _adkar_job_id(adkar_type: str, group: str) -> str:
+    return f"{adkar_type}_adkar_fanout_{group}"
+
+
+async def send_adkar_fanout(bot: Bot, adkar_type: str, group_key: GroupKey, city: str, country: str):
+    """Send one adkar type to every subscriber in a city group, streaming recipients in batches"""
+    if not database.db.async_session_maker:
+        logger.warning("Database session maker not initialized yet")
+        return
+    
+    column = ADKAR_SCHEDULES[adkar_type][0]
+    scheduled_at = reminder_latency.scheduled_time(_adkar_job_id(adkar_type, group_id(group_key)))
+    sent = 0
+    try:
+        # Rendered once for the whole group; recipients share the same string
+        text = await render_morning_adkar(city, country) if adkar_type == "morning" else None
+        async for batch in iter_group_recipients(group_key, REMINDER_BATCH_SIZE, column.key):
+            if adkar_type == "morning":
+                sends = (send_morning_adkar(bot, user_id, city, country, scheduled_at, text) for user_id in batch)
+            elif adkar_type == "evening":
+                sends = (send_evening_adkar(bot, user_id, scheduled_at) for user_id in batch)
+            else:
+                sends = (send_sleep_adkar(bot, user_id, scheduled_at) for user_id in batch)
+            await asyncio.gather(*sends)
+            sent += len(batch)
+    except Exception as e:
+        logger.error(f"Error in {adkar_type} adkar fan-out for {group_id(group_key)}: {e}")
+    
+    logger.info(f"{adkar_type.capitalize()} adkar fan-out delivered to {sent} users in {group_id(group_key)}")
+
+
+async def schedule_group_adkar(scheduler: AsyncIOScheduler, bot: Bot, group: CityGroup, adkar_type: str) -> bool:
+    """Keep the daily fan-out job of one adkar type for a city group at today's time, in the city's timezone
     
-    # Get prayer times to calculate adkar timings
-    timings, _ = await get_prayer_times(DEFAULT_CITY, DEFAULT_COUNTRY)
+    Returns:
+        True if the job was added or moved
+    """
+    timings, tz = await resolve_group_schedule(group.city, group.country)
     if not timings:
-        logger.error(f"Could not fetch prayer times for user {user_id}")
-        return
+        logger.error(f"Could not fetch prayer times for {adkar_type} adkar in {group.city}, {group.country}")
+        return False
+    
+    _, prayer, offset = ADKAR_SCHEDULES[adkar_type]
+    send_time = datetime.strptime(timings[prayer], "%H:%M") + offset
     
-    # Morning adkar: 15 mins after Fajr (Subuh azan)
-    if settings.morning_adkar:
-        try:
-            fajr_time = datetime.strptime(timings['Fajr'], "%H:%M")
-            # Add 15 minutes
-            morning_time = fajr_time + timedelta(minutes=15)
-            morning_hour = morning_time.hour
-            morning_minute = morning_time.minute
-            
-            scheduler.add_job(
-                send_morning_adkar,
-                trigger=CronTrigger(hour=morning_hour, minute=morning_minute, timezone="Asia/Singapore"),
-                args=[bot, user_id],
-                id=f"morning_adkar_{user_id}",
-                replace_existing=True
-            )
-            logger.info(f"Scheduled morning adkar for user {user_id} at {morning_hour:02d}:{morning_minute:02d} (Fajr: {timings['Fajr']})")
-        except Exception as e:
-            logger.error(f"Error scheduling morning adkar for user {user_id}: {e}")
+    job_id = _adkar_job_id(adkar_type, group.id)
+    moved = sync_daily_job(
+        scheduler, job_id, send_adkar_fanout, [bot, adkar_type, group.key, group.city, group.country], send_time, tz
+    )
+    _synced_days.mark(job_id, group.city, group.country)
+    if moved:
+        logger.info(
+            f"Scheduled {adkar_type} adkar for {group.id} ({group.subscribers} users) "
+            f"at {send_time.hour:02d}:{send_time.minute:02d} {tz.zone} ({prayer}: {timings[prayer]})"
+        )
+    return moved
+
+
+async def schedule_adkar_fanout(scheduler: AsyncIOScheduler, bot: Bot, only_missing: bool = False) -> int:
+    """Sync adkar fan-out jobs of every (adkar type, city group) with subscribers to today's prayer times
     
-    # Evening adkar: 30 mins after Asr
-    if settings.evening_adkar:
-        try:
-            asr_time = datetime.strptime(timings['Asr'], "%H:%M")
-            # Add 30 minutes
-            evening_time = asr_time + timedelta(minutes=30)
-            evening_hour = evening_time.hour
-            evening_minute = evening_time.minute
-            
-            scheduler.add_job(
-                send_evening_adkar,
-                trigger=CronTrigger(hour=evening_hour, minute=evening_minute, timezone="Asia/Singapore"),
-                args=[bot, user_id],
-                id=f"evening_adkar_{user_id}",
-                replace_existing=True
-            )
-            logger.info(f"Scheduled evening adkar for user {user_id} at {evening_hour:02d}:{evening_minute:02d} (Asr: {timings['Asr']})")
-        except Exception as e:
-            logger.error(f"Error scheduling evening adkar for user {user_id}: {e}")
+    Args:
+        scheduler: Scheduler instance
+        bot: Bot instance
+        only_missing: Skip groups that already have a job (startup reconcile); otherwise only
+            groups that have passed their local midnight since their last sync are synced
     
-    # Sleep adkar: 1 hour after Isha
-    if settings.sleep_adkar:
-        try:
-            isha_time = datetime.strptime(timings['Isha'], "%H:%M")
-            # Add 1 hour
-            sleep_time = isha_time + timedelta(hours=1)
-            sleep_hour = sleep_time.hour
-            sleep_minute = sleep_time.minute
-            
-            scheduler.add_job(
-                send_sleep_adkar,
-                trigger=CronTrigger(hour=sleep_hour, minute=sleep_minute, timezone="Asia/Singapore"),
-                args=[bot, user_id],
-                id=f"sleep_adkar_{user_id}",
-                replace_existing=True
-            )
-            logger.info(f"Scheduled sleep adkar for user {user_id} at {sleep_hour:02d}:{sleep_minute:02d} (Isha: {timings['Isha']})")
-        except Exception as e:
-            logger.error(f"Error scheduling sleep adkar for user {user_id}: {e}")
+    Returns:
+        Number of fan-out jobs added or moved
+    """
+    scheduled = 0
+    active = set()
+    for adkar_type, (column, _, _) in ADKAR_SCHEDULES.items():
+        for group in await load_city_groups(column == True):
+            job_id = _adkar_job_id(adkar_type, group.id)
+            active.add(job_id)
+            if only_missing and scheduler.get_job(job_id):
+                continue
+            if not only_missing and not _synced_days.due(job_id, group.city, group.country):
+                continue
+            try:
+                if await schedule_group_adkar(scheduler, bot, group, adkar_type):
+                    scheduled += 1
+            except Exception as e:
+                logger.error(f"Error scheduling {adkar_type} adkar for {group.id}: {e}")
     
-    # Allahu Allah dhikr: interval-based (start immediately when enabled)
-    if settings.allahu_allah_interval:
-        try:
-            # Send immediately when enabled
-            await send_allahu_allah(bot, user_id)
-            # Then schedule recurring
-            scheduler.add_job(
-                send_allahu_allah,
-                trigger=IntervalTrigger(hours=settings.allahu_allah_interval, timezone="Asia/Singapore"),
-                args=[bot, user_id],
-                id=f"allahu_allah_{user_id}",
-                replace_existing=True
-            )
-            logger.info(f"Scheduled Allahu Allah for user {user_id} every {settings.allahu_allah_interval} hours")
-        except Exception as e:
-            logger.error(f"Error scheduling Allahu Allah for user {user_id}: {e}")
+    # Drop jobs of groups that no longer have subscribers
+    for job in scheduler.get_jobs():
+        if job.func is send_adkar_fanout and job.id not in active:
+            job.remove()
+    
+    return scheduled
+
+
+async def schedule_user_adkar_groups(scheduler: AsyncIOScheduler, bot: Bot, settings: SettingsSnapshot):
+    """Apply a user's adkar or location change to their city group's jobs"""
+    for adkar_type, (column, _, _) in ADKAR_SCHEDULES.items():
+        group = await load_location_group(settings.city, settings.country, column == True)
+        if group is None:
+            # Nobody in this city wants this adkar anymore
+            job_id = _adkar_job_id(adkar_type, group_id(prayer_lookup_key(settings.city, settings.country)))
+            if scheduler.get_job(job_id):
+                scheduler.remove_job(job_id)
+        elif not scheduler.get_job(_adkar_job_id(adkar_type, group.id)):
+            await schedule_group_adkar(scheduler, bot, group, adkar_type)
+
+
+async def schedule_adkar_for_user(scheduler: AsyncIOScheduler, bot: Bot, user_id: int, settings: SettingsSnapshot):
+    """Apply a user's adkar settings change - only the affected jobs are touched
+    
+    Allahu Allah is handled by the interval reminder engine (see interval_scheduler).
+    """
+    # Per-user adkar jobs are from before city groups
+    for job_id in [f"morning_adkar_{user_id}", f"evening_adkar_{user_id}", f"sleep_adkar_{user_id}"]:
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+    
+    # Morning (15 mins after Fajr), evening (30 mins after Asr) and sleep (1 hour after Isha)
+    # adkar are delivered by the fan-out job of the user's city group
+    try:
+        await schedule_user_adkar_groups(scheduler, bot, settings)
+    except Exception as e:
+        logger.error(f"Error scheduling adkar for user {user_id}: {e}")
 
 
+@leader_only
 async def schedule_all_adkar(scheduler: AsyncIOScheduler, bot: Bot):
-    """Schedule adkar reminders for all users"""
+    """Sync adkar fan-out jobs with each city's prayer times after its local midnight (hourly; leader only)"""
+    if not database.db.async_session_maker:
+        logger.warning("Database session maker not initialized yet")
+        return
     try:
-        if not database.db.async_session_maker:
-            logger.warning("Database session maker not initialized yet")
-            return
-        async with database.db.async_session_maker() as session:
-            result = await session.execute(select(UserSettings))
-            all_settings = result.scalars().all()
-            
-            for settings in all_settings:
-                if any([settings.morning_adkar, settings.evening_adkar, 
-                       settings.sleep_adkar, settings.allahu_allah_interval]):
-                    await schedule_adkar_for_user(scheduler, bot, settings.user_id, settings)
-            
-            logger.info(f"Scheduled adkar for {len(all_settings)} users")
+        # Job count depends on distinct cities, not on the number of subscribers
+        moved = await schedule_adkar_fanout(scheduler, bot)
+        logger.info(f"Adkar refresh: {moved} fan-out jobs added or moved")
     except Exception as e:
         logger.error(f"Error scheduling adkar: {e}")
 
 
 def setup_adkar_scheduler(scheduler: AsyncIOScheduler, bot: Bot):
     """Setup daily adkar reminder scheduling"""
-    # Refresh adkar schedules daily at midnight Singapore time (prayer times change daily)
+    # Sync adkar triggers with each city's prayer times shortly after its local midnight (moved times only)
     scheduler.add_job(
         schedule_all_adkar,
         'cron',
-        hour=0,
         minute=1,
         timezone="Asia/Singapore",
         args=[scheduler, bot],
         id='daily_adkar_refresh',
         replace_existing=True
     )
-    logger.info("Adkar scheduler setup complete - daily refresh at 00:01 SGT")
+    logger.info("Adkar scheduler setup complete - hourly refresh of cities past their local midnight")
@@ -0,0 +1,203 @@
+"""Subscriber grouping by location for fan-out scheduling
+
+Reminders are scheduled per city group rather than per user: every distinct
+location (normalized the same way as prayer time lookups, so all Singapore
+spellings form one group) gets its prayer times resolved once, in its own
+timezone, and one fan-out job per reminder that streams that group's
+recipients when it fires.
+
+Fan-out jobs are daily cron triggers at the group's local prayer-derived
+time. The refresh runs hourly and resyncs each group once its own local date
+has moved on (LocalDayTracker), so triggers are always set from the city's
+current day rather than the day in Singapore. It recomputes each time and only
+replaces a trigger when it moved (sync_daily_job), so on most days nothing is
+rescheduled.
+Recipients are read from the subscriptions table, where each row already
+carries its group id (see subscriptions).
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, tzinfo
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select, func
+import database.db
+from database.models import UserSettings, Subscription
+from bot.utils.prayer_api import get_prayer_times, get_location_timezone, prayer_lookup_key
+from bot.utils.recipients import active_recipient
+from bot.schedulers.workers import owned_recipient
+
+logger = logging.getLogger(__name__)
+
+GroupKey = Tuple[str, ...]
+
+
+def group_id(key: GroupKey) -> str:
+    """Stable string form of a group key, used in job ids"""
+    return "/".join(key)
+
+
+@dataclass
+class CityGroup:
+    """All subscribers whose location resolves to the same prayer times"""
+    key: GroupKey
+    city: str  # Most common spelling in the group, used for lookups
+    country: str
+    locations: List[Tuple[str, str]] = field(default_factory=list)
+    subscribers: int = 0
+
+    @property
+    def id(self) -> str:
+        return group_id(self.key)
+
+
+async def load_city_groups(*conditions) -> List[CityGroup]:
+    """
+    Group active users matching the conditions by location with one grouped query
+
+    Args:
+        *conditions: SQLAlchemy filters on UserSettings (e.g. UserSettings.prayer_reminders == True)
+
+    Returns:
+        City groups, largest first
+    """
+    async with database.db.async_session_maker() as session:
+        result = await session.execute(
+            select(UserSettings.city, UserSettings.country, func.count())
+            .where(active_recipient(), *conditions)
+            .group_by(UserSettings.city, UserSettings.country)
+            .order_by(func.count().desc())
+        )
+        rows = result.all()
+
+    groups = {}
+    for city, country, count in rows:
+        key = prayer_lookup_key(city, country)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = CityGroup(key, city, country)
+        group.locations.append((city, country))
+        group.subscribers += count
+    return list(groups.values())
+
+
+async def load_location_group(city: str, country: str, *conditions) -> Optional[CityGroup]:
+    """The city group a single location belongs to (None if it has no matching users)"""
+    key = prayer_lookup_key(city, country)
+    for group in await load_city_groups(*conditions):
+        if group.key == key:
+            return group
+    return None
+
+
+async def resolve_group_schedule(city: str, country: str) -> Tuple[Optional[dict], Optional[tzinfo]]:
+    """
+    Today's prayer times and the timezone to schedule them in for a location
+
+    Returns:
+        Tuple of (timings dict, timezone) or (None, None) if the location can't be resolved
+    """
+    timings, _ = await get_prayer_times(city, country)
+    if not timings:
+        return None, None
+
+    timezone = get_location_timezone(city, country)
+    if not timezone:
+        logger.error(f"Unknown timezone for {city}, {country}")
+        return None, None
+    return timings, pytz.timezone(timezone)
+
+
+class LocalDayTracker:
+    """Local date each city group's triggers were last synced for"""
+
+    def __init__(self):
+        self._dates: Dict[str, date] = {}
+
+    @staticmethod
+    def _local_today(city: str, country: str) -> Optional[date]:
+        timezone = get_location_timezone(city, country)
+        return datetime.now(pytz.timezone(timezone)).date() if timezone else None
+
+    def due(self, key: str, city: str, country: str) -> bool:
+        """True if the group hasn't been synced since its local midnight (or its timezone is unknown)"""
+        today = self._local_today(city, country)
+        return today is None or self._dates.get(key) != today
+
+    def mark(self, key: str, city: str, country: str):
+        """Record that the group's triggers now follow its current local day"""
+        today = self._local_today(city, country)
+        if today is not None:
+            self._dates[key] = today
+
+
+async def iter_group_recipients(key: GroupKey, batch_size: int, feature: str) -> AsyncIterator[List[int]]:
+    """
+    Stream the user ids of a city group's active subscribers in this worker's shard in batches
+
+    Args:
+        key: Group key (see prayer_lookup_key)
+        batch_size: Users per batch
+        feature: Subscription feature (see subscriptions), e.g. 'prayer_reminders'
+    """
+    async with database.db.async_session_maker() as session:
+        # One range scan of the (feature, city_group) subscriptions index
+        stream = await session.stream_scalars(
+            select(Subscription.user_id)
+            .where(
+                Subscription.feature == feature,
+                Subscription.city_group == group_id(key),
+                active_recipient(Subscription.user_id),
+                owned_recipient(Subscription.user_id),
+            )
+            .execution_options(yield_per=batch_size)
+        )
+        async for batch in stream.partitions(batch_size):
+            yield list(batch)
+
+
+def _daily_time(trigger) -> Optional[Tuple[str, str, str]]:
+    """(hour, minute, timezone) a daily cron trigger fires at, None for any other trigger"""
+    if not isinstance(trigger, CronTrigger):
+        return None
+    fields = {field.name: str(field) for field in trigger.fields}
+    return fields['hour'], fields['minute'], str(trigger.timezone)
+
+
+def sync_daily_job(
+    scheduler: AsyncIOScheduler,
+    job_id: str,
+    func: Callable,
+    args: list,
+    at: datetime,
+    tz: tzinfo,
+) -> bool:
+    """
+    Make a job fire daily at the given local time, leaving it untouched if it already does
+
+    Args:
+        scheduler: Scheduler instance
+        job_id: Job id
+        func: Job function
+        args: Job arguments
+        at: Local time of day (only hour and minute are used)
+        tz: Timezone the time is in
+
+    Returns:
+        True if the job was added or its trigger moved
+    """
+    job = scheduler.get_job(job_id)
+    if job and _daily_time(job.trigger) == (str(at.hour), str(at.minute), str(tz)):
+        return False
+
+    scheduler.add_job(
+        func,
+        trigger=CronTrigger(hour=at.hour, minute=at.minute, timezone=tz),
+        args=args,
+        id=job_id,
+        replace_existing=True
+    )
+    return True
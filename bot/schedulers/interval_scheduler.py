@@ -0,0 +1,200 @@
+"""Phase-bucketed interval reminder engine (Allahu Allah)
+
+Each subscriber has a fixed phase: the minute of the interval cycle
+(counted from 00:00 SGT) their reminders fire at, quantized to
+INTERVAL_SLOT_MINUTES. The phase is stored once - when the user picks an
+interval it is set to the next slot (at least a minute ahead), so the
+first reminder comes within INTERVAL_SLOT_MINUTES and every later one a
+full interval after the previous; existing subscribers without a phase
+are spread deterministically across the cycle.
+
+Users are bucketed by (interval, phase) and each bucket has one daily cron
+job that fans out to its members in batches, so the job count is bounded
+by the number of slots instead of the number of users and no refresh or
+restart ever sends everyone a reminder at once. Intervals must divide 24.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Set, Tuple
+import pytz
+from aiogram import Bot
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select, update, func
+import database.db
+from database.models import UserSettings, Subscription
+from bot.schedulers.adkar_scheduler import send_allahu_allah
+from bot.utils.reminder_latency import reminder_latency
+from bot.utils.settings_cache import settings_cache
+from bot.utils.recipients import active_recipient
+from bot.schedulers.workers import owned_recipient
+from bot.schedulers.subscriptions import ALLAHU_ALLAH, interval_slot_params, sync_interval_params
+from config import INTERVAL_SLOT_MINUTES, REMINDER_BATCH_SIZE
+
+SINGAPORE_TZ = pytz.timezone('Asia/Singapore')
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[int, int]  # (interval hours, phase minutes)
+
+# A new subscription starts at the first slot at least this far ahead, so its job is in place in time
+FIRST_SLOT_LEAD_SECONDS = 60
+
+
+def next_phase(interval: int, now: Optional[datetime] = None) -> int:
+    """Phase of the next slot in an interval cycle, where a subscription made now starts"""
+    now = (now or datetime.now(SINGAPORE_TZ)).astimezone(SINGAPORE_TZ)
+    seconds = now.hour * 3600 + now.minute * 60 + now.second + FIRST_SLOT_LEAD_SECONDS
+    slot_seconds = INTERVAL_SLOT_MINUTES * 60
+    slots = -(-seconds // slot_seconds)
+    return slots * INTERVAL_SLOT_MINUTES % (interval * 60)
+
+
+def _slot_job_id(slot: Slot) -> str:
+    interval, phase = slot
+    return f"allahu_allah_slot_{interval}h_{phase:03d}"
+
+
+def _slot_trigger(slot: Slot) -> CronTrigger:
+    interval, phase = slot
+    return CronTrigger(hour=f"{phase // 60}-23/{interval}", minute=phase % 60, timezone=SINGAPORE_TZ)
+
+
+async def send_interval_fanout(bot: Bot, interval: int, phase: int):
+    """Send the Allahu Allah reminder to every subscriber in one (interval, phase) slot"""
+    if not database.db.async_session_maker:
+        logger.warning("Database session maker not initialized yet")
+        return
+    
+    scheduled_at = reminder_latency.scheduled_time(_slot_job_id((interval, phase)))
+    sent = 0
+    try:
+        async with database.db.async_session_maker() as session:
+            # One range scan of the partial subscriptions slot index
+            stream = await session.stream_scalars(
+                select(Subscription.user_id)
+                .where(
+                    Subscription.feature == ALLAHU_ALLAH,
+                    Subscription.params == interval_slot_params(interval, phase),
+                    active_recipient(Subscription.user_id),
+                    owned_recipient(Subscription.user_id),
+                )
+                .execution_options(yield_per=REMINDER_BATCH_SIZE)
+            )
+            async for batch in stream.partitions(REMINDER_BATCH_SIZE):
+                await asyncio.gather(*(send_allahu_allah(bot, user_id, scheduled_at) for user_id in batch))
+                sent += len(batch)
+    except Exception as e:
+        logger.error(f"Error in Allahu Allah fan-out for slot {_slot_job_id((interval, phase))}: {e}")
+    
+    logger.info(f"Allahu Allah fan-out ({interval}h, phase {phase}) delivered to {sent} users")
+
+
+def ensure_slot_job(scheduler: AsyncIOScheduler, bot: Bot, slot: Slot) -> bool:
+    """Add the fan-out job of a slot if it doesn't exist yet"""
+    job_id = _slot_job_id(slot)
+    if scheduler.get_job(job_id):
+        return False
+    scheduler.add_job(
+        send_interval_fanout,
+        trigger=_slot_trigger(slot),
+        args=[bot, *slot],
+        id=job_id,
+        replace_existing=True
+    )
+    return True
+
+
+async def _active_slots() -> Set[Slot]:
+    async with database.db.async_session_maker() as session:
+        # Subscribers from before phases existed are spread across the cycle by user id
+        slots_per_cycle = UserSettings.allahu_allah_interval * (60 // INTERVAL_SLOT_MINUTES)
+        assigned = await session.execute(
+            update(UserSettings)
+            .where(UserSettings.allahu_allah_interval.isnot(None), UserSettings.allahu_allah_phase.is_(None))
+            .values(allahu_allah_phase=(UserSettings.user_id % slots_per_cycle) * INTERVAL_SLOT_MINUTES)
+        )
+        if assigned.rowcount:
+            # The bulk update bypasses the repository: sync subscriptions and drop cached settings
+            await session.execute(sync_interval_params())
+            if settings_cache.notify:
+                await session.execute(select(settings_cache.notification()))
+        await session.commit()
+        if assigned.rowcount:
+            settings_cache.invalidate()
+        
+        result = await session.execute(
+            select(UserSettings.allahu_allah_interval, UserSettings.allahu_allah_phase)
+            .where(UserSettings.allahu_allah_interval.isnot(None), active_recipient())
+            .group_by(UserSettings.allahu_allah_interval, UserSettings.allahu_allah_phase)
+        )
+        return {tuple(row) for row in result.all()}
+
+
+async def sync_interval_slots(scheduler: AsyncIOScheduler, bot: Bot) -> int:
+    """
+    Make sure every occupied slot has a fan-out job and drop jobs of empty slots
+
+    Returns:
+        Number of slot jobs added
+    """
+    if not database.db.async_session_maker:
+        logger.warning("Database session maker not initialized yet")
+        return 0
+    
+    try:
+        slots = await _active_slots()
+    except Exception as e:
+        logger.error(f"Error loading Allahu Allah slots: {e}")
+        return 0
+    
+    added = sum(ensure_slot_job(scheduler, bot, slot) for slot in slots)
+    
+    active = {_slot_job_id(slot) for slot in slots}
+    for job in scheduler.get_jobs():
+        # Per-user interval jobs are from before slots
+        if job.func is send_allahu_allah or (job.func is send_interval_fanout and job.id not in active):
+            job.remove()
+    
+    logger.info(f"Allahu Allah: {len(slots)} active slots, {added} slot jobs added")
+    return added
+
+
+async def _remove_slot_if_empty(scheduler: AsyncIOScheduler, slot: Slot):
+    job_id = _slot_job_id(slot)
+    if not scheduler.get_job(job_id):
+        return
+    async with database.db.async_session_maker() as session:
+        members = await session.scalar(
+            select(func.count()).select_from(UserSettings)
+            .where(
+                UserSettings.allahu_allah_interval == slot[0],
+                UserSettings.allahu_allah_phase == slot[1],
+                active_recipient(),
+            )
+        )
+    if not members:
+        scheduler.remove_job(job_id)
+
+
+async def apply_interval_change(scheduler: AsyncIOScheduler, bot: Bot, user_id: int, previous: Optional[Slot], current: Optional[Slot]):
+    """
+    Apply a user's Allahu Allah change after it was committed
+
+    Args:
+        scheduler: Scheduler instance
+        bot: Bot instance
+        user_id: User whose setting changed
+        previous: (interval, phase) before the change, None if it was off
+        current: (interval, phase) after the change, None if turned off
+    """
+    try:
+        if current:
+            # The slot job sends the first reminder too (see next_phase)
+            ensure_slot_job(scheduler, bot, current)
+        if previous and previous != current:
+            await _remove_slot_if_empty(scheduler, previous)
+    except Exception as e:
+        logger.error(f"Error applying Allahu Allah change for user {user_id}: {e}")
@@ -0,0 +1,425 @@
+"""Postgres-persisted scheduler job store
+
+APScheduler's own SQLAlchemyJobStore is synchronous and can't use our async
+engine, so jobs are served from memory (MemoryJobStore) and every change is
+written through to the scheduler_jobs table in the background via
+database.db.engine. On startup the stored jobs are loaded back instead of
+rebuilding every reminder, and jobs missed while the bot was down follow
+their misfire_grace_time/coalesce policy.
+
+Job args may reference the Bot and the scheduler itself; those are stored as
+placeholders and re-bound on load. Each row carries JOB_DEFINITIONS_VERSION;
+rows from another version are dropped on load so the caller can rebuild them.
+
+With several scheduler workers (see workers) the table is shared. Every
+flush sends a Postgres NOTIFY with the changed job ids, delivered when its
+transaction commits; each process LISTENs on a dedicated connection and
+sync()s just those jobs, so a job the leader adds or moves is live on every
+worker right away instead of after a poll. Whenever the listener
+(re)connects, everything is synced, since notifications may have been
+missed.
+"""
+
+import asyncio
+import logging
+import pickle
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+import database.db
+from database.models import SchedulerJob, SchedulerState
+from config import SCHEDULER_JOBS_CHANNEL, SCHEDULER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Bump when a job function's signature or args change; older stored jobs are then discarded
+JOB_DEFINITIONS_VERSION = 2
+
+_BOT_PLACEHOLDER = "<runtime:bot>"
+_SCHEDULER_PLACEHOLDER = "<runtime:scheduler>"
+
+# Rows per upsert statement (keeps bind parameters well under Postgres' limit)
+FLUSH_BATCH_SIZE = 1000
+
+# Key of the last successful reconcile timestamp in scheduler_state
+RECONCILED_AT = "reconciled_at"
+
+# Notification payloads are "<sender>" and the changed job ids, one per line ("*" for every job);
+# a process ignores its own
+_SENDER = uuid.uuid4().hex[:12]
+_ALL_JOBS = "*"
+# Postgres caps NOTIFY payloads at 8000 bytes
+_MAX_PAYLOAD_BYTES = 7900
+_RECONNECT_SECONDS = 5
+
+
+class PersistentJobStore(MemoryJobStore):
+    """In-memory job store with asynchronous write-through to Postgres"""
+
+    def __init__(self, version: int = JOB_DEFINITIONS_VERSION, channel: str = SCHEDULER_JOBS_CHANNEL):
+        super().__init__()
+        self.version = version
+        self.channel = channel
+        # Other processes only store jobs when there are several workers
+        self.notify = SCHEDULER_WORKERS > 1
+        self._bot = None
+        # job id -> (pickled state, next run timestamp), or None for a deletion
+        self._pending: Dict[str, Optional[Tuple[bytes, Optional[float]]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # job id -> pickled state without next_run_time, to tell real changes from runs
+        self._definitions: Dict[str, bytes] = {}
+        self._memory_only: Set[str] = set()
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        # Jobs other workers announced, applied by one sync task at a time
+        self._requested: Set[str] = set()
+        self._requested_all = False
+        self._sync_task: Optional[asyncio.Task] = None
+
+        self.loaded = 0
+        self.discarded = 0
+        self.synced = 0
+
+    def bind(self, bot):
+        """Set the Bot instance that placeholder job args resolve to"""
+        self._bot = bot
+
+    # Serialization
+
+    def _externalize(self, value: Any) -> Any:
+        if self._bot is not None and value is self._bot:
+            return _BOT_PLACEHOLDER
+        if value is self._scheduler:
+            return _SCHEDULER_PLACEHOLDER
+        return value
+
+    def _internalize(self, value: Any) -> Any:
+        if isinstance(value, str) and value == _BOT_PLACEHOLDER:
+            return self._bot
+        if isinstance(value, str) and value == _SCHEDULER_PLACEHOLDER:
+            return self._scheduler
+        return value
+
+    def _serialize(self, job: Job) -> Optional[bytes]:
+        try:
+            state = job.__getstate__()
+            state["args"] = tuple(self._externalize(arg) for arg in state["args"])
+            state["kwargs"] = {key: self._externalize(value) for key, value in state["kwargs"].items()}
+            job_state = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+            # From the stored form: pickles of the live objects differ from those of their stored copies
+            self._definitions[job.id] = _definition(pickle.loads(job_state))
+            self._memory_only.discard(job.id)
+            return job_state
+        except Exception as e:
+            logger.error(f"Job {job.id} can't be persisted and will only live in memory: {e}")
+            self._memory_only.add(job.id)
+            return None
+
+    def _reconstitute(self, job_state: bytes) -> Job:
+        state = pickle.loads(job_state)
+        state["args"] = tuple(self._internalize(arg) for arg in state["args"])
+        state["kwargs"] = {key: self._internalize(value) for key, value in state["kwargs"].items()}
+        state["jobstore"] = self
+        job = Job.__new__(Job)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    # Write-through
+
+    def _record(self, job_id: str, state: Optional[bytes], job: Optional[Job] = None):
+        self._pending[job_id] = (state, datetime_to_utc_timestamp(job.next_run_time)) if state is not None else None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Flushed on the next change or on shutdown
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self.flush())
+
+    def add_job(self, job: Job):
+        super().add_job(job)
+        state = self._serialize(job)
+        if state is not None:
+            self._record(job.id, state, job)
+
+    def update_job(self, job: Job):
+        super().update_job(job)
+        state = self._serialize(job)
+        if state is not None:
+            self._record(job.id, state, job)
+
+    def remove_job(self, job_id: str):
+        super().remove_job(job_id)
+        self._forget(job_id)
+        self._record(job_id, None)
+
+    def remove_all_jobs(self):
+        for job in self.get_all_jobs():
+            self._forget(job.id)
+            self._record(job.id, None)
+        super().remove_all_jobs()
+
+    def _forget(self, job_id: str):
+        self._definitions.pop(job_id, None)
+        self._memory_only.discard(job_id)
+
+    def shutdown(self):
+        # Only drop the in-memory copy - stored jobs must survive the restart
+        MemoryJobStore.remove_all_jobs(self)
+
+    async def flush(self):
+        """Write pending job changes to the database"""
+        while self._pending and database.db.engine is not None:
+            pending, self._pending = self._pending, {}
+            upserts = [
+                {"id": job_id, "version": self.version, "next_run_time": change[1], "job_state": change[0]}
+                for job_id, change in pending.items() if change is not None
+            ]
+            deletes = [job_id for job_id, change in pending.items() if change is None]
+            try:
+                async with database.db.async_session_maker() as session:
+                    if deletes:
+                        await session.execute(delete(SchedulerJob).where(SchedulerJob.id.in_(deletes)))
+                    for start in range(0, len(upserts), FLUSH_BATCH_SIZE):
+                        stmt = pg_insert(SchedulerJob).values(upserts[start:start + FLUSH_BATCH_SIZE])
+                        await session.execute(stmt.on_conflict_do_update(
+                            index_elements=[SchedulerJob.id],
+                            set_={
+                                "version": stmt.excluded.version,
+                                "next_run_time": stmt.excluded.next_run_time,
+                                "job_state": stmt.excluded.job_state,
+                            }
+                        ))
+                    if self.notify:
+                        await session.execute(select(self._notification(pending)))
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Error persisting {len(pending)} scheduler job changes: {e}")
+                # Keep newer changes made while this batch was in flight
+                self._pending = {**pending, **self._pending}
+                return
+
+    # Loading
+
+    async def load(self) -> int:
+        """
+        Load stored jobs into memory (call once the database is initialized)
+
+        Returns:
+            Number of jobs loaded
+        """
+        async with database.db.async_session_maker() as session:
+            result = await session.execute(select(SchedulerJob.id, SchedulerJob.version, SchedulerJob.job_state))
+            rows = result.all()
+
+        for job_id, version, job_state in rows:
+            if self.lookup_job(job_id):
+                continue  # Re-created during this startup - the in-memory one is current
+            if version != self.version:
+                self.discarded += 1
+                self._record(job_id, None)
+                continue
+            try:
+                job = self._reconstitute(job_state)
+            except Exception as e:
+                logger.warning(f"Discarding stored job {job_id} that can't be restored: {e}")
+                self.discarded += 1
+                self._record(job_id, None)
+                continue
+            MemoryJobStore.add_job(self, job)
+            self._definitions[job_id] = _definition(pickle.loads(job_state))
+            self.loaded += 1
+
+        if self._scheduler and self.loaded:
+            self._scheduler.wakeup()
+        logger.info(f"Loaded {self.loaded} stored scheduler jobs ({self.discarded} outdated discarded)")
+        return self.loaded
+
+    def _notification(self, job_ids: Iterable[str]):
+        """SQL expression announcing changed jobs to the other processes (sent on commit)"""
+        payload = "\n".join([_SENDER, *job_ids])
+        if len(payload.encode()) > _MAX_PAYLOAD_BYTES:
+            payload = f"{_SENDER}\n{_ALL_JOBS}"
+        return func.pg_notify(self.channel, payload)
+
+    async def sync(self, job_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Apply the job changes other workers stored
+
+        Jobs whose trigger or args differ from their row are replaced, new rows
+        are added and jobs whose row is gone are removed. Rows that only differ
+        in next_run_time are ignored, so a job that already ran here doesn't
+        run again because another worker hasn't stored its run yet.
+
+        Args:
+            job_ids: Only compare these jobs (from a change notification); every job by default
+
+        Returns:
+            Number of jobs added, replaced or removed
+        """
+        # Store our own changes first so they aren't mistaken for other workers' deletions
+        await self.flush()
+        if self._pending:
+            return 0
+
+        query = select(SchedulerJob.id, SchedulerJob.job_state).where(SchedulerJob.version == self.version)
+        if job_ids is not None:
+            job_ids = set(job_ids)
+            query = query.where(SchedulerJob.id.in_(job_ids))
+        async with database.db.async_session_maker() as session:
+            rows = (await session.execute(query)).all()
+
+        changed = 0
+        stored = set()
+        for job_id, job_state in rows:
+            stored.add(job_id)
+            if job_id in self._pending:
+                continue  # Changed here while the rows were being read
+            try:
+                definition = _definition(pickle.loads(job_state))
+                if self.lookup_job(job_id) and self._definitions.get(job_id) == definition:
+                    continue
+                job = self._reconstitute(job_state)
+            except Exception as e:
+                logger.warning(f"Skipping stored job {job_id} that can't be restored: {e}")
+                continue
+            if self.lookup_job(job_id):
+                MemoryJobStore.update_job(self, job)
+            else:
+                MemoryJobStore.add_job(self, job)
+            self._definitions[job_id] = definition
+            changed += 1
+
+        if job_ids is None:
+            candidates = [job.id for job in self.get_all_jobs()]
+        else:
+            candidates = [job_id for job_id in job_ids if self.lookup_job(job_id)]
+        for job_id in candidates:
+            if job_id not in stored and job_id not in self._pending and job_id not in self._memory_only:
+                MemoryJobStore.remove_job(self, job_id)
+                self._forget(job_id)
+                changed += 1
+
+        if changed:
+            self.synced += changed
+            logger.info(f"Applied {changed} scheduler job changes stored by other workers")
+            if self._scheduler:
+                self._scheduler.wakeup()
+        return changed
+
+
+    # Change notifications
+
+    async def start_listening(self):
+        """Start listening for other workers' job changes (no-op with a single worker)"""
+        if not self.notify:
+            return
+        await self._listen()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop_listening(self):
+        """Stop listening"""
+        for task in (self._task, self._sync_task):
+            if task:
+                task.cancel()
+        self._task = self._sync_task = None
+        await self._release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(_RECONNECT_SECONDS)
+            if self._connection is None:
+                await self._listen()
+                continue
+            try:
+                # Notifications are only delivered while the connection is idle - check it's alive
+                await self._connection.execute(select(1))
+                await self._connection.commit()
+            except Exception as e:
+                logger.error(f"Scheduler job listener connection failed: {e}")
+                await self._release()
+
+    async def _listen(self):
+        try:
+            self._connection = await database.db.engine.connect()
+            raw = await self._connection.get_raw_connection()
+            await raw.driver_connection.add_listener(self.channel, self._on_notification)
+        except Exception as e:
+            logger.error(f"Error listening for scheduler job changes: {e}")
+            await self._release()
+            return
+        logger.info(f"Scheduler job store listening on {self.channel}")
+        # Anything stored before may have been missed
+        self.request_sync()
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        sender, *job_ids = payload.split("\n")
+        if sender == _SENDER:
+            return
+        self.request_sync(None if _ALL_JOBS in job_ids else job_ids)
+
+    def request_sync(self, job_ids: Optional[Iterable[str]] = None):
+        """Sync the given jobs (every job by default) in the background, coalescing repeated requests"""
+        self._queue_sync(job_ids)
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._apply_requested())
+
+    def _queue_sync(self, job_ids: Optional[Iterable[str]]):
+        if job_ids is None:
+            self._requested_all = True
+        else:
+            self._requested.update(job_ids)
+
+    async def _apply_requested(self):
+        while self._requested_all or self._requested:
+            job_ids = None if self._requested_all else self._requested
+            self._requested_all, self._requested = False, set()
+            try:
+                await self.sync(job_ids)
+                # Nothing was compared if our own changes couldn't be stored first
+                retry = bool(self._pending)
+            except Exception as e:
+                logger.error(f"Error applying scheduler job changes from other workers: {e}")
+                retry = True
+            if retry:
+                self._queue_sync(job_ids)
+                await asyncio.sleep(_RECONNECT_SECONDS)
+
+    async def _release(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            try:
+                await connection.invalidate()
+                await connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing scheduler job listener connection: {e}")
+
+def _definition(state: Dict[str, Any]) -> bytes:
+    """What a job does and when it fires, without its next run time"""
+    return pickle.dumps({key: value for key, value in state.items() if key != "next_run_time"}, pickle.HIGHEST_PROTOCOL)
+
+
+async def get_reconciled_at() -> Optional[datetime]:
+    """When stored schedules were last reconciled with subscriptions (None if never)"""
+    async with database.db.async_session_maker() as session:
+        result = await session.execute(
+            select(SchedulerState.value).where(SchedulerState.key == RECONCILED_AT)
+        )
+        return result.scalar_one_or_none()
+
+
+async def set_reconciled_at(value: datetime):
+    """Record a successful reconcile"""
+    async with database.db.async_session_maker() as session:
+        stmt = pg_insert(SchedulerState).values(key=RECONCILED_AT, value=value)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[SchedulerState.key], set_={"value": stmt.excluded.value}
+        ))
+        await session.commit()
@@ -19,20 +19,35 @@ How to Use:
 6. Bot automatically distributes every Friday at 10:00 AM SGT
 """
 
+import asyncio
+import hashlib
 import logging
-import aiohttp
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
 from aiogram.types import FSInputFile, BufferedInputFile
-from sqlalchemy import select
+from sqlalchemy import select, update, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 import database.db
-from database.models import UserSettings
-from config import KHUTBAH_PDF_URL, KHUTBAH_ENABLED, KHUTBAH_MUIS_PAGE
+from database.models import Subscription, Khutbah, KhutbahDistribution, KhutbahDelivery
+from config import (
+    KHUTBAH_PDF_URL, KHUTBAH_ENABLED, KHUTBAH_MUIS_PAGE,
+    KHUTBAH_SEND_CONCURRENCY, KHUTBAH_BATCH_SIZE, KHUTBAH_MAX_ATTEMPTS, KHUTBAH_RETRY_DELAY_SECONDS
+)
+from bot.utils.delivery_queue import delivery_queue, PRIORITY_BULK
+from bot.utils.http_client import http_client
+from bot.utils.recipients import active_recipient, is_permanent_failure
+from bot.utils.bulk import iter_chunks
+from bot.schedulers.subscriptions import FRIDAY_KHUTBAH
+from bot.schedulers.workers import leader_only
 import os
 
 logger = logging.getLogger(__name__)
 
+# Advisory lock class of distribution runs: pg_try_advisory_lock(_RUN_LOCK_CLASS, run id)
+_RUN_LOCK_CLASS = 7242402
+
 
 async def download_khutbah_pdf() -> tuple[bytes | None, str]:
     """
@@ -63,27 +78,260 @@ async def download_khutbah_pdf() -> tuple[bytes | None, str]:
         return None, ""
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(KHUTBAH_PDF_URL, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status == 200:
-                    pdf_bytes = await response.read()
-                    
-                    # Generate filename with current date
-                    today = datetime.now()
-                    filename = f"Friday_Khutbah_{today.strftime('%Y%m%d')}.pdf"
-                    
-                    logger.info(f"Downloaded Friday Khutbah PDF from manual URL: {filename}")
-                    return pdf_bytes, filename
-                else:
-                    logger.error(f"Failed to download Khutbah PDF: HTTP {response.status}")
-                    return None, ""
+        async with http_client.get("khutbah_pdf", KHUTBAH_PDF_URL) as response:
+            if response.status == 200:
+                pdf_bytes = await response.read()
+                
+                # Generate filename with current date
+                today = datetime.now()
+                filename = f"Friday_Khutbah_{today.strftime('%Y%m%d')}.pdf"
+                
+                logger.info(f"Downloaded Friday Khutbah PDF from manual URL: {filename}")
+                return pdf_bytes, filename
+            else:
+                logger.error(f"Failed to download Khutbah PDF: HTTP {response.status}")
+                return None, ""
     except Exception as e:
         logger.error(f"Error downloading Khutbah PDF: {e}")
         return None, ""
 
 
+KHUTBAH_CAPTION = (
+    "🕌 *Jumʿah Mubārak!* 🕌\n\n"
+    "Here is this week's Friday Khutbah.\n\n"
+    "May Allah accept our ṣalāh and grant us beneficial knowledge 🤲\n\n"
+    "﴿ يَـٰٓأَيُّهَا ٱلَّذِينَ ءَامَنُوٓا۟ إِذَا نُودِىَ لِلصَّلَوٰةِ مِن يَوْمِ ٱلْجُمُعَةِ فَٱسْعَوْا۟ إِلَىٰ ذِكْرِ ٱللَّهِ ﴾\n"
+    "_O believers! When the call to prayer is made on Friday, then proceed to the remembrance of Allah..._"
+)
+
+
+async def get_or_create_khutbah(session: AsyncSession, pdf_bytes: bytes, filename: str) -> Khutbah:
+    """Find the stored khutbah for this PDF (by content hash) or register a new one"""
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    
+    result = await session.execute(
+        select(Khutbah).where(Khutbah.content_hash == content_hash)
+    )
+    khutbah = result.scalar_one_or_none()
+    
+    if not khutbah:
+        khutbah = Khutbah(content_hash=content_hash, filename=filename)
+        session.add(khutbah)
+        await session.commit()
+        logger.info(f"Registered new khutbah {filename} ({content_hash[:16]}...)")
+    
+    return khutbah
+
+
+async def start_khutbah_distribution(session: AsyncSession, khutbah: Khutbah) -> KhutbahDistribution:
+    """
+    Get the distribution run for a khutbah, creating it if needed
+    
+    A new run snapshots every opted-in user as a pending recipient in the same
+    transaction, so a restarted run only ever resumes the remaining recipients.
+    """
+    result = await session.execute(
+        select(KhutbahDistribution).where(KhutbahDistribution.khutbah_id == khutbah.id)
+    )
+    run = result.scalar_one_or_none()
+    if run:
+        return run
+    
+    run = KhutbahDistribution(khutbah_id=khutbah.id)
+    session.add(run)
+    await session.flush()
+    
+    # One range scan of the subscriptions audience index; inactive users are skipped
+    await session.execute(
+        pg_insert(KhutbahDelivery)
+        .from_select(
+            ['distribution_id', 'user_id'],
+            select(literal(run.id), Subscription.user_id)
+            .where(Subscription.feature == FRIDAY_KHUTBAH, active_recipient(Subscription.user_id))
+        )
+        .on_conflict_do_nothing()
+    )
+    await session.commit()
+    logger.info(f"Started khutbah distribution run {run.id} for {khutbah.filename}")
+    return run
+
+
+async def _send_khutbah_to_user(bot: Bot, khutbah: Khutbah, user_id: int, pdf_bytes: bytes | None) -> Exception | None:
+    """Send the khutbah to one user
+    
+    Returns:
+        None on success, otherwise the error
+    """
+    try:
+        if khutbah.telegram_file_id:
+            # Already on Telegram's servers - send by reference
+            document = khutbah.telegram_file_id
+        else:
+            # First successful send uploads the file
+            document = BufferedInputFile(pdf_bytes, filename=khutbah.filename)
+        
+        sent = await delivery_queue.send_document(
+            bot,
+            user_id,
+            document,
+            caption=KHUTBAH_CAPTION,
+            parse_mode="Markdown",
+            priority=PRIORITY_BULK
+        )
+        
+        if not khutbah.telegram_file_id and sent.document:
+            khutbah.telegram_file_id = sent.document.file_id
+            async with database.db.async_session_maker() as session:
+                await session.execute(
+                    update(Khutbah).where(Khutbah.id == khutbah.id).values(telegram_file_id=khutbah.telegram_file_id)
+                )
+                await session.commit()
+            logger.info(f"Uploaded khutbah {khutbah.filename} once, reusing file_id for remaining users")
+        
+        logger.info(f"Sent Friday Khutbah to user {user_id}")
+        return None
+    except Exception as e:
+        logger.error(f"Error sending Khutbah to user {user_id}: {e}")
+        return e
+
+
+async def run_khutbah_distribution(bot: Bot, distribution_id: int, pdf_bytes: bytes | None = None):
+    """
+    Deliver a distribution run to its pending recipients with bounded concurrency
+    
+    Progress is checkpointed per batch, so after a restart at most one batch
+    is re-sent. Recipients that failed transiently stay pending and are sent
+    again in a later pass (or on resume), up to KHUTBAH_MAX_ATTEMPTS sends;
+    only permanent failures (blocked, deleted chats) are given up at once. The run is claimed with a session-level advisory lock held for
+    as long as it is being sent, so the startup resume, a leader takeover and a
+    late scheduled send never deliver the same run at once; the lock is released
+    with its connection if the process dies.
+    """
+    async with database.db.engine.connect() as lock_connection:
+        claimed = (await lock_connection.execute(
+            select(func.pg_try_advisory_lock(_RUN_LOCK_CLASS, distribution_id))
+        )).scalar()
+        await lock_connection.commit()
+        if not claimed:
+            logger.info(f"Khutbah distribution run {distribution_id} is already being sent, skipping")
+            return
+        try:
+            await _deliver_khutbah_distribution(bot, distribution_id, pdf_bytes)
+        finally:
+            try:
+                await lock_connection.execute(select(func.pg_advisory_unlock(_RUN_LOCK_CLASS, distribution_id)))
+                await lock_connection.commit()
+            except Exception as e:
+                # Discard the connection rather than return it to the pool still holding the lock
+                logger.error(f"Error releasing khutbah distribution run {distribution_id}: {e}")
+                await lock_connection.invalidate()
+
+
+async def _deliver_khutbah_distribution(bot: Bot, distribution_id: int, pdf_bytes: bytes | None):
+    async with database.db.async_session_maker() as session:
+        run = await session.get(KhutbahDistribution, distribution_id)
+        khutbah = await session.get(Khutbah, run.khutbah_id)
+    
+    if run.status != 'running':
+        # Finished by whoever held the run before us
+        logger.info(f"Khutbah distribution run {distribution_id} is already {run.status}")
+        return
+    
+    semaphore = asyncio.Semaphore(KHUTBAH_SEND_CONCURRENCY)
+    
+    async def send_bounded(user_id: int) -> tuple[int, Exception | None]:
+        async with semaphore:
+            return user_id, await _send_khutbah_to_user(bot, khutbah, user_id, pdf_bytes)
+    
+    pending = select(KhutbahDelivery.user_id, KhutbahDelivery.attempts).where(
+        KhutbahDelivery.distribution_id == distribution_id,
+        KhutbahDelivery.status == 'pending'
+    )
+    while True:
+        retrying = 0
+        async for chunk in iter_chunks(pending, KhutbahDelivery.user_id, KHUTBAH_BATCH_SIZE):
+            attempts = {row.user_id: row.attempts for row in chunk}
+            
+            outcomes = {}
+            remaining = list(attempts)
+            
+            if not khutbah.telegram_file_id:
+                if pdf_bytes is None:
+                    pdf_bytes, _ = await download_khutbah_pdf()
+                    if not pdf_bytes or hashlib.sha256(pdf_bytes).hexdigest() != khutbah.content_hash:
+                        logger.error(f"Khutbah {khutbah.filename} is no longer available for upload, abandoning run {distribution_id}")
+                        await _finish_khutbah_distribution(distribution_id, status='abandoned')
+                        return
+                
+                # Upload sequentially until one send succeeds and yields a file_id
+                while remaining and not khutbah.telegram_file_id:
+                    user_id = remaining.pop(0)
+                    outcomes[user_id] = await _send_khutbah_to_user(bot, khutbah, user_id, pdf_bytes)
+            
+            outcomes.update(await asyncio.gather(*(send_bounded(user_id) for user_id in remaining)))
+            
+            # Checkpoint this batch
+            updates = []
+            for user_id, error in outcomes.items():
+                tries = attempts[user_id] + 1
+                if error is None:
+                    status = 'sent'
+                elif is_permanent_failure(error) or tries >= KHUTBAH_MAX_ATTEMPTS:
+                    status = 'failed'
+                else:
+                    status = 'pending'
+                    retrying += 1
+                updates.append({
+                    'distribution_id': distribution_id,
+                    'user_id': user_id,
+                    'status': status,
+                    'attempts': tries,
+                    'error': None if error is None else str(error)[:500],
+                })
+            async with database.db.async_session_maker() as session:
+                await session.execute(update(KhutbahDelivery), updates)
+                await session.commit()
+        
+        if not retrying:
+            break
+        logger.info(f"Retrying {retrying} khutbah recipients of run {distribution_id} in {KHUTBAH_RETRY_DELAY_SECONDS}s")
+        await asyncio.sleep(KHUTBAH_RETRY_DELAY_SECONDS)
+    
+    await _finish_khutbah_distribution(distribution_id)
+
+
+async def _finish_khutbah_distribution(distribution_id: int, status: str = 'completed'):
+    """Record final counts and status for a distribution run"""
+    async with database.db.async_session_maker() as session:
+        result = await session.execute(
+            select(KhutbahDelivery.status, func.count())
+            .where(KhutbahDelivery.distribution_id == distribution_id)
+            .group_by(KhutbahDelivery.status)
+        )
+        counts = dict(result.all())
+        
+        run = await session.get(KhutbahDistribution, distribution_id)
+        run.status = status
+        run.sent_count = counts.get('sent', 0)
+        run.failed_count = counts.get('failed', 0)
+        run.completed_at = func.now()
+        await session.commit()
+    
+    logger.info(
+        f"Friday Khutbah distribution {status}: {counts.get('sent', 0)} successful, "
+        f"{counts.get('failed', 0)} failed"
+    )
+
+
+@leader_only
 async def send_friday_khutbah(bot: Bot):
-    """Send Friday Khutbah PDF to all subscribed users"""
+    """Send Friday Khutbah PDF to all subscribed users (on the scheduler leader only)
+    
+    The PDF is uploaded to Telegram only once; the returned file_id is stored
+    on the khutbah record and reused for every other recipient, including
+    re-sends after a restart. Each khutbah is distributed by a single run, so
+    a late re-send only delivers to recipients that have not received it.
+    """
     if not KHUTBAH_ENABLED:
         logger.info("Friday Khutbah distribution is disabled")
         return
@@ -96,52 +344,43 @@ async def send_friday_khutbah(bot: Bot):
             logger.error("Could not download Khutbah PDF, skipping distribution")
             return
         
-        # Get all users who want to receive Friday Khutbah
-        # For now, send to all active users
         if not database.db.async_session_maker:
             logger.warning("Database session maker not initialized yet")
             return
         
         async with database.db.async_session_maker() as session:
-            result = await session.execute(select(UserSettings))
-            all_users = result.scalars().all()
-            
-            success_count = 0
-            fail_count = 0
-            
-            for settings in all_users:
-                try:
-                    # Create BufferedInputFile from bytes
-                    document = BufferedInputFile(pdf_bytes, filename=filename)
-                    
-                    caption = (
-                        "🕌 *Jumʿah Mubārak!* 🕌\n\n"
-                        "Here is this week's Friday Khutbah.\n\n"
-                        "May Allah accept our ṣalāh and grant us beneficial knowledge 🤲\n\n"
-                        "﴿ يَـٰٓأَيُّهَا ٱلَّذِينَ ءَامَنُوٓا۟ إِذَا نُودِىَ لِلصَّلَوٰةِ مِن يَوْمِ ٱلْجُمُعَةِ فَٱسْعَوْا۟ إِلَىٰ ذِكْرِ ٱللَّهِ ﴾\n"
-                        "_O believers! When the call to prayer is made on Friday, then proceed to the remembrance of Allah..._"
-                    )
-                    
-                    await bot.send_document(
-                        chat_id=settings.user_id,
-                        document=document,
-                        caption=caption,
-                        parse_mode="Markdown"
-                    )
-                    
-                    success_count += 1
-                    logger.info(f"Sent Friday Khutbah to user {settings.user_id}")
-                    
-                except Exception as e:
-                    fail_count += 1
-                    logger.error(f"Error sending Khutbah to user {settings.user_id}: {e}")
-            
-            logger.info(f"Friday Khutbah distribution complete: {success_count} successful, {fail_count} failed")
+            khutbah = await get_or_create_khutbah(session, pdf_bytes, filename)
+            run = await start_khutbah_distribution(session, khutbah)
+        
+        if run.status != 'running':
+            logger.info(f"Khutbah {khutbah.filename} was already distributed (run {run.id}, {run.status})")
+            return
+        
+        await run_khutbah_distribution(bot, run.id, pdf_bytes)
             
     except Exception as e:
         logger.error(f"Error in Friday Khutbah distribution: {e}")
 
 
+async def resume_khutbah_distributions(bot: Bot):
+    """Resume distribution runs interrupted by a restart"""
+    if not KHUTBAH_ENABLED or not database.db.async_session_maker:
+        return
+    
+    try:
+        async with database.db.async_session_maker() as session:
+            result = await session.execute(
+                select(KhutbahDistribution.id).where(KhutbahDistribution.status == 'running')
+            )
+            run_ids = result.scalars().all()
+        
+        for run_id in run_ids:
+            logger.info(f"Resuming interrupted khutbah distribution run {run_id}")
+            await run_khutbah_distribution(bot, run_id)
+    except Exception as e:
+        logger.error(f"Error resuming khutbah distributions: {e}")
+
+
 def setup_khutbah_scheduler(scheduler: AsyncIOScheduler, bot: Bot):
     """Setup Friday Khutbah distribution scheduler"""
     if not KHUTBAH_ENABLED:
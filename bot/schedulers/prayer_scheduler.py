@@ -1,111 +1,319 @@
-"""Prayer time scheduler"""
+"""Prayer time scheduler
 
+Reminders follow each user's own city (UserSettings.city/country) and are
+scheduled in that city's timezone. Two scheduling modes are supported:
+- Fan-out (default): subscribers are grouped by location (see city_groups);
+  each group gets one job per (prayer, offset) that streams its recipients
+  from the database and delivers in batches
+- Per-user: one job per user per prayer (REMINDER_FANOUT_ENABLED=false)
+
+Jobs are daily cron triggers; the hourly refresh recomputes a city's times
+after its local midnight and only moves the triggers whose time changed.
+"""
+
+import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 from aiogram import Bot
 from sqlalchemy import select
 import database.db
 from database.models import UserSettings
-from bot.utils.prayer_api import get_prayer_times
-from config import DEFAULT_CITY, DEFAULT_COUNTRY
+from bot.utils.delivery_queue import delivery_queue, DeliveryTrace
+from bot.utils.reminder_latency import reminder_latency
+from bot.utils.recipients import active_recipient
+from bot.utils.bulk import iter_chunks
+from bot.schedulers.workers import owns_user, leader_only
+from bot.schedulers.city_groups import (
+    CityGroup, GroupKey, LocalDayTracker, group_id, load_city_groups, load_location_group,
+    resolve_group_schedule, iter_group_recipients, sync_daily_job
+)
+from bot.schedulers.subscriptions import PRAYER_REMINDERS
+from bot.utils.prayer_api import prayer_lookup_key
+from config import DEFAULT_CITY, DEFAULT_COUNTRY, REMINDER_FANOUT_ENABLED, REMINDER_BATCH_SIZE, SCHEDULING_CHUNK_SIZE
 
 SINGAPORE_TZ = pytz.timezone('Asia/Singapore')
+PRAYERS = ['Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']
+REMINDER_STATUSES = ("10 minutes", "entered")
 
 logger = logging.getLogger(__name__)
 
+# City groups (by group id) whose reminders follow their current local day
+_synced_days = LocalDayTracker()
 
-async def send_prayer_reminder(bot: Bot, user_id: int, prayer: str, status: str):
-    """Send prayer reminder to user"""
+
+async def send_prayer_reminder(bot: Bot, user_id: int, prayer: str, status: str, scheduled_at: Optional[datetime] = None):
+    """Send prayer reminder to user
+    
+    scheduled_at is when the reminder was due; per-user jobs look it up from their own job id.
+    """
+    if not owns_user(user_id):
+        return  # Per-user jobs fire on every worker; the user's shard delivers
+    
     try:
         if status == "10 minutes":
             text = f"🔔 {prayer} prayer in 10 minutes"
         else:
             text = f"🕌 {prayer} prayer time has entered"
         
-        await bot.send_message(user_id, text)
+        if scheduled_at is None:
+            scheduled_at = reminder_latency.scheduled_time(_user_job_id(user_id, prayer, status))
+        trace = DeliveryTrace()
+        await delivery_queue.send_message(bot, user_id, text, trace=trace)
+        reminder_latency.record(_latency_type(status), scheduled_at, trace)
         logger.info(f"Sent {prayer} reminder ({status}) to user {user_id}")
     except Exception as e:
         logger.error(f"Error sending prayer reminder to {user_id}: {e}")
 
 
-async def schedule_user_prayer_reminders(scheduler: AsyncIOScheduler, bot: Bot, user_id: int):
-    """Schedule prayer reminders for a specific user"""
-    timings, _ = await get_prayer_times(DEFAULT_CITY, DEFAULT_COUNTRY)
+async def send_prayer_reminder_fanout(bot: Bot, prayer: str, status: str, group_key: GroupKey):
+    """Send a prayer reminder to every subscriber in a city group, streaming recipients in batches"""
+    if not database.db.async_session_maker:
+        logger.warning("Database session maker not initialized yet")
+        return
+    
+    scheduled_at = reminder_latency.scheduled_time(_fanout_job_id(group_id(group_key), prayer, status))
+    sent = 0
+    try:
+        async for batch in iter_group_recipients(group_key, REMINDER_BATCH_SIZE, PRAYER_REMINDERS):
+            await asyncio.gather(*(
+                send_prayer_reminder(bot, user_id, prayer, status, scheduled_at) for user_id in batch
+            ))
+            sent += len(batch)
+    except Exception as e:
+        logger.error(f"Error in {prayer} reminder fan-out ({status}) for {group_id(group_key)}: {e}")
+    
+    logger.info(f"{prayer} reminder fan-out ({status}) delivered to {sent} users in {group_id(group_key)}")
+
+
+def _reminder_times(timings: dict):
+    """Yield (prayer, status, local time) for every reminder of the day"""
+    for prayer in PRAYERS:
+        prayer_time = datetime.strptime(timings[prayer], "%H:%M")
+        yield prayer, "10 minutes", prayer_time - timedelta(minutes=10)
+        yield prayer, "entered", prayer_time
+
+
+def _latency_type(status: str) -> str:
+    return "prayer-10min" if status == "10 minutes" else "prayer-entered"
+
+
+def _fanout_job_id(group: str, prayer: str, status: str) -> str:
+    suffix = "_10min" if status == "10 minutes" else ""
+    return f"prayer_fanout_{group}_{prayer}{suffix}"
+
+
+def _user_job_id(user_id: int, prayer: str, status: str) -> str:
+    if status == "10 minutes":
+        return f"prayer_reminder_{user_id}_{prayer}_10min"
+    return f"prayer_time_{user_id}_{prayer}"
+
+
+async def schedule_group_prayer_fanout(scheduler: AsyncIOScheduler, bot: Bot, group: CityGroup) -> int:
+    """Keep a daily fan-out job per (prayer, offset) for a city group at today's times, in the city's timezone
+    
+    Returns:
+        Number of jobs added or moved (0 when no prayer time changed)
+    """
+    timings, tz = await resolve_group_schedule(group.city, group.country)
     if not timings:
-        logger.error(f"Could not fetch prayer times for user {user_id}")
+        logger.error(f"Could not fetch prayer times for reminder fan-out in {group.city}, {group.country}")
+        return 0
+    
+    moved = 0
+    for prayer, status, at in _reminder_times(timings):
+        if sync_daily_job(
+            scheduler, _fanout_job_id(group.id, prayer, status),
+            send_prayer_reminder_fanout, [bot, prayer, status, group.key], at, tz
+        ):
+            moved += 1
+    _synced_days.mark(group.id, group.city, group.country)
+    return moved
+
+
+def _group_has_upcoming_jobs(scheduler: AsyncIOScheduler, group: CityGroup, now: datetime) -> bool:
+    """True if every prayer of the group has a pending (not yet due) fan-out job"""
+    for prayer in PRAYERS:
+        job = scheduler.get_job(_fanout_job_id(group.id, prayer, "entered"))
+        if not job or not job.next_run_time or job.next_run_time <= now:
+            return False
+    return True
+
+
+def _remove_jobs(scheduler: AsyncIOScheduler, job_ids) -> int:
+    removed = 0
+    for job_id in job_ids:
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+            removed += 1
+    return removed
+
+
+async def schedule_prayer_fanout(scheduler: AsyncIOScheduler, bot: Bot, only_missing: bool = False) -> int:
+    """Sync fan-out jobs of every city group with reminder subscribers to today's prayer times
+    
+    Args:
+        scheduler: Scheduler instance
+        bot: Bot instance
+        only_missing: Skip groups that already have upcoming jobs (startup reconcile); otherwise
+            only groups that have passed their local midnight since their last sync are synced
+    
+    Returns:
+        Number of fan-out jobs added or moved
+    """
+    groups = await load_city_groups(UserSettings.prayer_reminders == True)
+    now = datetime.now(pytz.utc)
+    
+    moved = 0
+    for index, group in enumerate(groups, 1):
+        if index % SCHEDULING_CHUNK_SIZE == 0:
+            logger.info(f"Prayer reminder fan-out scheduling: {index}/{len(groups)} city groups")
+            await asyncio.sleep(0)
+        if only_missing and _group_has_upcoming_jobs(scheduler, group, now):
+            continue
+        if not only_missing and not _synced_days.due(group.id, group.city, group.country):
+            continue
+        try:
+            moved += await schedule_group_prayer_fanout(scheduler, bot, group)
+        except Exception as e:
+            logger.error(f"Error scheduling reminder fan-out for {group.id}: {e}")
+    
+    # Drop jobs of groups that no longer have subscribers
+    active = {group.id for group in groups}
+    for job in scheduler.get_jobs():
+        if job.func is send_prayer_reminder_fanout and group_id(job.args[3]) not in active:
+            job.remove()
+    
+    logger.info(f"Prayer reminder fan-out: {moved} jobs added or moved across {len(groups)} city groups")
+    return moved
+
+
+async def schedule_user_prayer_reminders(scheduler: AsyncIOScheduler, bot: Bot, user_id: int):
+    """Apply a user's reminder or location change - only the affected jobs are touched"""
+    # The settings repository imports the schedulers package
+    from bot.utils.user_settings import get_user_settings
+    settings = await get_user_settings(user_id)
+    
+    city = settings.city if settings else DEFAULT_CITY
+    country = settings.country if settings else DEFAULT_COUNTRY
+    enabled = bool(settings and settings.prayer_reminders)
+    
+    if REMINDER_FANOUT_ENABLED:
+        # Recipients are resolved when each fan-out job fires; only make sure the user's group has jobs
+        group = await load_location_group(city, country, UserSettings.prayer_reminders == True)
+        if group is None:
+            # Last subscriber in this city turned reminders off
+            gid = group_id(prayer_lookup_key(city, country))
+            _remove_jobs(scheduler, [_fanout_job_id(gid, prayer, status) for prayer in PRAYERS for status in REMINDER_STATUSES])
+        elif not _group_has_upcoming_jobs(scheduler, group, datetime.now(pytz.utc)):
+            await schedule_group_prayer_fanout(scheduler, bot, group)
         return
     
-    now = datetime.now(SINGAPORE_TZ)
+    if not enabled:
+        _remove_jobs(scheduler, [_user_job_id(user_id, prayer, status) for prayer in PRAYERS for status in REMINDER_STATUSES])
+        return
     
-    for prayer in ['Fajr', 'Dhuhr', 'Asr', 'Maghrib', 'Isha']:
-        time_str = timings[prayer]
-        prayer_time = SINGAPORE_TZ.localize(datetime.strptime(time_str, "%H:%M").replace(
-            year=now.year,
-            month=now.month,
-            day=now.day
-        ))
-        
-        # If prayer time has passed, schedule for tomorrow
-        if prayer_time < now:
-            prayer_time += timedelta(days=1)
-        
-        # Schedule 10-minute reminder
-        reminder_time = prayer_time - timedelta(minutes=10)
-        if reminder_time > now:
-            scheduler.add_job(
-                send_prayer_reminder,
-                trigger=DateTrigger(run_date=reminder_time),
-                args=[bot, user_id, prayer, "10 minutes"],
-                id=f"prayer_reminder_{user_id}_{prayer}_10min",
-                replace_existing=True
-            )
-        
-        # Schedule prayer time notification
-        scheduler.add_job(
-            send_prayer_reminder,
-            trigger=DateTrigger(run_date=prayer_time),
-            args=[bot, user_id, prayer, "entered"],
-            id=f"prayer_time_{user_id}_{prayer}",
-            replace_existing=True
-        )
+    timings, tz = await resolve_group_schedule(city, country)
+    if not timings:
+        logger.error(f"Could not fetch prayer times for user {user_id}")
+        return
     
-    logger.info(f"Scheduled prayer reminders for user {user_id}")
+    moved = _sync_user_jobs(scheduler, bot, user_id, timings, tz)
+    if moved:
+        logger.info(f"Scheduled {moved} prayer reminders for user {user_id} ({city}, {country})")
+
 
+def _sync_user_jobs(scheduler: AsyncIOScheduler, bot: Bot, user_id: int, timings: dict, tz) -> int:
+    """Point a user's per-user reminder jobs at the given prayer times; returns how many moved"""
+    moved = 0
+    for prayer, status, at in _reminder_times(timings):
+        if sync_daily_job(
+            scheduler, _user_job_id(user_id, prayer, status),
+            send_prayer_reminder, [bot, user_id, prayer, status], at, tz
+        ):
+            moved += 1
+    return moved
 
+
+@leader_only
 async def schedule_all_prayer_reminders(scheduler: AsyncIOScheduler, bot: Bot):
-    """Schedule prayer reminders for all users with prayer_reminders enabled"""
+    """Schedule prayer reminders for all users with prayer_reminders enabled (leader only - see workers)
+    
+    Runs hourly; each city's reminders are resynced once after its local midnight.
+    """
     try:
         if not database.db.async_session_maker:
             logger.warning("Database session maker not initialized yet")
             return
-        async with database.db.async_session_maker() as session:
-            result = await session.execute(
-                select(UserSettings).where(UserSettings.prayer_reminders == True)
-            )
-            users = result.scalars().all()
-            
-            for settings in users:
-                await schedule_user_prayer_reminders(scheduler, bot, settings.user_id)
-            
-            logger.info(f"Scheduled prayer reminders for {len(users)} users")
+        
+        if REMINDER_FANOUT_ENABLED:
+            # Job count depends on distinct cities, not on the number of subscribers
+            await schedule_prayer_fanout(scheduler, bot)
+            return
+        
+        scheduled = set()
+        # Groups that haven't passed their local midnight since the last pass
+        skipped = set()
+        # Group id -> (city, country, timings, tz), resolved once per group for all its users
+        schedules = {}
+        subscribers = (
+            select(UserSettings.user_id, UserSettings.city, UserSettings.country)
+            .where(UserSettings.prayer_reminders == True, active_recipient())
+        )
+        async for chunk in iter_chunks(subscribers, UserSettings.user_id):
+            for row in chunk:
+                scheduled.add(row.user_id)
+                gid = group_id(prayer_lookup_key(row.city, row.country))
+                if gid in skipped:
+                    continue
+                if gid not in schedules:
+                    if not _synced_days.due(gid, row.city, row.country):
+                        skipped.add(gid)
+                        continue
+                    timings, tz = await resolve_group_schedule(row.city, row.country)
+                    if not timings:
+                        logger.error(f"Could not fetch prayer times for {row.city}, {row.country}")
+                    schedules[gid] = (row.city, row.country, timings, tz)
+                _, _, timings, tz = schedules[gid]
+                if timings:
+                    _sync_user_jobs(scheduler, bot, row.user_id, timings, tz)
+                if len(scheduled) % SCHEDULING_CHUNK_SIZE == 0:
+                    logger.info(f"Prayer reminder scheduling: {len(scheduled)} users so far")
+                    await asyncio.sleep(0)
+        
+        for gid, (city, country, timings, _) in schedules.items():
+            # Groups that couldn't be resolved are retried on the next pass
+            if timings:
+                _synced_days.mark(gid, city, country)
+        
+        # Drop jobs of users who turned reminders off or became unreachable since the last pass
+        removed = 0
+        for job in scheduler.get_jobs():
+            if job.func is send_prayer_reminder and job.args[1] not in scheduled:
+                job.remove()
+                removed += 1
+        
+        synced = sum(1 for _, _, timings, _ in schedules.values() if timings)
+        logger.info(
+            f"Synced prayer reminders of {synced} city groups ({len(scheduled)} users), removed {removed} stale jobs"
+        )
     except Exception as e:
         logger.error(f"Error scheduling prayer reminders: {e}")
 
 
 def setup_prayer_scheduler(scheduler: AsyncIOScheduler, bot: Bot):
     """Setup daily prayer reminder scheduling"""
-    # Schedule prayer reminders to be refreshed daily at midnight Singapore time
+    # Sync reminder triggers with each city's prayer times shortly after its local midnight (moved times only);
+    # hourly so every timezone, including half-hour offsets, is picked up within the hour
     scheduler.add_job(
         schedule_all_prayer_reminders,
         'cron',
-        hour=0,
         minute=0,
         timezone="Asia/Singapore",
         args=[scheduler, bot],
         id='daily_prayer_refresh',
         replace_existing=True
     )
-    logger.info("Prayer scheduler setup complete - daily refresh at 00:00 SGT")
+    logger.info("Prayer scheduler setup complete - hourly refresh of cities past their local midnight")
@@ -0,0 +1,196 @@
+"""Prayer times calendar prefetch
+
+Once a day, every distinct (city, country) in UserSettings has its whole month
+put into the prayer times cache, so get_prayer_times serves international
+users without touching the network. Cities whose coordinates are known are
+computed offline (bot.utils.prayer_calc); new cities are fetched from
+Aladhan's calendar endpoint, which also teaches us their coordinates.
+The next month is fetched PREFETCH_LEAD_DAYS ahead of the month boundary.
+The cache reserves room for the whole window (every city, from today to the
+end of the last prefetched month) so prefetched days are not evicted.
+Cities that still fail after PREFETCH_MAX_ATTEMPTS are retried by a one-off job.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
+from sqlalchemy import select, func
+import database.db
+from database.models import UserSettings
+from bot.utils.prayer_api import (
+    fetch_prayer_calendar, is_singapore, local_calc_available, cache_calculated_prayer_times
+)
+from bot.utils.prayer_calc import month_bounds, date_range
+from bot.utils.prayer_cache import prayer_cache, normalize_location
+from bot.utils.recipients import active_recipient
+from config import PREFETCH_CONCURRENCY, PREFETCH_LEAD_DAYS, PREFETCH_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+SINGAPORE_TZ = pytz.timezone('Asia/Singapore')
+RETRY_DELAY_MINUTES = 30
+
+
+def months_to_prefetch(today: date, lead_days: int = PREFETCH_LEAD_DAYS) -> List[Tuple[int, int]]:
+    """The current month, plus the next one once the boundary is within lead_days"""
+    months = [(today.year, today.month)]
+    _, last = month_bounds(today.year, today.month)
+    if (last - today).days < lead_days:
+        next_first = last + timedelta(days=1)
+        months.append((next_first.year, next_first.month))
+    return months
+
+
+def window_days(today: date, lead_days: int = PREFETCH_LEAD_DAYS) -> int:
+    """Days from today to the end of the last prefetched month, inclusive"""
+    year, month = months_to_prefetch(today, lead_days)[-1]
+    return (month_bounds(year, month)[1] - today).days + 1
+
+
+def _month_cached(city: str, country: str, year: int, month: int, today: date) -> bool:
+    """True if the remaining days of the month are already cached"""
+    first, last = month_bounds(year, month)
+    return prayer_cache.contains(city, country, max(first, today)) and prayer_cache.contains(city, country, last)
+
+
+async def get_user_cities() -> List[Tuple[str, str]]:
+    """Distinct (city, country) pairs of all users, excluding Singapore (served from MUIS)"""
+    async with database.db.async_session_maker() as session:
+        result = await session.execute(
+            select(UserSettings.city, UserSettings.country, func.count())
+            .where(active_recipient())
+            .group_by(UserSettings.city, UserSettings.country)
+            .order_by(func.count().desc())
+        )
+        rows = result.all()
+
+    cities = []
+    seen = set()
+    for city, country, _ in rows:
+        if not city or not country or is_singapore(city, country):
+            continue
+        # Different spellings of the same city share one cache entry
+        location = normalize_location(city, country)
+        if location in seen:
+            continue
+        seen.add(location)
+        cities.append((city, country))
+    return cities
+
+
+async def _prefetch_city_month(city: str, country: str, year: int, month: int) -> bool:
+    """Fetch one city-month, retrying with backoff. Returns True on success."""
+    for attempt in range(1, PREFETCH_MAX_ATTEMPTS + 1):
+        try:
+            if await fetch_prayer_calendar(city, country, year, month):
+                return True
+            logger.warning(f"Empty prayer calendar for {city}, {country} ({year}-{month:02d})")
+        except Exception as e:
+            logger.warning(
+                f"Prefetch attempt {attempt}/{PREFETCH_MAX_ATTEMPTS} failed for "
+                f"{city}, {country} ({year}-{month:02d}): {e}"
+            )
+        if attempt < PREFETCH_MAX_ATTEMPTS:
+            await asyncio.sleep(2 ** attempt)
+    return False
+
+
+async def prefetch_prayer_calendars(scheduler: AsyncIOScheduler = None):
+    """
+    Prefetch monthly prayer calendars for every distinct user city
+
+    Args:
+        scheduler: If given, a retry job is scheduled when some cities fail
+    """
+    try:
+        cities = await get_user_cities()
+    except Exception as e:
+        logger.error(f"Error loading user cities for prefetch: {e}")
+        return
+
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+    fallback_today = datetime.now(pytz.utc).date()
+    skipped = 0
+
+    async def prefetch_bounded(city: str, country: str, year: int, month: int) -> bool:
+        async with semaphore:
+            return await _prefetch_city_month(city, country, year, month)
+
+    needed = []
+    window = 0
+    for city, country in cities:
+        today = prayer_cache.local_date(city, country) or fallback_today
+        window += window_days(today)
+        for year, month in months_to_prefetch(today):
+            if _month_cached(city, country, year, month, today):
+                skipped += 1
+            else:
+                needed.append((city, country, year, month, today))
+
+    prayer_cache.reserve(window)
+    evictions = prayer_cache.evictions
+
+    # Cities with known coordinates are computed offline in one batched call
+    computed = set()
+    if needed and local_calc_available():
+        start = min(today for *_, today in needed)
+        end = max(month_bounds(year, month)[1] for _, _, year, month, _ in needed)
+        locations = list(dict.fromkeys((city, country) for city, country, *_ in needed))
+        try:
+            computed = set(cache_calculated_prayer_times(locations, date_range(start, end)))
+        except Exception as e:
+            logger.error(f"Error calculating prayer times offline: {e}")
+
+    tasks = [
+        ((city, country, year, month), prefetch_bounded(city, country, year, month))
+        for city, country, year, month, _ in needed
+        if (city, country) not in computed
+    ]
+
+    results = await asyncio.gather(*(task for _, task in tasks))
+    failed = [key for (key, _), ok in zip(tasks, results) if not ok]
+
+    logger.info(
+        f"Prayer calendar prefetch: {len(cities)} cities, {len(computed)} computed offline, "
+        f"{len(tasks) - len(failed)} months fetched, {skipped} already cached, {len(failed)} failed"
+    )
+
+    evicted = prayer_cache.evictions - evictions
+    if evicted:
+        logger.warning(
+            f"Prayer calendar prefetch evicted {evicted} cache entries "
+            f"({len(prayer_cache)}/{prayer_cache.max_entries}); raise PRAYER_CACHE_MAX_ENTRIES"
+        )
+
+    if needed:
+        await prayer_cache.persist()
+
+    if failed and scheduler:
+        run_date = datetime.now(SINGAPORE_TZ) + timedelta(minutes=RETRY_DELAY_MINUTES)
+        scheduler.add_job(
+            prefetch_prayer_calendars,
+            trigger=DateTrigger(run_date=run_date),
+            args=[scheduler],
+            id='prayer_calendar_prefetch_retry',
+            replace_existing=True
+        )
+        logger.info(f"Retrying prefetch for {len(failed)} city-months at {run_date.strftime('%H:%M')} SGT")
+
+
+def setup_prefetch_scheduler(scheduler: AsyncIOScheduler):
+    """Setup the daily prayer calendar prefetch"""
+    scheduler.add_job(
+        prefetch_prayer_calendars,
+        'cron',
+        hour=3,
+        minute=0,
+        timezone="Asia/Singapore",
+        args=[scheduler],
+        id='prayer_calendar_prefetch',
+        replace_existing=True
+    )
+    logger.info("Prefetch scheduler setup complete - daily calendar prefetch at 03:00 SGT")
@@ -0,0 +1,52 @@
+"""Startup reconciliation of stored scheduler jobs
+
+With jobs persisted (see job_store), a restart only needs to touch what
+changed while the bot was down instead of rebuilding every reminder:
+- city groups without upcoming fan-out jobs (new cities, or jobs that fired
+  or misfired during the downtime) are scheduled
+- Allahu Allah phase slots without a job are added and empty ones dropped
+The subscriptions table is backfilled first if it is still empty.
+Everything is rebuilt when no stored jobs were loaded (first run or a
+JOB_DEFINITIONS_VERSION bump).
+"""
+
+import logging
+from datetime import datetime
+import pytz
+from aiogram import Bot
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import database.db
+from bot.schedulers.subscriptions import ensure_subscriptions
+from bot.schedulers.job_store import PersistentJobStore, get_reconciled_at, set_reconciled_at
+from bot.schedulers.prayer_scheduler import schedule_all_prayer_reminders, schedule_prayer_fanout
+from bot.schedulers.adkar_scheduler import schedule_all_adkar, schedule_adkar_fanout
+from bot.schedulers.interval_scheduler import sync_interval_slots
+from config import REMINDER_FANOUT_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_schedules(scheduler: AsyncIOScheduler, bot: Bot, store: PersistentJobStore):
+    """Reconcile stored jobs with current subscriptions (full rebuild if nothing was stored)"""
+    started = datetime.now(pytz.utc)
+    try:
+        first_run = await get_reconciled_at() is None
+
+        async with database.db.async_session_maker() as session:
+            await ensure_subscriptions(session)
+
+        if not store.loaded or first_run or not REMINDER_FANOUT_ENABLED:
+            logger.info("Rebuilding all reminder schedules")
+            await schedule_all_prayer_reminders(scheduler, bot)
+            await schedule_all_adkar(scheduler, bot)
+        else:
+            prayer_jobs = await schedule_prayer_fanout(scheduler, bot, only_missing=True)
+            adkar_jobs = await schedule_adkar_fanout(scheduler, bot, only_missing=True)
+            logger.info(f"Reconciled stored schedules: {prayer_jobs} prayer and {adkar_jobs} adkar fan-out jobs added")
+
+        # Cheap either way: one grouped query over the slot index
+        await sync_interval_slots(scheduler, bot)
+
+        await set_reconciled_at(started)
+    except Exception as e:
+        logger.error(f"Error reconciling scheduler jobs: {e}")
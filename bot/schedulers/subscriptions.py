@@ -0,0 +1,164 @@
+"""Normalized subscriptions for fan-out audience selection
+
+Every feature a user receives is one row of the subscriptions table:
+(user_id, feature, params, city_group). Fan-outs select exactly their
+recipients from it with one range scan - (feature, city_group) for city
+group reminders and the khutbah, the partial params index for Allahu Allah
+slots - instead of filtering user_settings flags and resolving location
+spellings when they fire.
+
+Rows are derived from UserSettings and rewritten in the same transaction
+whenever an ORM flush inserts settings or changes a flag, the interval, the
+phase or the location. Core writes of user_settings bypass that and must
+update the subscriptions themselves (see sync_subscriptions, and
+interval_scheduler for the bulk phase assignment).
+rebuild_subscriptions() recomputes the whole table.
+"""
+
+import logging
+from typing import List, Optional
+from sqlalchemy import select, delete, insert, update, exists, event, inspect, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Subscription, UserSettings
+from bot.schedulers.city_groups import group_id
+from bot.utils.prayer_api import prayer_lookup_key
+from bot.utils.bulk import iter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Features; a UserSettings flag is a subscription when set (the feature is the column name)
+PRAYER_REMINDERS = "prayer_reminders"
+MORNING_ADKAR = "morning_adkar"
+EVENING_ADKAR = "evening_adkar"
+SLEEP_ADKAR = "sleep_adkar"
+FRIDAY_KHUTBAH = "friday_khutbah"
+ALLAHU_ALLAH = "allahu_allah"  # Params hold the (interval, phase) slot
+FLAG_FEATURES = (PRAYER_REMINDERS, MORNING_ADKAR, EVENING_ADKAR, SLEEP_ADKAR, FRIDAY_KHUTBAH)
+
+# Settings a user's subscriptions are derived from
+_SOURCE_ATTRIBUTES = (*FLAG_FEATURES, "allahu_allah_interval", "allahu_allah_phase", "city", "country")
+
+
+def interval_slot_params(interval: int, phase: Optional[int]) -> Optional[str]:
+    """Params of an Allahu Allah subscription (None until the phase is assigned)"""
+    return f"{interval}h/{phase}" if phase is not None else None
+
+
+def interval_slot_params_sql():
+    """interval_slot_params as a SQL expression over user_settings, for bulk updates"""
+    return func.concat(UserSettings.allahu_allah_interval, 'h/', UserSettings.allahu_allah_phase)
+
+
+def subscription_rows(settings) -> List[dict]:
+    """Subscription rows of one user's settings (a UserSettings or a row with the same columns)"""
+    city_group = group_id(prayer_lookup_key(settings.city, settings.country))
+    rows = [
+        {"user_id": settings.user_id, "feature": feature, "params": None, "city_group": city_group}
+        for feature in FLAG_FEATURES if getattr(settings, feature)
+    ]
+    if settings.allahu_allah_interval:
+        rows.append({
+            "user_id": settings.user_id,
+            "feature": ALLAHU_ALLAH,
+            "params": interval_slot_params(settings.allahu_allah_interval, settings.allahu_allah_phase),
+            "city_group": city_group,
+        })
+    return rows
+
+
+def replace_subscriptions(settings):
+    """
+    Single statement replacing one user's subscriptions with those of their settings:
+    stale features are deleted in a CTE and current ones upserted
+    """
+    rows = subscription_rows(settings)
+    stale = delete(Subscription).where(
+        Subscription.user_id == settings.user_id,
+        Subscription.feature.not_in([row["feature"] for row in rows]),
+    )
+    if not rows:
+        return stale
+    upsert = pg_insert(Subscription).values(rows)
+    return upsert.on_conflict_do_update(
+        index_elements=[Subscription.user_id, Subscription.feature],
+        set_={"params": upsert.excluded.params, "city_group": upsert.excluded.city_group},
+    ).add_cte(stale.cte("stale"))
+
+
+async def sync_subscriptions(session: AsyncSession, settings):
+    """Rewrite a user's subscriptions after a Core write to their settings (the ORM does it on flush)"""
+    await session.execute(replace_subscriptions(settings))
+
+
+def _write_subscriptions(connection, settings: UserSettings):
+    connection.execute(replace_subscriptions(settings))
+
+
+@event.listens_for(UserSettings, "after_insert")
+def _subscriptions_after_insert(mapper, connection, target):
+    _write_subscriptions(connection, target)
+
+
+@event.listens_for(UserSettings, "after_update")
+def _subscriptions_after_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _SOURCE_ATTRIBUTES):
+        _write_subscriptions(connection, target)
+
+
+def sync_interval_params():
+    """UPDATE copying Allahu Allah phases assigned in bulk into the subscriptions"""
+    params = interval_slot_params_sql()
+    return (
+        update(Subscription)
+        .where(
+            Subscription.user_id == UserSettings.user_id,
+            Subscription.feature == ALLAHU_ALLAH,
+            UserSettings.allahu_allah_interval.isnot(None),
+            Subscription.params.is_distinct_from(params),
+        )
+        .values(params=params)
+    )
+
+
+async def rebuild_subscriptions(session: AsyncSession) -> int:
+    """
+    Recompute every subscription from user_settings (caller commits)
+
+    Returns:
+        Number of subscription rows written
+    """
+    await session.execute(delete(Subscription))
+
+    written = 0
+    query = select(
+        UserSettings.user_id, UserSettings.city, UserSettings.country,
+        UserSettings.allahu_allah_interval, UserSettings.allahu_allah_phase,
+        *(getattr(UserSettings, feature) for feature in FLAG_FEATURES),
+    )
+    async for chunk in iter_chunks(query, UserSettings.user_id, session=session):
+        rows = [row for settings in chunk for row in subscription_rows(settings)]
+        if rows:
+            await session.execute(insert(Subscription), rows)
+        written += len(rows)
+
+    logger.info(f"Rebuilt {written} subscriptions from user settings")
+    return written
+
+
+async def ensure_subscriptions(session: AsyncSession) -> bool:
+    """
+    Backfill the subscriptions table if it's empty while users have settings
+    (first start after the table was added)
+
+    Returns:
+        True if the table was rebuilt
+    """
+    has_subscriptions = (await session.execute(select(exists().select_from(Subscription)))).scalar()
+    has_settings = (await session.execute(select(exists().select_from(UserSettings)))).scalar()
+    if has_subscriptions or not has_settings:
+        return False
+    await rebuild_subscriptions(session)
+    await session.commit()
+    return True
@@ -0,0 +1,172 @@
+"""Multi-worker scheduling: user sharding and leader election
+
+With SCHEDULER_WORKERS > 1 the bot runs as several processes that share the
+database and the stored scheduler jobs (see job_store):
+- Every worker fires the same fan-out jobs, but each one only delivers to
+  the users of its own shard (a hash of user_id modulo the worker count),
+  so delivery scales across processes without sending anything twice
+- Singleton jobs (the reminder refreshes, the Friday khutbah and the
+  security check) only run on the leader: the worker holding a session-level
+  Postgres advisory lock. The lock is released when the leader's connection
+  goes away, and the other workers retry every SCHEDULER_LEADER_RETRY_SECONDS,
+  so a crashed leader is replaced automatically
+
+A single worker (the default) owns every user and is always the leader.
+"""
+
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import select, func, true
+from sqlalchemy.ext.asyncio import AsyncConnection
+import database.db
+from database.models import UserSettings
+from bot.metrics import register_metrics_source
+from config import (
+    SCHEDULER_WORKERS, SCHEDULER_WORKER_INDEX, SCHEDULER_LEADER_LOCK_ID, SCHEDULER_LEADER_RETRY_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Multiplicative (MINSTD) hash, so shards don't line up with other user_id % n bucketings
+# such as the interval phase spreading; the same arithmetic runs in Python and in SQL
+_HASH_MODULUS = 2147483647
+_HASH_MULTIPLIER = 48271
+
+
+def user_shard(user_id: int) -> int:
+    """Index of the worker that delivers to a user"""
+    return (user_id % _HASH_MODULUS) * _HASH_MULTIPLIER % _HASH_MODULUS % SCHEDULER_WORKERS
+
+
+def owns_user(user_id: int) -> bool:
+    """True if this worker delivers to the user"""
+    return SCHEDULER_WORKERS == 1 or user_shard(user_id) == SCHEDULER_WORKER_INDEX
+
+
+def owned_recipient(user_id_column=UserSettings.user_id):
+    """
+    Filter restricting a recipient query to this worker's shard (matches user_shard)
+
+    Args:
+        user_id_column: The user id column being selected
+    """
+    if SCHEDULER_WORKERS == 1:
+        return true()
+    return (user_id_column % _HASH_MODULUS) * _HASH_MULTIPLIER % _HASH_MODULUS % SCHEDULER_WORKERS == SCHEDULER_WORKER_INDEX
+
+
+class LeaderElection:
+    """Leadership held through a Postgres advisory lock on a dedicated connection"""
+
+    def __init__(self, lock_id: int = SCHEDULER_LEADER_LOCK_ID, retry_seconds: float = SCHEDULER_LEADER_RETRY_SECONDS):
+        self.lock_id = lock_id
+        self.retry_seconds = retry_seconds
+        self.enabled = SCHEDULER_WORKERS > 1
+        # A single worker has nobody to compete with
+        self.is_leader = not self.enabled
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: List[Callable[[], Awaitable[Any]]] = []
+        self._promotions = set()
+
+        self.elected = 0
+        self.stepped_down = 0
+
+    def on_promoted(self, callback: Callable[[], Awaitable[Any]]):
+        """Run callback whenever this worker becomes leader after start()"""
+        self._callbacks.append(callback)
+
+    async def start(self) -> bool:
+        """
+        Try to take the lead once, then keep retrying (or checking the lock) in the background
+
+        Returns:
+            True if this worker is the leader
+        """
+        if not self.enabled:
+            return True
+        await self._attempt(promote=False)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Scheduler worker {SCHEDULER_WORKER_INDEX} of {SCHEDULER_WORKERS} started as "
+            f"{'leader' if self.is_leader else 'follower'}"
+        )
+        return self.is_leader
+
+    async def stop(self):
+        """Stop campaigning and release the lock"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self._release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.retry_seconds)
+            await self._attempt(promote=True)
+
+    async def _attempt(self, promote: bool):
+        try:
+            if self._connection is None:
+                self._connection = await database.db.engine.connect()
+            if self.is_leader:
+                # The lock lives as long as the session - make sure it's still there
+                await self._connection.execute(select(1))
+            else:
+                result = await self._connection.execute(select(func.pg_try_advisory_lock(self.lock_id)))
+                if result.scalar():
+                    self.is_leader = True
+                    self.elected += 1
+                    logger.info(f"Scheduler worker {SCHEDULER_WORKER_INDEX} is now the leader")
+                    if promote:
+                        self._run_callbacks()
+            await self._connection.commit()
+        except Exception as e:
+            logger.error(f"Leader election connection failed: {e}")
+            await self._release()
+
+    def _run_callbacks(self):
+        for callback in self._callbacks:
+            task = asyncio.create_task(callback())
+            self._promotions.add(task)
+            task.add_done_callback(self._promotions.discard)
+
+    async def _release(self):
+        if self.is_leader:
+            self.is_leader = False
+            self.stepped_down += 1
+            logger.warning(f"Scheduler worker {SCHEDULER_WORKER_INDEX} is no longer the leader")
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            try:
+                # Discard rather than return to the pool: closing the session releases the lock
+                await connection.invalidate()
+                await connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing leader election connection: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": SCHEDULER_WORKERS,
+            "worker_index": SCHEDULER_WORKER_INDEX,
+            "leader": self.is_leader,
+            "elected": self.elected,
+            "stepped_down": self.stepped_down,
+        }
+
+
+leader = LeaderElection()
+register_metrics_source("scheduler_workers", leader.stats)
+
+
+def leader_only(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Make a scheduled coroutine a singleton job: it only runs on the leader"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not leader.is_leader:
+            logger.debug(f"Skipping {func.__name__} - runs on the scheduler leader")
+            return None
+        return await func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,67 @@
+"""Startup phases and readiness
+
+Startup is staged so polling begins as soon as the database is reachable:
+the core phase (database, caches, scheduler) runs before polling and the
+warm-up phase (bot commands, bulk reminder scheduling) runs in the
+background. Each phase is timed so cold-start regressions show up in the
+logs and in the admin /stats summary; `startup.ready` is set once the
+warm-up has finished.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Phase timings and the warm-up readiness flag"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.ready = asyncio.Event()
+        self.polling_after: Optional[float] = None
+        self.ready_after: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase (failures are timed too, then re-raised)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            logger.info(f"Startup phase '{name}' took {self.timings[name]:.2f}s")
+
+    async def timed(self, name: str, coro):
+        """Await a coroutine as a timed phase (for running phases with asyncio.gather)"""
+        with self.phase(name):
+            return await coro
+
+    def mark_polling(self):
+        self.polling_after = time.perf_counter() - self.started
+        logger.info(f"Accepting updates {self.polling_after:.2f}s after start")
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        self.ready.set()
+        logger.info(f"Warm-up complete - fully ready {self.ready_after:.2f}s after start")
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"ready": self.ready.is_set()}
+        if self.polling_after is not None:
+            stats["polling_after_s"] = self.polling_after
+        if self.ready_after is not None:
+            stats["ready_after_s"] = self.ready_after
+        for name, seconds in self.timings.items():
+            stats[f"{name}_s"] = seconds
+        return stats
+
+
+startup = StartupTracker()
+register_metrics_source("startup", startup.stats)
@@ -0,0 +1,59 @@
+"""Chunked iteration over large tables for bulk jobs
+
+Broadcasts, per-user scheduling passes and rebuilds used to load every row
+with result.scalars().all(), so memory grew with the user count and nothing
+was sent until the whole table had been read. iter_chunks pages through a
+column-only query with keyset pagination instead: each page is one range
+scan on an indexed key (key > last key seen), memory stays at one page and
+the first page is ready after a single query.
+
+Pages are read in their own short transactions by default, so a job that
+takes hours to send doesn't pin a connection or an old snapshot while it
+works on a page (a server-side cursor would). Rows added behind the last
+key seen are skipped; rows added ahead of it are still picked up.
+"""
+
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+import database.db
+from config import BULK_CHUNK_SIZE
+
+
+async def iter_chunks(
+    query: Select,
+    key,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    session: Optional[AsyncSession] = None,
+) -> AsyncIterator[List[Row]]:
+    """
+    Page through a query in key order
+
+    Args:
+        query: select() of the columns needed, including key (no ORDER BY or LIMIT)
+        key: Unique, indexed column to paginate on (e.g. UserSettings.user_id)
+        chunk_size: Rows per page
+        session: Session to read with (pages share its transaction); by default each page
+            is read in a new short-lived session
+
+    Yields:
+        Lists of up to chunk_size rows
+    """
+    last_key = None
+    while True:
+        page = query.order_by(key).limit(chunk_size)
+        if last_key is not None:
+            page = page.where(key > last_key)
+
+        if session is None:
+            async with database.db.async_session_maker() as page_session:
+                rows = (await page_session.execute(page)).all()
+        else:
+            rows = (await session.execute(page)).all()
+        if not rows:
+            return
+
+        last_key = rows[-1]._mapping[key]
+        yield rows
+        if len(rows) < chunk_size:
+            return
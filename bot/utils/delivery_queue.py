@@ -0,0 +1,389 @@
+"""Rate-limited outbound delivery queue for all bot sends
+
+Every bulk send (reminders, adkar, khutbah, broadcasts) goes through a single
+queue drained by a pool of workers. Token buckets enforce Telegram's global
+(~30 msg/s) and per-chat limits; a message whose chat is over its limit is
+parked until that chat's bucket refills instead of tying up a worker, and
+TelegramRetryAfter pauses the buckets and re-queues the message instead of
+dropping it. Chats that fail
+permanently (blocked, deleted) are reported to the recipient pruner.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from config import (
+    DELIVERY_WORKERS, DELIVERY_GLOBAL_RATE, DELIVERY_PER_CHAT_RATE,
+    DELIVERY_PER_CHAT_BURST, DELIVERY_MAX_PENDING, DELIVERY_MAX_RETRIES
+)
+from bot.metrics import register_metrics_source
+from bot.utils.recipients import is_permanent_failure, recipient_pruner
+
+logger = logging.getLogger(__name__)
+
+# Lower value = delivered first
+PRIORITY_RETRY = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+# Idle per-chat buckets are pruned once this many are tracked
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Token bucket rate limiter that can be paused (e.g. on flood control)"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given number of seconds"""
+        now = self.clock()
+        self.paused_until = max(self.paused_until, now + seconds)
+        # No tokens accumulate while paused
+        self.tokens = 0
+        self.updated_at = self.paused_until
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available now, without waiting"""
+        if self.delay() > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_idle(self) -> bool:
+        """True when the bucket is full, i.e. it carries no state worth keeping"""
+        now = self.clock()
+        self._refill(now)
+        return now >= self.paused_until and self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class DeliveryTrace:
+    """Wall-clock times (time.time()) a message was handed to Telegram and acknowledged"""
+    dispatched_at: Optional[float] = None
+    acknowledged_at: Optional[float] = None
+
+
+@dataclass
+class _DeliveryItem:
+    bot: Bot
+    method: str
+    chat_id: int
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    priority: int = PRIORITY_NORMAL
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    trace: Optional[DeliveryTrace] = None
+
+
+class DeliveryQueue:
+    """Central outbound queue with a worker pool and token-bucket rate limits"""
+
+    def __init__(
+        self,
+        workers: int = DELIVERY_WORKERS,
+        global_rate: float = DELIVERY_GLOBAL_RATE,
+        per_chat_rate: float = DELIVERY_PER_CHAT_RATE,
+        per_chat_burst: float = DELIVERY_PER_CHAT_BURST,
+        max_pending: int = DELIVERY_MAX_PENDING,
+        max_retries: int = DELIVERY_MAX_RETRIES,
+    ):
+        self.worker_count = workers
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._workers: list[asyncio.Task] = []
+        self._seq = itertools.count()
+        # Items waiting out a backoff or a chat's rate limit before going back on the queue
+        self._waiting = 0
+        self._sent_times: deque = deque()
+
+        # Counters
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.deferred = 0
+        self.retry_after_events = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Start the worker pool"""
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"delivery-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"Delivery queue started with {self.worker_count} workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Drain the queue (up to drain_timeout seconds) and stop the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Delivery queue stopped with {self.depth + self._waiting} undelivered messages")
+
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # Fail anything still waiting so callers don't hang
+        while not self._queue.empty():
+            _, _, item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Delivery queue stopped"))
+        logger.info("Delivery queue stopped")
+
+    async def _drain(self):
+        while True:
+            await self._queue.join()
+            if not self._waiting:
+                return
+            await asyncio.sleep(0.1)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune_chat_buckets()
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self):
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle()]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _put(self, item: _DeliveryItem):
+        self._queue.put_nowait((item.priority, next(self._seq), item))
+
+    def _requeue(self, item: _DeliveryItem):
+        if self.running:
+            item.priority = PRIORITY_RETRY
+            self._put(item)
+        elif not item.future.done():
+            item.future.set_exception(RuntimeError("Delivery queue stopped"))
+
+    def _requeue_later(self, item: _DeliveryItem, delay: float):
+        """Put the item back on the queue once delay seconds have passed"""
+        self._waiting += 1
+        asyncio.get_running_loop().call_later(delay, self._wake, item)
+
+    def _wake(self, item: _DeliveryItem):
+        self._waiting -= 1
+        self._requeue(item)
+
+    def _defer(self, item: _DeliveryItem, delay: float):
+        self.deferred += 1
+        self._requeue_later(item, delay)
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> float:
+        return min(2 ** attempts, 60)
+
+    async def send(
+        self,
+        bot: Bot,
+        method: str,
+        chat_id: int,
+        priority: int = PRIORITY_NORMAL,
+        trace: Optional[DeliveryTrace] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Queue a Bot API call and wait for its result
+
+        Args:
+            bot: Bot instance to send with
+            method: Bot method name (e.g. "send_message", "send_document")
+            chat_id: Target chat
+            priority: PRIORITY_NORMAL or PRIORITY_BULK
+            trace: Filled with the dispatch and acknowledgement times of the successful attempt
+            **kwargs: Arguments for the Bot method
+
+        Returns:
+            Whatever the Bot method returns (usually the sent Message)
+        """
+        if not self.running:
+            # Queue not started (e.g. standalone scripts) - send directly
+            return await self._call(bot, method, chat_id, kwargs, trace)
+
+        await self._pending.acquire()
+        try:
+            future = asyncio.get_running_loop().create_future()
+            self._put(_DeliveryItem(bot, method, chat_id, kwargs, future, priority, trace=trace))
+            self.enqueued += 1
+            return await future
+        finally:
+            self._pending.release()
+
+    async def send_message(self, bot: Bot, chat_id: int, text: str, **kwargs) -> Any:
+        """Queue bot.send_message"""
+        return await self.send(bot, "send_message", chat_id, text=text, **kwargs)
+
+    async def send_document(self, bot: Bot, chat_id: int, document: Any, **kwargs) -> Any:
+        """Queue bot.send_document"""
+        return await self.send(bot, "send_document", chat_id, document=document, **kwargs)
+
+    @staticmethod
+    async def _call(bot: Bot, method: str, chat_id: int, kwargs: Dict[str, Any], trace: Optional[DeliveryTrace]) -> Any:
+        if trace is not None:
+            trace.dispatched_at = time.time()
+        try:
+            result = await getattr(bot, method)(chat_id=chat_id, **kwargs)
+        except Exception as e:
+            if is_permanent_failure(e):
+                # Blocked / deleted chats are skipped by future fan-outs
+                recipient_pruner.report(chat_id)
+            raise
+        if trace is not None:
+            trace.acknowledged_at = time.time()
+        return result
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, item = await self._queue.get()
+            try:
+                if not item.future.done():
+                    await self._deliver(item)
+            except asyncio.CancelledError:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Delivery queue stopped"))
+                raise
+            except Exception as e:
+                logger.error(f"Delivery worker {index} error: {e}")
+                if not item.future.done():
+                    item.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: _DeliveryItem):
+        chat_bucket = self._chat_bucket(item.chat_id)
+        wait = chat_bucket.delay()
+        if wait > 0:
+            # Don't hold a worker for one chat's limit while other chats could be served
+            self._defer(item, wait)
+            return
+        await self.global_bucket.acquire()
+        if not chat_bucket.try_acquire():
+            # Another worker took this chat's last token while we waited for the global one
+            self._defer(item, chat_bucket.delay())
+            return
+
+        try:
+            result = await self._call(item.bot, item.method, item.chat_id, item.kwargs, item.trace)
+        except TelegramRetryAfter as e:
+            # Flood control: pause sending and try the same message again later
+            self.retry_after_events += 1
+            logger.warning(f"Flood control hit, pausing delivery for {e.retry_after}s")
+            self.global_bucket.pause(e.retry_after)
+            chat_bucket.pause(e.retry_after)
+            self._requeue(item)
+            return
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if item.attempts < self.max_retries:
+                item.attempts += 1
+                self.retried += 1
+                delay = self._retry_delay(item.attempts)
+                logger.warning(f"Transient error sending to {item.chat_id}, retry {item.attempts} in {delay}s: {e}")
+                self._requeue_later(item, delay)
+                return
+            self.failed += 1
+            item.future.set_exception(e)
+            return
+        except Exception as e:
+            self.failed += 1
+            item.future.set_exception(e)
+            return
+
+        self.sent += 1
+        self._record_sent()
+        item.future.set_result(result)
+
+    def _record_sent(self):
+        now = time.monotonic()
+        self._sent_times.append(now)
+        while self._sent_times and self._sent_times[0] < now - 60:
+            self._sent_times.popleft()
+
+    def throughput(self) -> float:
+        """Messages per second over the last minute"""
+        now = time.monotonic()
+        while self._sent_times and self._sent_times[0] < now - 60:
+            self._sent_times.popleft()
+        return len(self._sent_times) / 60
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "retry_after_events": self.retry_after_events,
+            "throughput_per_s": self.throughput(),
+            "chat_buckets": len(self._chat_buckets),
+        }
+
+
+# Shared queue used by all schedulers and admin handlers
+delivery_queue = DeliveryQueue()
+register_metrics_source("delivery", delivery_queue.stats)
@@ -0,0 +1,148 @@
+"""Shared HTTP client for all outbound integrations
+
+One application-lifetime aiohttp session (created in main.on_startup, closed
+in on_shutdown) with connection pooling, keep-alive and a DNS cache. Each
+request names its upstream, which selects a timeout profile and the bucket
+its latency and error stats are recorded in.
+"""
+
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+import aiohttp
+from config import HTTP_POOL_LIMIT, HTTP_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+# Per-upstream timeout profiles
+UPSTREAM_TIMEOUTS: Dict[str, aiohttp.ClientTimeout] = {
+    "aladhan": aiohttp.ClientTimeout(total=10, connect=5),
+    "nominatim": aiohttp.ClientTimeout(total=10, connect=5),
+    "overpass": aiohttp.ClientTimeout(total=30, connect=5),
+    "muis": aiohttp.ClientTimeout(total=30, connect=10),
+    "muis_pdf": aiohttp.ClientTimeout(total=60, connect=10),
+    "khutbah_pdf": aiohttp.ClientTimeout(total=30, connect=10),
+}
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+
+
+class UpstreamStats:
+    """Latency and error counters for one upstream"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, latency: float, error: Optional[str] = None):
+        self.requests += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if error:
+            self.errors += 1
+            self.last_error = error
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.requests if self.requests else 0.0
+
+
+class HttpClient:
+    """Pooled aiohttp session shared by all integrations"""
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_LIMIT_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats: Dict[str, UpstreamStats] = {}
+
+    async def start(self):
+        """Create the shared session"""
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+        logger.info(f"HTTP client started (pool {self.limit}, {self.limit_per_host} per host)")
+
+    async def close(self):
+        """Close the shared session and its connections"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client closed")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily when used outside the bot lifecycle (e.g. scripts)
+        if not self._session or self._session.closed:
+            await self.start()
+        return self._session
+
+    @asynccontextmanager
+    async def request(self, upstream: str, method: str, url: str, **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Make a request to a named upstream
+
+        Args:
+            upstream: Upstream name (selects timeout profile and stats bucket)
+            method: HTTP method
+            url: Request URL
+            **kwargs: Passed to aiohttp (params, data, headers, ...)
+
+        Yields:
+            The aiohttp response
+        """
+        session = await self._get_session()
+        kwargs.setdefault("timeout", UPSTREAM_TIMEOUTS.get(upstream, DEFAULT_TIMEOUT))
+        stats = self._stats.setdefault(upstream, UpstreamStats())
+
+        # Only the request itself is measured - not the caller's handling of the response
+        started = time.perf_counter()
+        try:
+            response = await session.request(method, url, **kwargs)
+        except Exception as e:
+            stats.record(time.perf_counter() - started, f"{type(e).__name__}: {e}")
+            raise
+        stats.record(time.perf_counter() - started, f"HTTP {response.status}" if response.status >= 400 else None)
+
+        async with response:
+            yield response
+
+    def get(self, upstream: str, url: str, **kwargs: Any):
+        """GET request to a named upstream"""
+        return self.request(upstream, "GET", url, **kwargs)
+
+    def post(self, upstream: str, url: str, **kwargs: Any):
+        """POST request to a named upstream"""
+        return self.request(upstream, "POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        metrics = {}
+        for upstream, stats in sorted(self._stats.items()):
+            metrics[f"{upstream}.requests"] = stats.requests
+            metrics[f"{upstream}.errors"] = stats.errors
+            metrics[f"{upstream}.avg_ms"] = stats.avg_latency * 1000
+            metrics[f"{upstream}.max_ms"] = stats.max_latency * 1000
+        return metrics
+
+
+# Shared client used by all integrations
+http_client = HttpClient()
+register_metrics_source("http", http_client.stats)
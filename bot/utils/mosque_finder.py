@@ -5,6 +5,7 @@ import aiohttp
 import math
 from typing import Optional, List, Dict
 from bot.utils.singapore_mosques import find_singapore_mosques, is_singapore_location
+from bot.utils.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -74,87 +75,86 @@ async def find_nearby_mosques(latitude: float, longitude: float, limit: int = 5)
             "User-Agent": "ROM_PeerBot/2.0 (Islamic Prayer App)"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                overpass_url, 
-                data={"data": overpass_query},
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    elements = data.get('elements', [])
-                    
-                    if not elements:
-                        logger.warning(f"No mosques found via Overpass API near ({latitude}, {longitude})")
-                        return None
-                    
-                    mosques_with_distance = []
-                    seen_coords = set()
-                    
-                    for element in elements:
-                        try:
-                            # Get coordinates (handle both nodes and ways)
-                            if element['type'] == 'node':
-                                place_lat = float(element['lat'])
-                                place_lon = float(element['lon'])
-                            elif element['type'] == 'way' and 'center' in element:
-                                place_lat = float(element['center']['lat'])
-                                place_lon = float(element['center']['lon'])
-                            else:
-                                continue
-                            
-                            # Avoid duplicates by coordinate
-                            coord_key = (round(place_lat, 4), round(place_lon, 4))
-                            if coord_key in seen_coords:
-                                continue
-                            seen_coords.add(coord_key)
-                            
-                            # Calculate distance
-                            distance = calculate_distance(latitude, longitude, place_lat, place_lon)
-                            
-                            # Get name from tags
-                            tags = element.get('tags', {})
-                            name = (tags.get('name') or 
-                                   tags.get('name:en') or 
-                                   tags.get('name:ms') or 
-                                   tags.get('name:ar') or
-                                   'Mosque')
-                            
-                            # Build address from available tags
-                            address_parts = [name]
-                            if tags.get('addr:street'):
-                                address_parts.append(tags.get('addr:street'))
-                            if tags.get('addr:postcode'):
-                                address_parts.append(tags.get('addr:postcode'))
-                            
-                            display_name = ', '.join(address_parts)
-                            
-                            mosques_with_distance.append({
-                                'display_name': display_name,
-                                'lat': str(place_lat),
-                                'lon': str(place_lon),
-                                'distance': distance
-                            })
-                            
-                        except (ValueError, TypeError, KeyError) as e:
-                            logger.debug(f"Error processing element: {e}")
-                            continue
-                    
-                    # Sort by distance and return top results
-                    mosques_with_distance.sort(key=lambda x: x['distance'])
-                    mosques = mosques_with_distance[:limit]
-                    
-                    logger.info(f"Found {len(mosques)} mosques via Overpass API near ({latitude}, {longitude})")
-                    return mosques if mosques else None
-                    
-                elif response.status == 429:
-                    logger.error("Overpass API rate limit exceeded")
-                    return None
-                else:
-                    logger.error(f"Overpass API returned status {response.status}")
+        async with http_client.post(
+            "overpass",
+            overpass_url,
+            data={"data": overpass_query},
+            headers=headers
+        ) as response:
+            if response.status == 200:
+                data = await response.json()
+                elements = data.get('elements', [])
+                
+                if not elements:
+                    logger.warning(f"No mosques found via Overpass API near ({latitude}, {longitude})")
                     return None
-        
+                
+                mosques_with_distance = []
+                seen_coords = set()
+                
+                for element in elements:
+                    try:
+                        # Get coordinates (handle both nodes and ways)
+                        if element['type'] == 'node':
+                            place_lat = float(element['lat'])
+                            place_lon = float(element['lon'])
+                        elif element['type'] == 'way' and 'center' in element:
+                            place_lat = float(element['center']['lat'])
+                            place_lon = float(element['center']['lon'])
+                        else:
+                            continue
+                        
+                        # Avoid duplicates by coordinate
+                        coord_key = (round(place_lat, 4), round(place_lon, 4))
+                        if coord_key in seen_coords:
+                            continue
+                        seen_coords.add(coord_key)
+                        
+                        # Calculate distance
+                        distance = calculate_distance(latitude, longitude, place_lat, place_lon)
+                        
+                        # Get name from tags
+                        tags = element.get('tags', {})
+                        name = (tags.get('name') or 
+                               tags.get('name:en') or 
+                               tags.get('name:ms') or 
+                               tags.get('name:ar') or
+                               'Mosque')
+                        
+                        # Build address from available tags
+                        address_parts = [name]
+                        if tags.get('addr:street'):
+                            address_parts.append(tags.get('addr:street'))
+                        if tags.get('addr:postcode'):
+                            address_parts.append(tags.get('addr:postcode'))
+                        
+                        display_name = ', '.join(address_parts)
+                        
+                        mosques_with_distance.append({
+                            'display_name': display_name,
+                            'lat': str(place_lat),
+                            'lon': str(place_lon),
+                            'distance': distance
+                        })
+                        
+                    except (ValueError, TypeError, KeyError) as e:
+                        logger.debug(f"Error processing element: {e}")
+                        continue
+                
+                # Sort by distance and return top results
+                mosques_with_distance.sort(key=lambda x: x['distance'])
+                mosques = mosques_with_distance[:limit]
+                
+                logger.info(f"Found {len(mosques)} mosques via Overpass API near ({latitude}, {longitude})")
+                return mosques if mosques else None
+                
+            elif response.status == 429:
+                logger.error("Overpass API rate limit exceeded")
+                return None
+            else:
+                logger.error(f"Overpass API returned status {response.status}")
+                return None
+    
     except aiohttp.ClientError as e:
         logger.error(f"Network error finding mosques: {e}")
         return None
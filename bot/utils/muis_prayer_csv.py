@@ -1,9 +1,15 @@
-"""MUIS Prayer Times CSV Reader - Official MUIS Data"""
+"""MUIS Prayer Times CSV Reader - Official MUIS Data
+
+The timetable is parsed once into an in-memory index keyed by date, with all
+times already normalized to 24-hour format. Lookups never touch the file; the
+index is swapped atomically when the CSV on disk changes.
+"""
 
 import csv
 import logging
-from datetime import datetime
-from typing import Optional, Dict
+import threading
+from datetime import datetime, date as date_cls, timedelta
+from typing import Optional, Dict, Tuple, Union
 import os
 import pytz
 
@@ -12,81 +18,181 @@ logger = logging.getLogger(__name__)
 # Singapore timezone
 SINGAPORE_TZ = pytz.timezone('Asia/Singapore')
 
+# Official MUIS timetable (in utils folder alongside this script)
+MUIS_CSV_PATH = os.path.join(os.path.dirname(__file__), 'MuslimPrayerTimetable2026.csv')
+
+DateLike = Union[datetime, date_cls]
+
 
-def get_prayer_times_from_csv(date: Optional[datetime] = None) -> Optional[Dict[str, str]]:
+def convert_to_24h(time_str: str) -> str:
     """
-    Get prayer times from the official MUIS CSV file
-    
+    Convert an afternoon/evening MUIS time to 24-hour format
+
+    CSV times use 12-hour format: 01:10 = 1:10 PM, 12:59 = 12:59 PM
+    Need to add 12 to hours 01-11 for afternoon/evening prayers
+    """
+    hour, minute = time_str.split(':')
+    hour = int(hour)
+    if hour < 12:  # 01:xx to 11:xx becomes 13:xx to 23:xx
+        hour += 12
+    return f"{hour:02d}:{minute}"
+
+
+def row_to_timings(row: Dict[str, str]) -> Dict[str, str]:
+    """Map MUIS column names to our expected format"""
+    return {
+        'Fajr': row['Subuh'],
+        'Sunrise': row['Syuruk'],
+        'Dhuhr': convert_to_24h(row['Zohor']),
+        'Asr': convert_to_24h(row['Asar']),
+        'Maghrib': convert_to_24h(row['Maghrib']),
+        'Isha': convert_to_24h(row['Isyak'])
+    }
+
+
+def _as_date(value: DateLike) -> date_cls:
+    """Normalize a datetime or date to a plain date"""
+    return value.date() if isinstance(value, datetime) else value
+
+
+class MuisTimetable:
+    """Date-keyed, in-memory index of the MUIS prayer timetable"""
+
+    def __init__(self, csv_path: str = MUIS_CSV_PATH):
+        self.csv_path = csv_path
+        self._index: Dict[date_cls, Dict[str, str]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._signature is not None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of the CSV file, or None if missing"""
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> bool:
+        """
+        Parse the CSV file and atomically replace the index
+
+        Returns:
+            True if the timetable was loaded, False on error (previous index is kept)
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if signature is None:
+                logger.error(f"MUIS CSV file not found at {self.csv_path}")
+                return False
+
+            try:
+                index = {}
+                with open(self.csv_path, 'r', encoding='utf-8') as file:
+                    for row in csv.DictReader(file):
+                        index[date_cls.fromisoformat(row['Date'])] = row_to_timings(row)
+            except Exception as e:
+                logger.error(f"Error reading MUIS CSV: {e}")
+                return False
+
+            # Single reference assignment - readers see either the old or the new index
+            self._index = index
+            self._signature = signature
+            logger.info(f"Loaded MUIS timetable: {len(index)} days from {os.path.basename(self.csv_path)}")
+            return True
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the timetable if the CSV file changed on disk
+
+        Returns:
+            True if a reload happened
+        """
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+        logger.info("MUIS CSV changed on disk, reloading timetable...")
+        return self.load()
+
+    def get(self, date: DateLike) -> Optional[Dict[str, str]]:
+        """Get prayer times for a single day"""
+        if not self.loaded:
+            self.load()
+        timings = self._index.get(_as_date(date))
+        return dict(timings) if timings else None
+
+    def get_range(self, start: DateLike, end: DateLike) -> Dict[date_cls, Dict[str, str]]:
+        """Get prayer times for every indexed day from start to end (inclusive)"""
+        if not self.loaded:
+            self.load()
+        index = self._index
+        day, last = _as_date(start), _as_date(end)
+        result = {}
+        while day <= last:
+            timings = index.get(day)
+            if timings:
+                result[day] = dict(timings)
+            day += timedelta(days=1)
+        return result
+
+
+# Shared timetable instance, loaded at startup
+timetable = MuisTimetable()
+
+
+def get_prayer_times_from_csv(date: Optional[DateLike] = None) -> Optional[Dict[str, str]]:
+    """
+    Get prayer times from the official MUIS timetable
+
     Args:
         date: The date to get prayer times for (defaults to today in Singapore timezone)
-    
+
     Returns:
         Dictionary with prayer times or None if not found
     """
     if date is None:
         date = datetime.now(SINGAPORE_TZ)
-    
-    # Format date to match CSV format (YYYY-MM-DD)
-    date_str = date.strftime("%Y-%m-%d")
-    
-    # Get path to CSV file (in utils folder alongside this script)
-    csv_path = os.path.join(
-        os.path.dirname(__file__),
-        'MuslimPrayerTimetable2026.csv'
-    )
-    
-    if not os.path.exists(csv_path):
-        logger.error(f"MUIS CSV file not found at {csv_path}")
-        return None
-    
-    try:
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            
-            for row in csv_reader:
-                if row['Date'] == date_str:
-                    # Map MUIS column names to our expected format
-                    # CSV times use 12-hour format: 01:10 = 1:10 PM, 12:59 = 12:59 PM
-                    # Need to add 12 to hours 01-11 for afternoon/evening prayers
-                    
-                    def convert_to_24h(time_str: str) -> str:
-                        hour, minute = time_str.split(':')
-                        hour = int(hour)
-                        if hour < 12:  # 01:xx to 11:xx becomes 13:xx to 23:xx
-                            hour += 12
-                        return f"{hour:02d}:{minute}"
-                    
-                    timings = {
-                        'Fajr': row['Subuh'],
-                        'Sunrise': row['Syuruk'],
-                        'Dhuhr': convert_to_24h(row['Zohor']),
-                        'Asr': convert_to_24h(row['Asar']),
-                        'Maghrib': convert_to_24h(row['Maghrib']),
-                        'Isha': convert_to_24h(row['Isyak'])
-                    }
-                    
-                    logger.info(f"Retrieved MUIS prayer times from CSV for {date_str}")
-                    return timings
-        
-        logger.warning(f"Date {date_str} not found in MUIS CSV")
-        return None
-        
-    except Exception as e:
-        logger.error(f"Error reading MUIS CSV: {e}")
+
+    timings = timetable.get(date)
+    if timings is None:
+        logger.warning(f"Date {date.strftime('%Y-%m-%d')} not found in MUIS CSV")
         return None
 
+    logger.debug(f"Retrieved MUIS prayer times from timetable for {date.strftime('%Y-%m-%d')}")
+    return timings
+
+
+def get_prayer_times_range_from_csv(start: DateLike, end: DateLike) -> Dict[date_cls, Dict[str, str]]:
+    """
+    Get prayer times for a date range from the official MUIS timetable
+
+    Args:
+        start: First date (inclusive)
+        end: Last date (inclusive)
+
+    Returns:
+        Dictionary mapping each date to its prayer times (missing dates are omitted)
+    """
+    return timetable.get_range(start, end)
+
 
 def get_readable_date(date: Optional[datetime] = None) -> str:
     """
     Get a human-readable date string
-    
+
     Args:
         date: The date (defaults to today in Singapore timezone)
-    
+
     Returns:
         Formatted date string
     """
     if date is None:
         date = datetime.now(SINGAPORE_TZ)
-    
+
     return date.strftime("%d %b %Y")
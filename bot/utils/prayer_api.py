@@ -2,11 +2,15 @@
 
 import logging
 import aiohttp
-from typing import Optional, Tuple, Dict
-from datetime import datetime
+from typing import Optional, Tuple, Dict, List, Sequence
+from datetime import datetime, date
 import pytz
-from config import PRAYER_API_URL, PRAYER_METHOD
+from config import PRAYER_API_URL, PRAYER_CALENDAR_API_URL, PRAYER_METHOD, LOCAL_PRAYER_CALC_ENABLED
 from bot.utils.muis_prayer_csv import get_prayer_times_from_csv, get_readable_date
+from bot.utils.http_client import http_client
+from bot.utils.prayer_cache import prayer_cache, normalize_location
+from bot.utils.single_flight import SingleFlight
+from bot.utils.prayer_calc import MWL, INVALID_TIME, calculate_calendars, date_range, month_bounds
 
 logger = logging.getLogger(__name__)
 
@@ -39,10 +43,158 @@ async def get_muis_prayer_times() -> Tuple[Optional[Dict[str, str]], Optional[st
         return None, None
 
 
+def _cache_aladhan_day(city: str, country: str, day_data: dict) -> bool:
+    """Store one day of an Aladhan response in the prayer times cache"""
+    try:
+        meta = day_data["meta"]
+        day = datetime.strptime(day_data["date"]["gregorian"]["date"], "%d-%m-%Y").date()
+        prayer_cache.put(
+            city,
+            country,
+            day,
+            day_data["timings"],
+            day_data["date"]["readable"],
+            meta["timezone"],
+            meta.get("latitude"),
+            meta.get("longitude"),
+        )
+        return True
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Could not cache prayer times for {city}, {country}: {e}")
+        return False
+
+
+def is_singapore(city: str, country: str) -> bool:
+    """Singapore locations are served from the MUIS timetable"""
+    return city.lower() == "singapore" or country.lower() == "singapore"
+
+
+async def fetch_prayer_calendar(city: str, country: str, year: int, month: int) -> int:
+    """
+    Fetch a whole month of prayer times for a city from Aladhan's calendar endpoint
+    and store every day in the prayer times cache
+    
+    Args:
+        city: City name
+        country: Country name
+        year: Calendar year
+        month: Calendar month (1-12)
+    
+    Returns:
+        Number of days cached
+    
+    Raises:
+        aiohttp.ClientError on network or HTTP errors
+    """
+    params = {
+        "city": city,
+        "country": country,
+        "method": PRAYER_METHOD
+    }
+    
+    async with http_client.get("aladhan", f"{PRAYER_CALENDAR_API_URL}/{year}/{month}", params=params) as response:
+        response.raise_for_status()
+        data = await response.json()
+    
+    cached = 0
+    for day_data in data["data"]:
+        # Calendar timings carry a timezone suffix, e.g. "05:37 (+08)"
+        day_data["timings"] = {
+            name: value.split(" ")[0] for name, value in day_data["timings"].items()
+        }
+        if _cache_aladhan_day(city, country, day_data):
+            cached += 1
+    
+    logger.info(f"Cached {cached} days of prayer times for {city}, {country} ({year}-{month:02d})")
+    return cached
+
+
+def local_calc_available() -> bool:
+    """The offline engine implements Aladhan method 3 (Muslim World League) only"""
+    return LOCAL_PRAYER_CALC_ENABLED and PRAYER_METHOD == 3
+
+
+def cache_calculated_prayer_times(locations: Sequence[Tuple[str, str]], days: Sequence[date]) -> List[Tuple[str, str]]:
+    """
+    Compute prayer times offline for every location whose coordinates are known
+    (learned from earlier Aladhan responses) in one batched call, and cache them
+    
+    Args:
+        locations: (city, country) pairs
+        days: Local dates to compute
+    
+    Returns:
+        The locations that were computed (the rest need Aladhan)
+    """
+    known = []
+    for city, country in locations:
+        info = prayer_cache.city_info(city, country)
+        if info and info.latitude is not None and info.longitude is not None:
+            known.append((city, country, info))
+    if not known or not days:
+        return []
+    
+    calendars = calculate_calendars(
+        [(float(info.latitude), float(info.longitude), info.timezone) for _, _, info in known],
+        days,
+        MWL,
+    )
+    for (city, country, info), calendar in zip(known, calendars):
+        for day, timings in calendar.items():
+            # Polar day/night - leave these dates to Aladhan
+            if INVALID_TIME in timings.values():
+                continue
+            prayer_cache.put(
+                city, country, day, timings, day.strftime("%d %b %Y"),
+                info.timezone, info.latitude, info.longitude
+            )
+    return [(city, country) for city, country, _ in known]
+
+
+def get_location_timezone(city: str, country: str) -> Optional[str]:
+    """
+    Timezone name of a location (known once its prayer times have been looked up)
+    
+    Returns:
+        Timezone name, or None if the location hasn't been resolved yet
+    """
+    if is_singapore(city, country):
+        return "Asia/Singapore"
+    info = prayer_cache.city_info(city, country)
+    return info.timezone if info else None
+
+
+def prayer_lookup_key(city: str, country: str) -> Tuple[str, ...]:
+    """Coalescing key for prayer time lookups - every Singapore spelling shares one"""
+    if is_singapore(city, country):
+        return ("singapore",)
+    return normalize_location(city, country)
+
+
 async def get_prayer_times(city: str, country: str) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
     """
     Fetch prayer times for a given city and country
-    For Singapore, uses MUIS official CSV data; for other locations, uses Aladhan API
+    
+    Concurrent lookups for the same location share one in-flight lookup, so a
+    burst of reminders costs one CSV read or Aladhan call.
+    
+    Args:
+        city: City name
+        country: Country name
+    
+    Returns:
+        Tuple of (timings dict, readable date string) or (None, None) on error
+    """
+    timings, readable_date = await _prayer_lookups.do(_lookup_prayer_times, city, country)
+    # Every caller gets its own copy of the shared result
+    return (dict(timings) if timings else None), readable_date
+
+
+async def _lookup_prayer_times(city: str, country: str) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """
+    Fetch prayer times for a given city and country
+    For Singapore, uses MUIS official CSV data; for other locations, uses the cache,
+    the offline calculator (once the city's coordinates are known) or Aladhan API
     
     Args:
         city: City name
@@ -52,13 +204,30 @@ async def get_prayer_times(city: str, country: str) -> Tuple[Optional[Dict[str,
         Tuple of (timings dict, readable date string) or (None, None) on error
     """
     # Use MUIS CSV data for Singapore for 100% accuracy
-    if city.lower() == "singapore" or country.lower() == "singapore":
+    if is_singapore(city, country):
         timings, date = await get_muis_prayer_times()
         if timings:
             return timings, date
         # Fall back to Aladhan if MUIS CSV reading fails
         logger.warning("MUIS CSV reading failed, falling back to Aladhan API")
     
+    # Prayer times only change once a day - serve repeat lookups from the cache
+    cached = prayer_cache.get(city, country)
+    if cached:
+        return cached
+    
+    # Known coordinates - compute the rest of the month offline instead of calling Aladhan
+    today = prayer_cache.local_date(city, country)
+    if today and local_calc_available():
+        try:
+            _, month_end = month_bounds(today.year, today.month)
+            if cache_calculated_prayer_times([(city, country)], date_range(today, month_end)):
+                cached = prayer_cache.get(city, country, today)
+                if cached:
+                    return cached
+        except Exception as e:
+            logger.error(f"Error calculating prayer times for {city}, {country}: {e}")
+    
     # Use Aladhan API for other locations
     try:
         params = {
@@ -67,20 +236,24 @@ async def get_prayer_times(city: str, country: str) -> Tuple[Optional[Dict[str,
             "method": PRAYER_METHOD
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(PRAYER_API_URL, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    timings = data["data"]["timings"]
-                    readable_date = data["data"]["date"]["readable"]
-                    logger.info(f"Fetched prayer times for {city}, {country}")
-                    return timings, readable_date
-                else:
-                    logger.error(f"Failed to fetch prayer times: HTTP {response.status}")
-                    return None, None
+        async with http_client.get("aladhan", PRAYER_API_URL, params=params) as response:
+            if response.status == 200:
+                data = await response.json()
+                timings = data["data"]["timings"]
+                readable_date = data["data"]["date"]["readable"]
+                logger.info(f"Fetched prayer times for {city}, {country}")
+                _cache_aladhan_day(city, country, data["data"])
+                return timings, readable_date
+            else:
+                logger.error(f"Failed to fetch prayer times: HTTP {response.status}")
+                return None, None
     except aiohttp.ClientError as e:
         logger.error(f"Network error fetching prayer times: {e}")
         return None, None
     except Exception as e:
         logger.error(f"Unexpected error fetching prayer times: {e}")
         return None, None
+
+
+# Shared by all callers of get_prayer_times
+_prayer_lookups = SingleFlight("prayer_lookups", key_fn=prayer_lookup_key)
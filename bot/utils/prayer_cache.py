@@ -0,0 +1,263 @@
+"""Cache for Aladhan prayer times
+
+Prayer times only change once per day per city, so Aladhan answers are cached
+by normalized (city, country, local date) and expire at the city's local
+midnight. The cache is size-bounded (LRU) and persisted to disk so warm
+entries survive restarts. Each bot process has its own cache; with several
+scheduler workers each one persists to its own file (worker_cache_path), so
+they never overwrite each other. The calendar prefetch reserves room for its whole
+window on top of PRAYER_CACHE_MAX_ENTRIES, so prefetched days are not
+evicted by each other or by on-demand lookups.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from datetime import datetime, date, time as dt_time, timedelta
+from typing import Any, Dict, Optional, Tuple
+import pytz
+from config import PRAYER_CACHE_MAX_ENTRIES, PRAYER_CACHE_PATH, SCHEDULER_WORKERS, SCHEDULER_WORKER_INDEX
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_location(city: str, country: str) -> Tuple[str, str]:
+    """Normalize a (city, country) pair for use as a cache key"""
+    return " ".join(city.split()).casefold(), " ".join(country.split()).casefold()
+
+
+@dataclass
+class CachedPrayerDay:
+    """Prayer times of one city for one local date"""
+    timings: Dict[str, str]
+    readable_date: str
+    expires_at: float  # Unix timestamp of the city's local midnight after this date
+
+
+@dataclass
+class CityInfo:
+    """Location metadata learned from Aladhan responses"""
+    timezone: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+def worker_cache_path(path: str, workers: int = SCHEDULER_WORKERS, index: int = SCHEDULER_WORKER_INDEX) -> str:
+    """This worker's cache file: the path itself with a single worker, else with the worker index added"""
+    if workers <= 1:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.worker{index}{extension}"
+
+
+def _get_timezone(name: str):
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        logger.warning(f"Unknown timezone {name}, using UTC")
+        return pytz.utc
+
+
+class PrayerTimesCache:
+    """LRU cache of prayer times with local-midnight expiry and disk persistence"""
+
+    def __init__(self, max_entries: int = PRAYER_CACHE_MAX_ENTRIES, path: str = PRAYER_CACHE_PATH):
+        self.base_max_entries = max_entries
+        self.reserved = 0
+        self.path = path
+        self._entries: "OrderedDict[CacheKey, CachedPrayerDay]" = OrderedDict()
+        self._cities: Dict[Tuple[str, str], CityInfo] = {}
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_entries(self) -> int:
+        return self.base_max_entries + self.reserved
+
+    def reserve(self, entries: int):
+        """Set the room kept for the prefetch window, on top of the configured size"""
+        if entries != self.reserved:
+            logger.info(f"Prayer times cache sized to {self.base_max_entries} + {entries} prefetch entries")
+        self.reserved = entries
+
+    def city_info(self, city: str, country: str) -> Optional[CityInfo]:
+        """Timezone and coordinates for a city, if Aladhan has told us"""
+        return self._cities.get(normalize_location(city, country))
+
+    def local_date(self, city: str, country: str) -> Optional[date]:
+        """Today's date in the city's timezone (None if the timezone is not known yet)"""
+        info = self.city_info(city, country)
+        if not info:
+            return None
+        return datetime.now(_get_timezone(info.timezone)).date()
+
+    def contains(self, city: str, country: str, day: date) -> bool:
+        """Check for an unexpired entry without touching LRU order or hit stats"""
+        entry = self._entries.get((*normalize_location(city, country), day.isoformat()))
+        return entry is not None and entry.expires_at > datetime.now(pytz.utc).timestamp()
+
+    def get(self, city: str, country: str, day: Optional[date] = None) -> Optional[Tuple[Dict[str, str], str]]:
+        """
+        Look up cached prayer times
+
+        Args:
+            city: City name
+            country: Country name
+            day: Local date (defaults to today in the city's timezone)
+
+        Returns:
+            Tuple of (timings dict, readable date string) or None on a miss
+        """
+        day = day or self.local_date(city, country)
+        if day is None:
+            self.misses += 1
+            return None
+
+        key = (*normalize_location(city, country), day.isoformat())
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= datetime.now(pytz.utc).timestamp():
+            del self._entries[key]
+            self._dirty = True
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry.timings), entry.readable_date
+
+    def put(
+        self,
+        city: str,
+        country: str,
+        day: date,
+        timings: Dict[str, str],
+        readable_date: str,
+        timezone: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+    ):
+        """Store prayer times for one local date of a city"""
+        location = normalize_location(city, country)
+        self._cities[location] = CityInfo(timezone, latitude, longitude)
+
+        tz = _get_timezone(timezone)
+        midnight = tz.localize(datetime.combine(day + timedelta(days=1), dt_time.min))
+        if midnight.timestamp() <= datetime.now(pytz.utc).timestamp():
+            # Past days of a fetched month would only take room from live entries
+            return
+
+        key = (*location, day.isoformat())
+        self._entries[key] = CachedPrayerDay(dict(timings), readable_date, midnight.timestamp())
+        self._entries.move_to_end(key)
+        self._dirty = True
+
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired entries, returning how many were removed"""
+        now = datetime.now(pytz.utc).timestamp()
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._dirty = True
+        return len(expired)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable copy of the cache contents"""
+        return {
+            "reserved": self.reserved,
+            "cities": [[*location, asdict(info)] for location, info in self._cities.items()],
+            "entries": [[*key, asdict(entry)] for key, entry in self._entries.items()],
+        }
+
+    def load(self) -> int:
+        """
+        Load persisted entries from disk (expired entries are skipped)
+
+        Returns:
+            Number of entries loaded
+        """
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading prayer times cache from {self.path}: {e}")
+            return 0
+
+        now = datetime.now(pytz.utc).timestamp()
+        # Keep room for the last prefetch window until the next prefetch sizes it again
+        self.reserved = data.get("reserved", 0)
+        for city, country, info in data.get("cities", []):
+            self._cities[(city, country)] = CityInfo(**info)
+        for city, country, day, entry in data.get("entries", []):
+            if entry["expires_at"] > now:
+                self._entries[(city, country, day)] = CachedPrayerDay(**entry)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        logger.info(f"Loaded {len(self._entries)} cached prayer time entries from {self.path}")
+        return len(self._entries)
+
+    def _write(self, data: Dict[str, Any]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    async def persist(self):
+        """Write the cache to disk (off the event loop) if it changed"""
+        if not self._dirty:
+            return
+        self.purge_expired()
+        data = self.snapshot()
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, data)
+            logger.debug(f"Persisted {len(data['entries'])} prayer time entries to {self.path}")
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Error persisting prayer times cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "cities": len(self._cities),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "max_entries": self.max_entries,
+        }
+
+
+# Shared cache used by prayer_api
+prayer_cache = PrayerTimesCache(path=worker_cache_path(PRAYER_CACHE_PATH))
+register_metrics_source("prayer_cache", prayer_cache.stats)
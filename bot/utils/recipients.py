@@ -0,0 +1,92 @@
+"""Pruning of recipients the bot can no longer reach
+
+Sends to users who blocked the bot, deleted their account or whose chat no
+longer exists fail permanently. The delivery queue reports those chats here;
+they are marked inactive (users.is_active) in batches, and every fan-out
+query filters with active_recipient() so they stop costing API calls and
+log lines. /start marks a user active again.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, update, func
+import database.db
+from database.models import User, UserSettings
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+# Bad Request descriptions that mean the chat is gone for good
+PERMANENT_BAD_REQUESTS = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """True if a send error means the chat can never be reached again"""
+    if isinstance(error, TelegramForbiddenError):
+        # Bot blocked, user deactivated, or bot kicked from the chat
+        return True
+    if isinstance(error, TelegramBadRequest):
+        message = str(error).lower()
+        return any(reason in message for reason in PERMANENT_BAD_REQUESTS)
+    return False
+
+
+def active_recipient(user_id_column=UserSettings.user_id):
+    """SQL condition excluding inactive users (anti-join on the partial inactive index)"""
+    return ~select(User.id).where(User.id == user_id_column, User.is_active == False).exists()
+
+
+class RecipientPruner:
+    """Collects unreachable chats and marks their users inactive in batches"""
+
+    def __init__(self):
+        self._pending: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.reported = 0
+        self.deactivated = 0
+
+    def report(self, chat_id: int):
+        """Record a permanent send failure (flushed to the database in the background)"""
+        self.reported += 1
+        self._pending.add(chat_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self.flush())
+
+    async def flush(self):
+        """Mark all reported users inactive"""
+        while self._pending and database.db.async_session_maker is not None:
+            # Let a burst of failures from one fan-out batch collect into one update
+            await asyncio.sleep(1)
+            user_ids, self._pending = self._pending, set()
+            try:
+                async with database.db.async_session_maker() as session:
+                    result = await session.execute(
+                        update(User)
+                        .where(User.id.in_(user_ids), User.is_active == True)
+                        .values(is_active=False, deactivated_at=func.now())
+                    )
+                    await session.commit()
+                self.deactivated += result.rowcount
+                if result.rowcount:
+                    logger.info(f"Marked {result.rowcount} unreachable users inactive")
+            except Exception as e:
+                logger.error(f"Error marking {len(user_ids)} users inactive: {e}")
+                self._pending |= user_ids
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "reported": self.reported,
+            "deactivated": self.deactivated,
+            "pending": len(self._pending),
+        }
+
+
+recipient_pruner = RecipientPruner()
+register_metrics_source("recipients", recipient_pruner.stats)
@@ -0,0 +1,99 @@
+"""Reminder delivery latency tracking
+
+For every scheduled reminder send we know three times: when the job was
+scheduled to fire (taken from APScheduler's submission event), when the
+delivery queue handed the message to Telegram, and when Telegram
+acknowledged it. Lateness against the scheduled time feeds one histogram
+per reminder type and stage, exposed as the "reminder_latency" metrics
+source and the admin /latency summary.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from apscheduler.events import JobSubmissionEvent
+from bot.metrics import LatencyHistogram, register_metrics_source
+from bot.utils.delivery_queue import DeliveryTrace
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("dispatch", "ack")
+
+
+class ReminderLatency:
+    """Per reminder type histograms of dispatch and acknowledgement lateness"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[str, LatencyHistogram]] = {}
+        # job id -> scheduled run time of its latest submission
+        self._scheduled: Dict[str, datetime] = {}
+
+    def job_submitted(self, event: JobSubmissionEvent):
+        """APScheduler listener (EVENT_JOB_SUBMITTED) recording when each job was due"""
+        if event.scheduled_run_times:
+            # Coalesced runs are measured against the latest missed time
+            self._scheduled[event.job_id] = event.scheduled_run_times[-1]
+
+    def scheduled_time(self, job_id: str) -> Optional[datetime]:
+        """When the job's current run was due (None if it wasn't started by the scheduler)"""
+        return self._scheduled.get(job_id)
+
+    def record(self, reminder_type: str, scheduled_at: Optional[datetime], trace: DeliveryTrace):
+        """Record one delivered reminder"""
+        if scheduled_at is None or trace.acknowledged_at is None:
+            return
+        histograms = self._histograms.get(reminder_type)
+        if histograms is None:
+            histograms = self._histograms[reminder_type] = {stage: LatencyHistogram() for stage in STAGES}
+        due = scheduled_at.timestamp()
+        histograms["dispatch"].observe(max(0.0, trace.dispatched_at - due))
+        histograms["ack"].observe(max(0.0, trace.acknowledged_at - due))
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{reminder type: {stage: {count, p50, p95, p99, max}}}"""
+        summary = {}
+        for reminder_type, histograms in sorted(self._histograms.items()):
+            summary[reminder_type] = {}
+            for stage, histogram in histograms.items():
+                percentiles = histogram.percentiles()
+                summary[reminder_type][stage] = {
+                    "count": histogram.count,
+                    "p50": percentiles[50],
+                    "p95": percentiles[95],
+                    "p99": percentiles[99],
+                    "max": histogram.max,
+                }
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for reminder_type, stages in self.summary().items():
+            stats[f"{reminder_type}_count"] = stages["ack"]["count"]
+            for stage, values in stages.items():
+                for point in ("p50", "p95", "p99"):
+                    if values[point] is not None:
+                        stats[f"{reminder_type}_{stage}_{point}_s"] = values[point]
+        return stats
+
+
+def format_latency_summary(summary: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    """Render a latency summary as Markdown for admins"""
+    if not summary:
+        return "⏱ *Reminder Latency*\n\nNo scheduled reminders delivered since the last restart."
+
+    def seconds(value) -> str:
+        return "-" if value is None else f"{value:.1f}s"
+
+    lines = ["⏱ *Reminder Latency* (lateness vs scheduled time)"]
+    for reminder_type, stages in summary.items():
+        lines.append(f"\n*{reminder_type}* ({stages['ack']['count']} sent)")
+        for stage, values in stages.items():
+            lines.append(
+                f"`{stage}`: p50 {seconds(values['p50'])} · p95 {seconds(values['p95'])} · "
+                f"p99 {seconds(values['p99'])} · max {seconds(values['max'])}"
+            )
+    return "\n".join(lines)
+
+
+reminder_latency = ReminderLatency()
+register_metrics_source("reminder_latency", reminder_latency.stats)
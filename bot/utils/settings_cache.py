@@ -0,0 +1,224 @@
+"""Write-through cache of user settings
+
+Settings are read far more often than they change: /prayertimes, repeated
+taps on a toggle and the per-user scheduling helpers all look a user up by
+id. The repository in user_settings keeps an immutable snapshot of each
+user's settings here - stored when a read misses or a write commits - so
+those lookups cost no database round-trip. Entries are LRU-bounded and
+expire after SETTINGS_CACHE_TTL_SECONDS.
+
+With several bot processes (SCHEDULER_WORKERS > 1) every settings write also
+sends a Postgres NOTIFY, delivered only if its transaction commits. Each
+process LISTENs on a dedicated connection and drops the entries the others
+changed. While that connection is down the cache is emptied and bypassed,
+since notifications may be missed.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select, event, func
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.orm import Session
+import database.db
+from database.models import UserSettings
+from bot.metrics import register_metrics_source
+from config import (
+    SETTINGS_CACHE_MAX_ENTRIES, SETTINGS_CACHE_TTL_SECONDS, SETTINGS_CACHE_CHANNEL, SCHEDULER_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+# Notification payloads are "<sender>:<user id>" ("*" for every user); a process ignores its own
+_SENDER = uuid.uuid4().hex[:12]
+_ALL_USERS = "*"
+_RECONNECT_SECONDS = 5
+
+# session.info key of the snapshots written in the session's current transaction
+_PENDING = "settings_cache_pending"
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """A user's settings as of the last read or committed write"""
+    user_id: int
+    prayer_reminders: bool
+    morning_adkar: bool
+    evening_adkar: bool
+    sleep_adkar: bool
+    allahu_allah_interval: Optional[int]
+    allahu_allah_phase: Optional[int]
+    city: str
+    country: str
+    friday_khutbah: bool
+
+
+# Columns to select (or return) for a snapshot, in field order
+SNAPSHOT_COLUMNS = tuple(getattr(UserSettings, field.name) for field in fields(SettingsSnapshot))
+
+
+class SettingsCache:
+    """LRU cache of settings snapshots with TTL expiry and LISTEN/NOTIFY invalidation"""
+
+    def __init__(
+        self,
+        max_entries: int = SETTINGS_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SETTINGS_CACHE_TTL_SECONDS,
+        channel: str = SETTINGS_CACHE_CHANNEL,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        # Other processes only write settings when there are several workers
+        self.notify = SCHEDULER_WORKERS > 1
+        self.enabled = not self.notify
+        self._entries: "OrderedDict[int, Tuple[float, SettingsSnapshot]]" = OrderedDict()
+        # Bumped by every invalidation, so a read racing a write doesn't store the old row
+        self.generation = 0
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[SettingsSnapshot]:
+        """Cached settings of a user (None on a miss)"""
+        entry = self._entries.get(user_id)
+        if entry is None or not self.enabled:
+            self.misses += 1
+            return None
+        expires_at, snapshot = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return snapshot
+
+    def put(self, snapshot: SettingsSnapshot, generation: Optional[int] = None):
+        """
+        Store a snapshot
+
+        Args:
+            snapshot: Settings to cache
+            generation: self.generation from before the snapshot was read; the snapshot is
+                dropped if anything was invalidated since (omit for committed writes)
+        """
+        if not self.enabled or (generation is not None and generation != self.generation):
+            return
+        self._entries[snapshot.user_id] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(snapshot.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's entry, or every entry"""
+        self.generation += 1
+        self.invalidations += 1
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def notification(self, user_id: Optional[int] = None):
+        """SQL expression announcing a settings change to the other processes (sent on commit)"""
+        return func.pg_notify(self.channel, f"{_SENDER}:{_ALL_USERS if user_id is None else user_id}")
+
+    def stage(self, session, snapshot: SettingsSnapshot):
+        """Cache a written snapshot once the session's transaction commits"""
+        session.info.setdefault(_PENDING, {})[snapshot.user_id] = snapshot
+
+    async def start(self):
+        """Start listening for other processes' changes (no-op with a single worker)"""
+        if not self.notify:
+            return
+        await self._listen()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop listening"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self._release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(_RECONNECT_SECONDS)
+            if self._connection is None:
+                await self._listen()
+                continue
+            try:
+                # Notifications are only delivered while the connection is idle - check it's alive
+                await self._connection.execute(select(1))
+                await self._connection.commit()
+            except Exception as e:
+                logger.error(f"Settings cache listener connection failed: {e}")
+                await self._release()
+
+    async def _listen(self):
+        try:
+            self._connection = await database.db.engine.connect()
+            raw = await self._connection.get_raw_connection()
+            await raw.driver_connection.add_listener(self.channel, self._on_notification)
+        except Exception as e:
+            logger.error(f"Error listening for settings changes: {e}")
+            await self._release()
+            return
+        # Anything cached before may have been missed
+        self.invalidate()
+        self.enabled = True
+        logger.info(f"Settings cache listening on {self.channel}")
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        sender, _, user_id = payload.partition(":")
+        if sender == _SENDER:
+            return
+        self.invalidate(None if user_id == _ALL_USERS else int(user_id))
+
+    async def _release(self):
+        self.enabled = not self.notify
+        self._entries.clear()
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            try:
+                await connection.invalidate()
+                await connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing settings cache listener connection: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+settings_cache = SettingsCache()
+register_metrics_source("settings_cache", settings_cache.stats)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_writes(session):
+    for snapshot in session.info.pop(_PENDING, {}).values():
+        settings_cache.put(snapshot)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_writes(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,61 @@
+"""Single-flight request coalescing
+
+Concurrent calls with the same key share one in-flight coroutine instead of
+each doing the same work (e.g. hundreds of reminder coroutines asking for the
+same city's prayer times in the same second). The key is removed as soon as
+the call finishes, so this does not cache results - it only deduplicates
+overlapping calls.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from bot.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key"""
+
+    def __init__(self, name: str, key_fn: Optional[Callable[..., Hashable]] = None):
+        """
+        Args:
+            name: Metrics source name
+            key_fn: Maps the call arguments to a coalescing key (defaults to the arguments themselves)
+        """
+        self.name = name
+        self.key_fn = key_fn or (lambda *args: args)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.executions = 0
+        register_metrics_source(name, self.stats)
+
+    async def do(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Run fn(*args), or join an identical call already in flight
+
+        Returns:
+            The result of the shared call (exceptions are shared too)
+        """
+        key = self.key_fn(*args)
+        self.calls += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shielded so one cancelled caller doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+            "in_flight": len(self._inflight),
+        }
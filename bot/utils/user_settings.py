@@ -0,0 +1,189 @@
+"""User and settings repository
+
+All reads and writes of a user's settings go through here:
+- Reads are served from the settings cache (see settings_cache) and only
+  query the database on a miss
+- Writes are one INSERT ... ON CONFLICT DO UPDATE ... RETURNING (no SELECT
+  first, and no duplicate key when a user double-taps a button before their
+  settings row exists), followed by a single statement rewriting the user's
+  subscriptions (see subscriptions). A write that wouldn't change the cached
+  settings is skipped. The written snapshot is cached when the transaction
+  commits
+
+Values a caller needs from before the write (the previous Allahu Allah slot,
+whether a returning user had been marked inactive) are read by a CTE of the
+same statement, which sees the row as it was before the update.
+"""
+
+import logging
+from typing import Optional, Tuple
+from sqlalchemy import select, update, func, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import database.db
+from database.models import User, UserSettings
+from bot.schedulers.subscriptions import sync_subscriptions
+from bot.utils.settings_cache import settings_cache, SettingsSnapshot, SNAPSHOT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Profile fields refreshed on /start
+_PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+# RETURNING flag: true when ON CONFLICT inserted the row rather than updating it
+_INSERTED = literal_column("xmax = 0").label("inserted")
+
+
+def _returning(user_id: int):
+    """Snapshot columns, plus the user's change notification for the other processes if there are any"""
+    return (*SNAPSHOT_COLUMNS, *([settings_cache.notification(user_id)] if settings_cache.notify else []))
+
+
+async def _written(session: AsyncSession, row) -> SettingsSnapshot:
+    snapshot = SettingsSnapshot(*row[:len(SNAPSHOT_COLUMNS)])
+    await sync_subscriptions(session, snapshot)
+    settings_cache.stage(session, snapshot)
+    return snapshot
+
+
+def _settings_upsert(user_id: int, values: dict):
+    upsert = pg_insert(UserSettings).values(user_id=user_id, **values)
+    return upsert.on_conflict_do_update(
+        index_elements=[UserSettings.user_id],
+        set_={**{name: getattr(upsert.excluded, name) for name in values}, "updated_at": func.now()},
+    )
+
+
+async def get_user_settings(user_id: int, session: Optional[AsyncSession] = None) -> Optional[SettingsSnapshot]:
+    """
+    A user's settings, from the cache if possible
+
+    Args:
+        user_id: User id
+        session: Session to read with on a miss (a new one is opened if omitted)
+
+    Returns:
+        The settings, None if the user has none
+    """
+    snapshot = settings_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+
+    generation = settings_cache.generation
+    query = select(*SNAPSHOT_COLUMNS).where(UserSettings.user_id == user_id)
+    if session is None:
+        async with database.db.async_session_maker() as session:
+            row = (await session.execute(query)).one_or_none()
+    else:
+        row = (await session.execute(query)).one_or_none()
+    if row is None:
+        return None
+
+    snapshot = SettingsSnapshot(*row)
+    settings_cache.put(snapshot, generation)
+    return snapshot
+
+
+async def update_user_settings(session: AsyncSession, user_id: int, create: bool = True, **values) -> Optional[SettingsSnapshot]:
+    """
+    Set settings of a user, creating their settings row if needed (caller commits)
+
+    Args:
+        session: Database session
+        user_id: User id (the user must be registered)
+        create: Create the settings row if it doesn't exist yet, otherwise leave such users alone
+        **values: UserSettings columns to set
+
+    Returns:
+        The user's settings after the write (None if create is off and they have none)
+    """
+    cached = settings_cache.get(user_id)
+    if cached is not None and all(getattr(cached, name) == value for name, value in values.items()):
+        return cached
+
+    if create:
+        statement = _settings_upsert(user_id, values)
+    else:
+        statement = (
+            update(UserSettings)
+            .where(UserSettings.user_id == user_id)
+            .values(**values, updated_at=func.now())
+        )
+    row = (await session.execute(statement.returning(*_returning(user_id)))).one_or_none()
+    if row is None:
+        return None
+    return await _written(session, row)
+
+
+async def set_allahu_allah(
+    session: AsyncSession, user_id: int, interval: Optional[int], phase: Optional[int]
+) -> Tuple[SettingsSnapshot, Optional[Tuple[int, int]]]:
+    """
+    Set a user's Allahu Allah interval and phase (caller commits)
+
+    Returns:
+        Tuple of (settings after the write, (interval, phase) before it or None if it was off)
+    """
+    previous = (
+        select(UserSettings.allahu_allah_interval, UserSettings.allahu_allah_phase)
+        .where(UserSettings.user_id == user_id)
+        .cte("previous")
+    )
+    statement = (
+        _settings_upsert(user_id, {"allahu_allah_interval": interval, "allahu_allah_phase": phase})
+        .add_cte(previous)
+        .returning(
+            select(previous.c.allahu_allah_interval).scalar_subquery(),
+            select(previous.c.allahu_allah_phase).scalar_subquery(),
+            *_returning(user_id),
+        )
+    )
+    previous_interval, previous_phase, *row = (await session.execute(statement)).one()
+    snapshot = await _written(session, row)
+    return snapshot, (previous_interval, previous_phase) if previous_interval else None
+
+
+async def register_user(
+    session: AsyncSession, user_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]
+) -> Optional[str]:
+    """
+    Create a user with default settings, or refresh their profile and mark them active again
+    (caller commits). Nothing is written when nothing changed.
+
+    Returns:
+        "registered", "reactivated" or "updated", None if nothing changed
+    """
+    previous = select(User.is_active).where(User.id == user_id).cte("previous")
+    upsert = pg_insert(User).values(
+        id=user_id, username=username, first_name=first_name, last_name=last_name, is_active=True
+    )
+    current = (*_PROFILE_FIELDS, "is_active")
+    statement = (
+        upsert.on_conflict_do_update(
+            index_elements=[User.id],
+            set_={
+                **{name: getattr(upsert.excluded, name) for name in current},
+                "deactivated_at": None,
+                "updated_at": func.now(),
+            },
+            where=tuple_(*(getattr(User, name) for name in current)).is_distinct_from(
+                tuple_(*(getattr(upsert.excluded, name) for name in current))
+            ),
+        )
+        .add_cte(previous)
+        .returning(_INSERTED, select(previous.c.is_active).scalar_subquery())
+    )
+    row = (await session.execute(statement)).one_or_none()
+    if row is None:
+        return None
+
+    inserted, was_active = row
+    if not inserted:
+        return "updated" if was_active else "reactivated"
+
+    row = (await session.execute(
+        pg_insert(UserSettings).values(user_id=user_id).on_conflict_do_nothing().returning(*SNAPSHOT_COLUMNS)
+    )).one_or_none()
+    if row is not None:
+        await _written(session, row)
+    return "registered"
@@ -34,13 +34,78 @@ else:
 DEFAULT_CITY = os.getenv("DEFAULT_CITY", "Singapore")
 DEFAULT_COUNTRY = os.getenv("DEFAULT_COUNTRY", "Singapore")
 PRAYER_API_URL = "https://api.aladhan.com/v1/timingsByCity"
+PRAYER_CALENDAR_API_URL = "https://api.aladhan.com/v1/calendarByCity"
 PRAYER_METHOD = 3  # Muslim World League
+# Compute MWL prayer times offline once a city's coordinates are known (Aladhan is only used to locate new cities)
+LOCAL_PRAYER_CALC_ENABLED = os.getenv("LOCAL_PRAYER_CALC_ENABLED", "true").lower() == "true"
 # Note: Singapore uses MUIS official CSV data (MuslimPrayerTimetable2026.csv)
+# Aladhan responses are cached per (city, country, local date) and persisted to disk
+# (per process: with several workers each one writes PRAYER_CACHE_PATH with its index added)
+PRAYER_CACHE_MAX_ENTRIES = int(os.getenv("PRAYER_CACHE_MAX_ENTRIES", "20000"))  # On top of the prefetch window, which is reserved separately
+PRAYER_CACHE_PATH = os.getenv("PRAYER_CACHE_PATH", ".cache/prayer_times.json")
+# Monthly calendar prefetch for every distinct user city
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "5"))
+PREFETCH_LEAD_DAYS = int(os.getenv("PREFETCH_LEAD_DAYS", "7"))  # Start fetching next month this many days ahead
+PREFETCH_MAX_ATTEMPTS = int(os.getenv("PREFETCH_MAX_ATTEMPTS", "3"))
+# How often to check the MUIS CSV for changes and reload the in-memory timetable
+MUIS_TIMETABLE_RELOAD_MINUTES = int(os.getenv("MUIS_TIMETABLE_RELOAD_MINUTES", "10"))
+
+# Reminder Fan-out Configuration
+# When enabled, one job per distinct (prayer, offset, time) delivers to all subscribers
+# instead of one job per user per prayer
+REMINDER_FANOUT_ENABLED = os.getenv("REMINDER_FANOUT_ENABLED", "true").lower() == "true"
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+# Bulk scheduling passes log progress and yield to the event loop every this many items
+SCHEDULING_CHUNK_SIZE = int(os.getenv("SCHEDULING_CHUNK_SIZE", "200"))
+# Bulk jobs (broadcasts, per-user scheduling, rebuilds) page through users this many rows per query
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+# Interval reminders (Allahu Allah) fire in phase slots of this many minutes (must divide 60)
+INTERVAL_SLOT_MINUTES = int(os.getenv("INTERVAL_SLOT_MINUTES", "5"))
+
+# Scheduler Persistence Configuration
+# Jobs are stored in Postgres and reloaded on restart; a job missed while the bot was down
+# still runs (once) if the restart is within the grace period
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "300"))
+
+# Multi-worker Scheduling Configuration
+# Run SCHEDULER_WORKERS processes with indexes 0..N-1: each delivers reminders to its share of
+# users, singleton jobs run on the advisory-lock leader, and only one process polls Telegram
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "1"))
+SCHEDULER_WORKER_INDEX = int(os.getenv("SCHEDULER_WORKER_INDEX", "0"))
+SCHEDULER_LEADER_LOCK_ID = int(os.getenv("SCHEDULER_LEADER_LOCK_ID", "7242401"))  # pg advisory lock key
+SCHEDULER_LEADER_RETRY_SECONDS = int(os.getenv("SCHEDULER_LEADER_RETRY_SECONDS", "15"))
+SCHEDULER_JOBS_CHANNEL = os.getenv("SCHEDULER_JOBS_CHANNEL", "scheduler_jobs_changed")  # NOTIFY channel of stored job changes
+POLLING_ENABLED = os.getenv("POLLING_ENABLED", "true" if SCHEDULER_WORKER_INDEX == 0 else "false").lower() == "true"
+
+# User Settings Cache Configuration
+# Settings snapshots are served from memory; with several workers, writes are announced on a
+# Postgres NOTIFY channel so every process drops the entries another one changed
+SETTINGS_CACHE_MAX_ENTRIES = int(os.getenv("SETTINGS_CACHE_MAX_ENTRIES", "50000"))
+SETTINGS_CACHE_TTL_SECONDS = int(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "600"))
+SETTINGS_CACHE_CHANNEL = os.getenv("SETTINGS_CACHE_CHANNEL", "user_settings_changed")
+
+# Outbound Delivery Queue Configuration (Telegram limits: ~30 msg/s globally, ~1 msg/s per chat)
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "16"))
+DELIVERY_GLOBAL_RATE = float(os.getenv("DELIVERY_GLOBAL_RATE", "30"))
+DELIVERY_PER_CHAT_RATE = float(os.getenv("DELIVERY_PER_CHAT_RATE", "1"))
+DELIVERY_PER_CHAT_BURST = float(os.getenv("DELIVERY_PER_CHAT_BURST", "3"))
+DELIVERY_MAX_PENDING = int(os.getenv("DELIVERY_MAX_PENDING", "10000"))
+DELIVERY_MAX_RETRIES = int(os.getenv("DELIVERY_MAX_RETRIES", "5"))
+
+# Shared HTTP Client Configuration
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))  # seconds
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))  # seconds
 
 # Friday Khutbah Configuration
 KHUTBAH_PDF_URL = os.getenv("KHUTBAH_PDF_URL", "")  # URL to fetch the latest Khutbah PDF
 KHUTBAH_MUIS_PAGE = "https://www.muis.gov.sg/resources/khutbah-and-religious-advice/khutbah/"
 KHUTBAH_ENABLED = os.getenv("KHUTBAH_ENABLED", "true").lower() == "true"
+KHUTBAH_SEND_CONCURRENCY = int(os.getenv("KHUTBAH_SEND_CONCURRENCY", "10"))
+KHUTBAH_BATCH_SIZE = int(os.getenv("KHUTBAH_BATCH_SIZE", "100"))  # Recipients processed (and checkpointed) per batch
+KHUTBAH_MAX_ATTEMPTS = int(os.getenv("KHUTBAH_MAX_ATTEMPTS", "3"))  # Sends per recipient before a transient failure is final
+KHUTBAH_RETRY_DELAY_SECONDS = int(os.getenv("KHUTBAH_RETRY_DELAY_SECONDS", "60"))  # Pause before re-sending to transient failures
 
 # Donation Configuration (New Institute - Ustaz Sameer)
 INSTITUTE_NAME = os.getenv("INSTITUTE_NAME", "Rose of Madinah Institute")
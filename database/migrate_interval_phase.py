@@ -0,0 +1,53 @@
+"""
+Database migration script for phase-bucketed interval reminders
+Run this after updating the models
+"""
+
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import DATABASE_URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def add_interval_phase():
+    """Add the Allahu Allah phase column and its slot index"""
+    logger.info("Adding interval reminder phase column...")
+    
+    engine = create_async_engine(DATABASE_URL)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            ALTER TABLE user_settings
+            ADD COLUMN IF NOT EXISTS allahu_allah_phase INTEGER
+        """))
+        logger.info("✅ Added user_settings.allahu_allah_phase")
+        
+        # Existing subscribers get a phase assigned by the bot on its next startup
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_user_settings_allahu_slot
+            ON user_settings(allahu_allah_interval, allahu_allah_phase)
+            WHERE allahu_allah_interval IS NOT NULL
+        """))
+        
+        logger.info("✅ Created indexes")
+    
+    await engine.dispose()
+    logger.info("✅ Interval phase migration completed successfully")
+
+
+async def main():
+    """Main migration function"""
+    try:
+        await add_interval_phase()
+        logger.info("🎉 Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
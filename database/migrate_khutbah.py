@@ -0,0 +1,83 @@
+"""
+Database migration script for resumable khutbah distribution
+Run this after updating the models
+"""
+
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import DATABASE_URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def create_khutbah_distribution_tables():
+    """Create khutbah distribution tables and audience index"""
+    logger.info("Creating khutbah distribution tables...")
+    
+    engine = create_async_engine(DATABASE_URL)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS khutbahs (
+                id BIGSERIAL PRIMARY KEY,
+                content_hash VARCHAR(64) NOT NULL UNIQUE,
+                filename VARCHAR(255) NOT NULL,
+                telegram_file_id VARCHAR(255),
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        logger.info("✅ Created khutbahs table")
+        
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS khutbah_distributions (
+                id BIGSERIAL PRIMARY KEY,
+                khutbah_id BIGINT NOT NULL UNIQUE REFERENCES khutbahs(id) ON DELETE CASCADE,
+                status VARCHAR(20) NOT NULL DEFAULT 'running',
+                sent_count INTEGER NOT NULL DEFAULT 0,
+                failed_count INTEGER NOT NULL DEFAULT 0,
+                started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP WITH TIME ZONE
+            )
+        """))
+        logger.info("✅ Created khutbah_distributions table")
+        
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS khutbah_deliveries (
+                distribution_id BIGINT NOT NULL REFERENCES khutbah_distributions(id) ON DELETE CASCADE,
+                user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error VARCHAR(500),
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (distribution_id, user_id)
+            )
+        """))
+        logger.info("✅ Created khutbah_deliveries table")
+        
+        # Create indexes for better performance
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_khutbah_deliveries_pending
+            ON khutbah_deliveries(distribution_id, user_id) WHERE status = 'pending'
+        """))
+        
+        logger.info("✅ Created indexes")
+    
+    await engine.dispose()
+    logger.info("✅ Khutbah distribution migration completed successfully")
+
+
+async def main():
+    """Main migration function"""
+    try:
+        await create_khutbah_distribution_tables()
+        logger.info("🎉 Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
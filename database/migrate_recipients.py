@@ -0,0 +1,53 @@
+"""
+Database migration script for inactive recipient pruning
+Run this after updating the models
+"""
+
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import DATABASE_URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def add_user_active_columns():
+    """Add the users.is_active flag, its deactivation timestamp and the inactive index"""
+    logger.info("Adding user activity columns...")
+    
+    engine = create_async_engine(DATABASE_URL)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            ADD COLUMN IF NOT EXISTS deactivated_at TIMESTAMP WITH TIME ZONE
+        """))
+        logger.info("✅ Added users.is_active and users.deactivated_at")
+        
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_users_inactive
+            ON users(id)
+            WHERE is_active = FALSE
+        """))
+        
+        logger.info("✅ Created indexes")
+    
+    await engine.dispose()
+    logger.info("✅ Recipient migration completed successfully")
+
+
+async def main():
+    """Main migration function"""
+    try:
+        await add_user_active_columns()
+        logger.info("🎉 Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
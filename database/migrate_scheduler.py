@@ -0,0 +1,65 @@
+"""
+Database migration script for the persistent scheduler job store
+Run this after updating the models
+"""
+
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import DATABASE_URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def create_scheduler_tables():
+    """Create scheduler job store tables"""
+    logger.info("Creating scheduler tables...")
+    
+    engine = create_async_engine(DATABASE_URL)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS scheduler_jobs (
+                id VARCHAR(191) PRIMARY KEY,
+                version INTEGER NOT NULL,
+                next_run_time DOUBLE PRECISION,
+                job_state BYTEA NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        logger.info("✅ Created scheduler_jobs table")
+        
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS scheduler_state (
+                key VARCHAR(64) PRIMARY KEY,
+                value TIMESTAMP WITH TIME ZONE
+            )
+        """))
+        logger.info("✅ Created scheduler_state table")
+        
+        # Create indexes for better performance
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_scheduler_jobs_next_run_time
+            ON scheduler_jobs(next_run_time)
+        """))
+        
+        logger.info("✅ Created indexes")
+    
+    await engine.dispose()
+    logger.info("✅ Scheduler migration completed successfully")
+
+
+async def main():
+    """Main migration function"""
+    try:
+        await create_scheduler_tables()
+        logger.info("🎉 Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
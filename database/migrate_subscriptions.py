@@ -0,0 +1,69 @@
+"""
+Database migration script for the subscriptions table
+Run this after updating the models
+"""
+
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from config import DATABASE_URL
+from bot.schedulers.subscriptions import rebuild_subscriptions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def create_subscriptions_table():
+    """Create the subscriptions table and its audience indexes, then backfill it from user_settings"""
+    logger.info("Creating subscriptions table...")
+
+    engine = create_async_engine(DATABASE_URL)
+
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                feature VARCHAR(32) NOT NULL,
+                params VARCHAR(32),
+                city_group VARCHAR(512) NOT NULL,
+                PRIMARY KEY (user_id, feature)
+            )
+        """))
+        logger.info("✅ Created subscriptions table")
+
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_audience
+            ON subscriptions(feature, city_group, user_id)
+        """))
+
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_interval_slot
+            ON subscriptions(params, user_id)
+            WHERE feature = 'allahu_allah'
+        """))
+
+        logger.info("✅ Created indexes")
+
+    # Rows are derived from user_settings (the bot also backfills an empty table on startup)
+    async with AsyncSession(engine) as session:
+        written = await rebuild_subscriptions(session)
+        await session.commit()
+    logger.info(f"✅ Backfilled {written} subscriptions")
+
+    await engine.dispose()
+    logger.info("✅ Subscriptions migration completed successfully")
+
+
+async def main():
+    """Main migration function"""
+    try:
+        await create_subscriptions_table()
+        logger.info("🎉 Migration completed successfully!")
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,7 @@
 """Database models for users and settings"""
 
-from sqlalchemy import Column, BigInteger, String, Boolean, Integer, DateTime, ForeignKey, Numeric, Enum as SQLEnum
-from sqlalchemy.sql import func
+from sqlalchemy import Column, BigInteger, String, Boolean, Integer, DateTime, ForeignKey, Numeric, Index, Float, LargeBinary, Enum as SQLEnum
+from sqlalchemy.sql import func, true
 from database.db import Base
 import enum
 
@@ -31,9 +31,17 @@ class User(Base):
     username = Column(String(255), nullable=True)
     first_name = Column(String(255), nullable=True)
     last_name = Column(String(255), nullable=True)
+    # Cleared when sends fail permanently (bot blocked, chat not found, account deleted), set again on /start
+    is_active = Column(Boolean, default=True, server_default=true(), nullable=False)
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Fan-out queries anti-join against the (small) set of inactive users
+        Index('idx_users_inactive', 'id', postgresql_where=(is_active == False)),
+    )
+    
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username})>"
 
@@ -48,16 +56,43 @@ class UserSettings(Base):
     evening_adkar = Column(Boolean, default=False, nullable=False)
     sleep_adkar = Column(Boolean, default=False, nullable=False)
     allahu_allah_interval = Column(Integer, nullable=True)  # 2, 4, 6 hours or NULL
+    allahu_allah_phase = Column(Integer, nullable=True)  # Minutes into the interval cycle (from 00:00 SGT) reminders fire at
     city = Column(String(255), default='Singapore', nullable=False)
     country = Column(String(255), default='Singapore', nullable=False)
     friday_khutbah = Column(Boolean, default=True, nullable=False)  # Receive Friday Khutbah
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Interval reminder slot fan-out
+        Index('idx_user_settings_allahu_slot', 'allahu_allah_interval', 'allahu_allah_phase',
+              postgresql_where=(allahu_allah_interval.isnot(None))),
+    )
+    
     def __repr__(self):
         return f"<UserSettings(user_id={self.user_id}, prayer_reminders={self.prayer_reminders})>"
 
 
+class Subscription(Base):
+    """One row per feature a user receives, derived from UserSettings (see bot.schedulers.subscriptions)"""
+    __tablename__ = 'subscriptions'
+
+    user_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    feature = Column(String(32), primary_key=True)  # A UserSettings flag name, or 'allahu_allah'
+    params = Column(String(32), nullable=True)  # Feature parameters, e.g. the Allahu Allah slot '2h/15'
+    city_group = Column(String(512), nullable=False)  # group_id of the user's location (see city_groups)
+
+    __table_args__ = (
+        # City group fan-outs and the khutbah audience: one range scan per (feature, group)
+        Index('idx_subscriptions_audience', 'feature', 'city_group', 'user_id'),
+        # Interval reminder slot fan-out
+        Index('idx_subscriptions_interval_slot', 'params', 'user_id', postgresql_where=(feature == 'allahu_allah')),
+    )
+
+    def __repr__(self):
+        return f"<Subscription(user_id={self.user_id}, feature={self.feature}, params={self.params})>"
+
+
 class Donation(Base):
     """Donation records"""
     __tablename__ = 'donations'
@@ -119,3 +154,78 @@ class BroadcastMessageRecipient(Base):
     
     def __repr__(self):
         return f"<BroadcastMessageRecipient(broadcast_id={self.broadcast_id}, user_id={self.user_id})>"
+
+
+class Khutbah(Base):
+    """Friday Khutbah documents, with the Telegram file_id once uploaded"""
+    __tablename__ = 'khutbahs'
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    content_hash = Column(String(64), nullable=False, unique=True, index=True)  # SHA-256 of the PDF
+    filename = Column(String(255), nullable=False)
+    telegram_file_id = Column(String(255), nullable=True)  # Reused for every send after the first upload
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<Khutbah(id={self.id}, filename={self.filename})>"
+
+
+class KhutbahDistribution(Base):
+    """A distribution run of one khutbah to all opted-in users"""
+    __tablename__ = 'khutbah_distributions'
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    khutbah_id = Column(BigInteger, ForeignKey('khutbahs.id', ondelete='CASCADE'), nullable=False, unique=True)
+    status = Column(String(20), default='running', nullable=False)  # running, completed, abandoned
+    sent_count = Column(Integer, default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<KhutbahDistribution(id={self.id}, khutbah_id={self.khutbah_id}, status={self.status})>"
+
+
+class KhutbahDelivery(Base):
+    """Per-recipient delivery state of a khutbah distribution run"""
+    __tablename__ = 'khutbah_deliveries'
+    
+    distribution_id = Column(BigInteger, ForeignKey('khutbah_distributions.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    status = Column(String(20), default='pending', nullable=False)  # pending (incl. transient failures to retry), sent, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(String(500), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        # Resuming a run only scans the recipients still pending
+        Index('idx_khutbah_deliveries_pending', 'distribution_id', 'user_id', postgresql_where=(status == 'pending')),
+    )
+    
+    def __repr__(self):
+        return f"<KhutbahDelivery(distribution_id={self.distribution_id}, user_id={self.user_id}, status={self.status})>"
+
+
+class SchedulerJob(Base):
+    """Scheduler job persisted by bot.schedulers.job_store"""
+    __tablename__ = 'scheduler_jobs'
+    
+    id = Column(String(191), primary_key=True)
+    version = Column(Integer, nullable=False)  # JOB_DEFINITIONS_VERSION the job was written with
+    next_run_time = Column(Float, nullable=True, index=True)  # UTC timestamp, NULL when paused
+    job_state = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<SchedulerJob(id={self.id}, version={self.version})>"
+
+
+class SchedulerState(Base):
+    """Scheduler bookkeeping, e.g. when schedules were last reconciled with subscriptions"""
+    __tablename__ = 'scheduler_state'
+    
+    key = Column(String(64), primary_key=True)
+    value = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<SchedulerState(key={self.key}, value={self.value})>"
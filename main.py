@@ -4,6 +4,7 @@ Main entry point with aiogram
 """
 
 import sys
+import signal
 import logging
 import asyncio
 from aiogram import Bot, Dispatcher
@@ -11,14 +12,32 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.events import EVENT_JOB_SUBMITTED
 
-from config import API_TOKEN, LOG_LEVEL
+from config import (
+    API_TOKEN, LOG_LEVEL, MUIS_TIMETABLE_RELOAD_MINUTES, SCHEDULER_MISFIRE_GRACE_SECONDS,
+    POLLING_ENABLED
+)
 from database import init_db, close_db
 from bot.handlers import start, prayer, adkar, misc, admin
-from bot.schedulers.prayer_scheduler import setup_prayer_scheduler, schedule_all_prayer_reminders
-from bot.schedulers.adkar_scheduler import setup_adkar_scheduler, schedule_all_adkar
-from bot.schedulers.khutbah_scheduler import setup_khutbah_scheduler
+from bot.schedulers.prayer_scheduler import setup_prayer_scheduler
+from bot.schedulers.adkar_scheduler import setup_adkar_scheduler
+from bot.schedulers.job_store import PersistentJobStore
+from bot.schedulers.reconcile import reconcile_schedules
+from bot.schedulers.khutbah_scheduler import setup_khutbah_scheduler, resume_khutbah_distributions
+from bot.schedulers.prefetch_scheduler import setup_prefetch_scheduler, prefetch_prayer_calendars
+from bot.schedulers.workers import leader, leader_only
 from bot.security import initialize_file_hashes, periodic_security_check, check_kill_switch
+from bot.utils.muis_prayer_csv import timetable
+from bot.utils.delivery_queue import delivery_queue
+from bot.utils.http_client import http_client
+from bot.utils.prayer_cache import prayer_cache
+from bot.utils.reminder_latency import reminder_latency
+from bot.utils.recipients import recipient_pruner
+from bot.utils.settings_cache import settings_cache
+from bot.startup import startup
+from bot.db_session import register_db_session_middleware
 
 # Configure logging
 logging.basicConfig(
@@ -28,25 +47,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Keep references to fire-and-forget startup tasks so they aren't garbage collected
+_background_tasks = set()
 
-async def on_startup(bot: Bot, scheduler: AsyncIOScheduler):
-    """Actions to perform on bot startup"""
-    logger.info("Initializing ROM PeerBot...")
-    
-    # Initialize security monitoring
-    logger.info("Initializing security system...")
-    initialize_file_hashes()
-    
-    # Check for active kill switch
-    if check_kill_switch():
-        logger.critical("⚠️ KILL SWITCH IS ACTIVE - Critical functions are disabled!")
-        logger.critical("Remove .killswitch file and restart to restore full functionality")
-    
-    # Initialize database
-    await init_db()
-    logger.info("Database initialized")
-    
-    # Setup bot commands menu
+
+def run_in_background(coro):
+    """Run a coroutine as a background task that outlives the caller"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def refresh_muis_timetable():
+    """Reload the MUIS timetable off the event loop if the CSV changed"""
+    await asyncio.to_thread(timetable.reload_if_changed)
+
+
+async def set_bot_commands(bot: Bot):
+    """Setup bot commands menu"""
     from aiogram.types import BotCommand
     commands = [
         BotCommand(command="start", description="Start the bot"),
@@ -69,33 +88,144 @@ async def on_startup(bot: Bot, scheduler: AsyncIOScheduler):
     ]
     await bot.set_my_commands(commands)
     logger.info("Bot commands menu configured")
+
+
+async def warm_up(bot: Bot, scheduler: AsyncIOScheduler, job_store: PersistentJobStore):
+    """Background warm-up that runs while the bot is already polling"""
+    try:
+        with startup.phase("warmup"):
+            steps = [startup.timed("bot_commands", set_bot_commands(bot))]
+            if leader.is_leader:
+                # Only schedule what changed since the stored jobs were saved (everything on first run);
+                # other workers pick the leader's jobs up from the job store
+                steps.append(startup.timed("reminder_scheduling", reconcile_schedules(scheduler, bot, job_store)))
+            await asyncio.gather(*steps)
+    except Exception as e:
+        logger.error(f"Error during startup warm-up: {e}", exc_info=True)
+    finally:
+        startup.mark_ready()
+
+
+async def take_over(bot: Bot, scheduler: AsyncIOScheduler, job_store: PersistentJobStore):
+    """Leader-only startup work for a worker that became leader after a failover"""
+    await job_store.sync()
+    await reconcile_schedules(scheduler, bot, job_store)
+    await resume_khutbah_distributions(bot)
+
+
+async def on_startup(bot: Bot, scheduler: AsyncIOScheduler, job_store: PersistentJobStore):
+    """Core startup - everything polling depends on; bulk work is left to warm_up"""
+    logger.info("Initializing ROM PeerBot...")
     
-    # Setup schedulers
-    setup_prayer_scheduler(scheduler, bot)
-    setup_adkar_scheduler(scheduler, bot)
-    setup_khutbah_scheduler(scheduler, bot)
+    # Independent steps run concurrently: file hashing, timetable and cache loading are
+    # file I/O in worker threads while the database connects
+    with startup.phase("core"):
+        await asyncio.gather(
+            startup.timed("security_hashes", asyncio.to_thread(initialize_file_hashes)),
+            # Load MUIS timetable into memory (parsed once, served without file I/O)
+            startup.timed("muis_timetable", asyncio.to_thread(timetable.load)),
+            # Warm the Aladhan prayer times cache from disk
+            startup.timed("prayer_cache", asyncio.to_thread(prayer_cache.load)),
+            startup.timed("database", init_db()),
+        )
+        logger.info("Database initialized")
+        
+        # Check for active kill switch
+        if check_kill_switch():
+            logger.critical("⚠️ KILL SWITCH IS ACTIVE - Critical functions are disabled!")
+            logger.critical("Remove .killswitch file and restart to restore full functionality")
+        
+        # Restore reminder jobs stored before the last shutdown
+        job_store.bind(bot)
+        await startup.timed("job_store", job_store.load())
+        # Apply reminder jobs the other workers add, move or remove as they store them
+        await startup.timed("job_store_listener", job_store.start_listening())
+        
+        # Singleton jobs run on one worker only (always this one with a single worker)
+        await startup.timed("leader_election", leader.start())
+        leader.on_promoted(lambda: take_over(bot, scheduler, job_store))
+        
+        # Drop cached settings changed by the other workers
+        await startup.timed("settings_cache", settings_cache.start())
+        
+        # Start the rate-limited outbound delivery queue used by schedulers and broadcasts
+        await delivery_queue.start()
+        
+        # Shared pooled HTTP client for Aladhan, MUIS, Overpass and Nominatim
+        await http_client.start()
+        
+        # Setup schedulers
+        setup_prayer_scheduler(scheduler, bot)
+        setup_adkar_scheduler(scheduler, bot)
+        setup_khutbah_scheduler(scheduler, bot)
+        setup_prefetch_scheduler(scheduler)
+        
+        # Setup security monitoring (check every hour)
+        from apscheduler.triggers.interval import IntervalTrigger
+        import pytz
+        scheduler.add_job(
+            leader_only(periodic_security_check),
+            trigger=IntervalTrigger(hours=1, timezone=pytz.timezone("Asia/Singapore")),
+            id="security_check",
+            name="Periodic Security Check",
+            jobstore="memory",
+            replace_existing=True
+        )
+        logger.info("Security monitoring scheduler configured")
+        
+        # Pick up MUIS timetable updates without a restart
+        scheduler.add_job(
+            refresh_muis_timetable,
+            trigger=IntervalTrigger(minutes=MUIS_TIMETABLE_RELOAD_MINUTES, timezone=pytz.timezone("Asia/Singapore")),
+            id="muis_timetable_reload",
+            name="MUIS Timetable Reload",
+            jobstore="memory",
+            replace_existing=True
+        )
+        
+        # Persist the prayer times cache so warm entries survive restarts
+        scheduler.add_job(
+            prayer_cache.persist,
+            trigger=IntervalTrigger(minutes=15, timezone=pytz.timezone("Asia/Singapore")),
+            id="prayer_cache_persist",
+            name="Prayer Times Cache Persist",
+            jobstore="memory",
+            replace_existing=True
+        )
     
-    # Setup security monitoring (check every hour)
-    from apscheduler.triggers.interval import IntervalTrigger
-    import pytz
-    scheduler.add_job(
-        periodic_security_check,
-        trigger=IntervalTrigger(hours=1, timezone=pytz.timezone("Asia/Singapore")),
-        id="security_check",
-        name="Periodic Security Check"
-    )
-    logger.info("Security monitoring scheduler configured")
+    if leader.is_leader:
+        # Finish any khutbah distribution interrupted by a restart
+        run_in_background(resume_khutbah_distributions(bot))
+    # Fill the prayer times cache for every user city (no-op for months already cached);
+    # on every worker, since each one has its own cache
+    run_in_background(prefetch_prayer_calendars(scheduler))
     
-    # Schedule initial reminders
-    await schedule_all_prayer_reminders(scheduler, bot)
-    await schedule_all_adkar(scheduler, bot)
+    # Bot commands and bulk reminder scheduling; startup.ready is set when done
+    run_in_background(warm_up(bot, scheduler, job_store))
     
-    logger.info("✅ ROM PeerBot is ready!")
+    logger.info("✅ ROM PeerBot core is up - warm-up continues in the background")
 
 
-async def on_shutdown():
+async def wait_for_stop_signal():
+    """Block until SIGINT or SIGTERM (workers that don't poll)"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+async def on_shutdown(job_store: PersistentJobStore):
     """Actions to perform on bot shutdown"""
     logger.info("Shutting down ROM PeerBot...")
+    await delivery_queue.stop()
+    await http_client.close()
+    await prayer_cache.persist()
+    await job_store.flush()
+    await job_store.stop_listening()
+    await recipient_pruner.flush()
+    await leader.stop()
+    await settings_cache.stop()
     await close_db()
     logger.info("ROM PeerBot stopped")
 
@@ -111,12 +241,20 @@ async def main():
     # Initialize dispatcher with memory storage
     dp = Dispatcher(storage=MemoryStorage())
     
-    # Initialize scheduler
-    scheduler = AsyncIOScheduler(timezone="Asia/Singapore")
+    # Initialize scheduler - reminder jobs persist in Postgres, process-local jobs stay in memory
+    job_store = PersistentJobStore()
+    scheduler = AsyncIOScheduler(
+        timezone="Asia/Singapore",
+        jobstores={"default": job_store, "memory": MemoryJobStore()},
+        job_defaults={"coalesce": True, "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS}
+    )
+    # Reminder sends measure their lateness against the time their job was due
+    scheduler.add_listener(reminder_latency.job_submitted, EVENT_JOB_SUBMITTED)
     
-    # Set scheduler reference in adkar handler for immediate rescheduling
+    # Set scheduler reference in adkar and prayer handlers for immediate rescheduling
     from bot.handlers.adkar import set_scheduler
     set_scheduler(scheduler)
+    prayer.set_scheduler(scheduler)
     
     # Register handlers
     dp.include_router(start.router)
@@ -125,15 +263,8 @@ async def main():
     dp.include_router(misc.router)
     dp.include_router(admin.router)
     
-    # Middleware to inject session into handlers
-    from sqlalchemy.ext.asyncio import AsyncSession
-    import database.db
-    
-    @dp.update.middleware()
-    async def db_session_middleware(handler, event, data):
-        async with database.db.async_session_maker() as session:
-            data['session'] = session
-            return await handler(event, data)
+    # Inject a session into handlers - opened only if the handler uses it
+    register_db_session_middleware(start.router, prayer.router, adkar.router, misc.router, admin.router)
     
     try:
         # Start scheduler
@@ -141,15 +272,21 @@ async def main():
         logger.info("Scheduler started")
         
         # Run startup actions
-        await on_startup(bot, scheduler)
+        await on_startup(bot, scheduler, job_store)
         
-        # Start polling
-        logger.info("Starting bot polling...")
-        await dp.start_polling(
-            bot,
-            allowed_updates=dp.resolve_used_update_types(),
-            handle_signals=True
-        )
+        if POLLING_ENABLED:
+            # Start polling
+            logger.info("Starting bot polling...")
+            startup.mark_polling()
+            await dp.start_polling(
+                bot,
+                allowed_updates=dp.resolve_used_update_types(),
+                handle_signals=True
+            )
+        else:
+            # Delivery-only worker: Telegram allows a single getUpdates consumer per bot
+            logger.info("Polling disabled on this worker - running scheduled jobs only")
+            await wait_for_stop_signal()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user (Ctrl+C)")
     except Exception as e:
@@ -158,7 +295,7 @@ async def main():
     finally:
         # Cleanup
         scheduler.shutdown()
-        await on_shutdown()
+        await on_shutdown(job_store)
         await bot.session.close()
 
 
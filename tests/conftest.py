@@ -0,0 +1,58 @@
+"""Shared test setup"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# config refuses to import without a bot token
+os.environ.setdefault("API_TOKEN", "test")
+
+# Tests that need Postgres itself (NOTIFY, ON CONFLICT ... RETURNING xmax) run against this
+# scratch database - every table in it is dropped - and are skipped when it isn't set
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Point database.db at a fresh SQLite file with every table created
+
+    Returns a sync engine on the same file for seeding and inspecting rows.
+    """
+    import database.db
+    from database.models import Base
+
+    path = tmp_path / "bot.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    # No pooling: each asyncio.run() gets connections on its own loop
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    monkeypatch.setattr(database.db, "engine", engine)
+    monkeypatch.setattr(database.db, "async_session_maker", async_sessionmaker(engine, expire_on_commit=False))
+    yield sync_engine
+    sync_engine.dispose()
+
+
+@pytest.fixture
+def postgres_db(monkeypatch):
+    """Point database.db at TEST_DATABASE_URL with every table recreated empty"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import database.db
+    from database.models import Base
+
+    async def recreate():
+        engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(recreate())
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+    monkeypatch.setattr(database.db, "engine", engine)
+    monkeypatch.setattr(database.db, "async_session_maker", async_sessionmaker(engine, expire_on_commit=False))
+    return engine
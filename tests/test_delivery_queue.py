@@ -0,0 +1,157 @@
+"""Tests for the delivery queue and its rate limiter (bot.utils.delivery_queue)"""
+
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMessage
+
+from bot.utils.delivery_queue import DeliveryQueue, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _take(bucket: TokenBucket, count: int):
+    for _ in range(count):
+        assert bucket.delay() == 0
+        bucket.tokens -= 1
+
+
+def test_burst_up_to_capacity_then_waits_for_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+    _take(bucket, 3)
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock.now += 0.25
+    assert bucket.delay() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.delay() == 0
+
+
+def test_refill_is_capped_at_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    _take(bucket, 2)
+    clock.now += 60
+    _take(bucket, 2)
+    assert bucket.delay() == pytest.approx(1)
+
+
+def test_pause_blocks_and_discards_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=5, clock=clock)
+    bucket.pause(10)
+    assert bucket.delay() == pytest.approx(10)
+    assert not bucket.is_idle()
+
+    # Nothing accumulated during the pause - only what refilled since it ended
+    clock.now += 12
+    _take(bucket, 2)
+    assert bucket.delay() == pytest.approx(1)
+
+
+def test_is_idle_once_full_again():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    assert bucket.is_idle()
+    _take(bucket, 1)
+    assert not bucket.is_idle()
+    clock.now += 1
+    assert bucket.is_idle()
+
+
+class FakeBot:
+    """Records send_message calls; each chat fails with the queued errors first"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        self.sent.append((chat_id, text))
+        return text
+
+
+def _queue(monkeypatch, **kwargs) -> DeliveryQueue:
+    monkeypatch.setattr(DeliveryQueue, "_retry_delay", staticmethod(lambda attempts: 0.01))
+    options = dict(workers=2, global_rate=1000, per_chat_rate=1000, per_chat_burst=1000, max_retries=2)
+    options.update(kwargs)
+    return DeliveryQueue(**options)
+
+
+def _run(queue: DeliveryQueue, scenario):
+    async def main():
+        await queue.start()
+        try:
+            return await scenario()
+        finally:
+            await queue.stop(drain_timeout=1)
+    return asyncio.run(main())
+
+
+def test_transient_errors_are_retried_until_sent(monkeypatch):
+    queue = _queue(monkeypatch)
+    bot = FakeBot({1: [TelegramNetworkError(SendMessage(chat_id=1, text="x"), "reset"),
+                       TelegramServerError(SendMessage(chat_id=1, text="x"), "bad gateway")]})
+
+    result = _run(queue, lambda: queue.send_message(bot, 1, "salam"))
+    assert result == "salam"
+    assert bot.sent == [(1, "salam")]
+    assert (queue.retried, queue.sent, queue.failed) == (2, 1, 0)
+
+
+def test_transient_errors_give_up_after_max_retries(monkeypatch):
+    queue = _queue(monkeypatch, max_retries=1)
+    bot = FakeBot({1: [TelegramNetworkError(SendMessage(chat_id=1, text="x"), "reset") for _ in range(3)]})
+
+    with pytest.raises(TelegramNetworkError):
+        _run(queue, lambda: queue.send_message(bot, 1, "salam"))
+    assert (queue.retried, queue.sent, queue.failed) == (1, 0, 1)
+
+
+def test_flood_control_requeues_the_message(monkeypatch):
+    queue = _queue(monkeypatch)
+    bot = FakeBot({1: [TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "slow down", retry_after=0)]})
+
+    assert _run(queue, lambda: queue.send_message(bot, 1, "salam")) == "salam"
+    assert queue.retry_after_events == 1
+    assert queue.sent == 1
+
+
+def test_rate_limited_chat_does_not_hold_up_other_chats(monkeypatch):
+    # Chat 1 may send once per second; its second message must not block chat 2's
+    queue = _queue(monkeypatch, workers=1, per_chat_rate=1, per_chat_burst=1)
+    bot = FakeBot()
+
+    async def scenario():
+        first = asyncio.ensure_future(queue.send_message(bot, 1, "a"))
+        second = asyncio.ensure_future(queue.send_message(bot, 1, "b"))
+        await asyncio.sleep(0.05)
+        other = await asyncio.wait_for(queue.send_message(bot, 2, "c"), timeout=0.5)
+        return other, await asyncio.gather(first, second)
+
+    other, results = _run(queue, scenario)
+    assert other == "c"
+    assert results == ["a", "b"]
+    assert [chat_id for chat_id, _ in bot.sent] == [1, 2, 1]
+    assert queue.deferred >= 1
+
+
+def test_stop_waits_for_deferred_messages(monkeypatch):
+    queue = _queue(monkeypatch, per_chat_rate=10, per_chat_burst=1)
+    bot = FakeBot()
+
+    async def scenario():
+        return [asyncio.ensure_future(queue.send_message(bot, 1, text)) for text in "abc"]
+
+    futures = _run(queue, scenario)
+    assert [future.result() for future in futures] == ["a", "b", "c"]
@@ -0,0 +1,96 @@
+"""Tests for Allahu Allah phase slots (bot.schedulers.interval_scheduler)"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import insert
+
+from bot.schedulers import interval_scheduler
+from bot.schedulers.interval_scheduler import _slot_trigger, next_phase
+from database.models import User, UserSettings
+
+SINGAPORE_TZ = pytz.timezone("Asia/Singapore")
+
+
+def _fire_times(slot, start: datetime, count: int):
+    trigger = _slot_trigger(slot)
+    times, previous, now = [], None, start
+    for _ in range(count):
+        next_time = trigger.get_next_fire_time(previous, now)
+        times.append(next_time)
+        previous, now = next_time, next_time + timedelta(seconds=1)
+    return times
+
+
+@pytest.mark.parametrize("interval, phase, first", [
+    (2, 0, (0, 0)),
+    (2, 95, (1, 35)),
+    (4, 200, (3, 20)),
+    (6, 355, (5, 55)),
+])
+def test_slot_fires_every_interval_from_its_phase(interval, phase, first):
+    start = SINGAPORE_TZ.localize(datetime(2026, 3, 1))
+    times = _fire_times((interval, phase), start, 24 // interval + 1)
+
+    assert (times[0].hour, times[0].minute) == first
+    assert all(later - earlier == timedelta(hours=interval) for earlier, later in zip(times, times[1:]))
+    # The cycle restarts at the same phase the next day
+    assert times[24 // interval] == times[0] + timedelta(days=1)
+    assert all(time.utcoffset() == timedelta(hours=8) for time in times)
+
+
+@pytest.mark.parametrize("interval", [2, 4, 6])
+def test_next_phase_is_the_next_slot_the_trigger_fires_at(monkeypatch, interval):
+    monkeypatch.setattr(interval_scheduler, "INTERVAL_SLOT_MINUTES", 5)
+    now = SINGAPORE_TZ.localize(datetime(2026, 3, 1, 13, 47, 30))
+    phase = next_phase(interval, now)
+
+    assert phase % 5 == 0 and 0 <= phase < interval * 60
+    first, second = _fire_times((interval, phase), now, 2)
+    assert (first.hour, first.minute) == (13, 50)
+    # The reminder after the first one is a full interval later
+    assert second - first == timedelta(hours=interval)
+
+
+@pytest.mark.parametrize("clock, expected", [
+    ((10, 7, 0), 10),
+    ((10, 5, 0), 10),
+    # Less than a minute to 10:10 - too close to have the job in place
+    ((10, 9, 30), 15),
+    ((10, 58, 59), 0),
+])
+def test_next_phase_leaves_time_to_schedule_the_first_slot(monkeypatch, clock, expected):
+    monkeypatch.setattr(interval_scheduler, "INTERVAL_SLOT_MINUTES", 5)
+    now = SINGAPORE_TZ.localize(datetime(2026, 3, 1, *clock))
+    assert next_phase(1, now) == expected
+
+
+def test_next_phase_uses_singapore_time(monkeypatch):
+    monkeypatch.setattr(interval_scheduler, "INTERVAL_SLOT_MINUTES", 5)
+    utc_now = pytz.utc.localize(datetime(2026, 3, 1, 0, 0))
+    assert next_phase(24, utc_now) == 8 * 60 + 5
+
+
+def test_slot_job_is_dropped_when_only_inactive_members_remain(sqlite_db):
+    with sqlite_db.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "is_active": True}, {"id": 2, "is_active": False}])
+        conn.execute(insert(UserSettings), [
+            {"user_id": 1, "allahu_allah_interval": None, "allahu_allah_phase": None},
+            # Still in the slot, but unreachable
+            {"user_id": 2, "allahu_allah_interval": 2, "allahu_allah_phase": 30},
+        ])
+
+    async def scenario():
+        scheduler = AsyncIOScheduler(timezone=pytz.utc)
+        scheduler.start(paused=True)
+        interval_scheduler.ensure_slot_job(scheduler, object(), (2, 30))
+        # User 1 just turned reminders off
+        await interval_scheduler.apply_interval_change(scheduler, object(), 1, (2, 30), None)
+        jobs = [job.id for job in scheduler.get_jobs()]
+        scheduler.shutdown(wait=False)
+        return jobs
+
+    assert asyncio.run(scenario()) == []
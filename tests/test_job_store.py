@@ -0,0 +1,243 @@
+"""Tests for the database-persisted scheduler job store (bot.schedulers.job_store)"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import select
+
+from bot.schedulers import job_store
+from bot.schedulers.job_store import PersistentJobStore
+from bot.schedulers.prayer_scheduler import send_prayer_reminder_fanout
+from database.models import SchedulerJob
+
+JOB_ID = "prayer_fanout_london/united kingdom_Fajr"
+LONDON = ("london", "united kingdom")
+
+
+class Worker:
+    """One scheduler process: its own job store and scheduler over the shared table"""
+
+    def __init__(self, version: int = 2, notify: bool = False):
+        self.bot = object()
+        self.store = PersistentJobStore(version=version)
+        self.store.notify = notify
+        self.store.bind(self.bot)
+        self.scheduler = AsyncIOScheduler(jobstores={"default": self.store}, timezone=pytz.utc)
+        self.scheduler.start(paused=True)
+
+    def add_fajr(self, hour: int = 6, minute: int = 10):
+        self.scheduler.add_job(
+            send_prayer_reminder_fanout,
+            trigger=CronTrigger(hour=hour, minute=minute, timezone=pytz.timezone("Europe/London")),
+            args=[self.bot, "Fajr", "entered", LONDON],
+            id=JOB_ID,
+            replace_existing=True,
+        )
+
+    def stop(self):
+        self.scheduler.shutdown(wait=False)
+
+
+def _notify(store: PersistentJobStore, *job_ids: str, sender: str = "other-worker"):
+    """Deliver a change notification as the listener connection would"""
+    store._on_notification(None, 0, store.channel, "\n".join([sender, *job_ids]))
+
+
+def _stored(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(SchedulerJob.id, SchedulerJob.version)).all())
+
+
+def test_jobs_survive_a_restart(sqlite_db):
+    async def scenario():
+        before = Worker()
+        before.add_fajr()
+        next_run = before.scheduler.get_job(JOB_ID).next_run_time
+        await before.store.flush()
+        before.stop()
+
+        after = Worker()
+        loaded = await after.store.load()
+        job = after.scheduler.get_job(JOB_ID)
+        after.stop()
+        return after, loaded, job, next_run
+
+    after, loaded, job, next_run = asyncio.run(scenario())
+    assert loaded == 1
+    assert job.func is send_prayer_reminder_fanout
+    # Runtime objects are re-bound to the new process
+    assert job.args == (after.bot, "Fajr", "entered", LONDON)
+    assert job.next_run_time == next_run
+    assert str(job.trigger) == str(CronTrigger(hour=6, minute=10, timezone=pytz.timezone("Europe/London")))
+
+
+def test_jobs_of_another_definitions_version_are_discarded(sqlite_db):
+    async def scenario():
+        old = Worker(version=1)
+        old.add_fajr()
+        await old.store.flush()
+        old.stop()
+
+        new = Worker(version=2)
+        loaded = await new.store.load()
+        await new.store.flush()
+        new.stop()
+        return new, loaded
+
+    new, loaded = asyncio.run(scenario())
+    assert (loaded, new.store.discarded) == (0, 1)
+    assert _stored(sqlite_db) == {}
+
+
+def test_removed_jobs_are_deleted_from_the_table(sqlite_db):
+    async def scenario():
+        worker = Worker()
+        worker.add_fajr()
+        await worker.store.flush()
+        stored = _stored(sqlite_db)
+        worker.scheduler.remove_job(JOB_ID)
+        await worker.store.flush()
+        worker.stop()
+        return stored
+
+    assert asyncio.run(scenario()) == {JOB_ID: 2}
+    assert _stored(sqlite_db) == {}
+
+
+def test_sync_applies_other_workers_changes(sqlite_db):
+    async def scenario():
+        leader, follower = Worker(), Worker()
+        await follower.store.load()
+        steps = {}
+
+        leader.add_fajr()
+        await leader.store.flush()
+        steps["added"] = await follower.store.sync()
+        job = follower.scheduler.get_job(JOB_ID)
+        steps["bot"] = job.args[0] is follower.bot
+
+        leader.add_fajr(minute=12)
+        await leader.store.flush()
+        steps["moved"] = await follower.store.sync()
+        steps["trigger"] = str(follower.scheduler.get_job(JOB_ID).trigger)
+
+        # A run only advances next_run_time - the follower keeps its own
+        job = leader.scheduler.get_job(JOB_ID)
+        job.modify(next_run_time=datetime(2030, 1, 1, tzinfo=pytz.utc))
+        await leader.store.flush()
+        steps["ran"] = await follower.store.sync()
+
+        leader.scheduler.remove_job(JOB_ID)
+        await leader.store.flush()
+        steps["removed"] = await follower.store.sync()
+        steps["gone"] = follower.scheduler.get_job(JOB_ID) is None
+
+        leader.stop()
+        follower.stop()
+        return steps
+
+    steps = asyncio.run(scenario())
+    assert steps == {
+        "added": 1,
+        "bot": True,
+        "moved": 1,
+        "trigger": str(CronTrigger(hour=6, minute=12, timezone=pytz.timezone("Europe/London"))),
+        "ran": 0,
+        "removed": 1,
+        "gone": True,
+    }
+
+
+def test_sync_keeps_local_changes_not_yet_stored(sqlite_db):
+    async def scenario():
+        worker = Worker()
+        worker.add_fajr()
+        # Flushed by sync itself before it compares with the table
+        changed = await worker.store.sync()
+        worker.stop()
+        return changed
+
+    assert asyncio.run(scenario()) == 0
+    assert _stored(sqlite_db) == {JOB_ID: 2}
+
+
+def test_notified_jobs_are_applied_right_away(sqlite_db):
+    async def scenario():
+        leader, follower = Worker(), Worker()
+        await follower.store.load()
+
+        leader.add_fajr()
+        await leader.store.flush()
+        _notify(follower.store, JOB_ID)
+        await follower.store._sync_task
+        job = follower.scheduler.get_job(JOB_ID)
+
+        leader.scheduler.remove_job(JOB_ID)
+        await leader.store.flush()
+        _notify(follower.store, JOB_ID)
+        await follower.store._sync_task
+        gone = follower.scheduler.get_job(JOB_ID) is None
+
+        leader.stop()
+        follower.stop()
+        return job, gone
+
+    job, gone = asyncio.run(scenario())
+    assert job.args[2:] == ("entered", LONDON)
+    assert gone
+
+
+def test_notification_only_syncs_the_named_jobs(sqlite_db):
+    async def scenario():
+        leader, follower = Worker(), Worker()
+        leader.add_fajr()
+        await leader.store.flush()
+        changed = await follower.store.sync(["prayer_fanout_cairo/egypt_Fajr"])
+        leader.stop()
+        follower.stop()
+        return changed, follower.scheduler.get_job(JOB_ID)
+
+    assert asyncio.run(scenario()) == (0, None)
+
+
+def test_own_notifications_are_ignored(sqlite_db):
+    async def scenario():
+        worker = Worker()
+        _notify(worker.store, JOB_ID, sender=job_store._SENDER)
+        task = worker.store._sync_task
+        worker.stop()
+        return task
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_large_changes_announce_a_full_sync():
+    store = PersistentJobStore()
+    few = store._notification(["a", "b"]).clauses.clauses[1].value
+    many = store._notification([f"prayer_fanout_city{index}_Fajr" for index in range(1000)]).clauses.clauses[1].value
+    assert few.split("\n") == [job_store._SENDER, "a", "b"]
+    assert many.split("\n") == [job_store._SENDER, "*"]
+
+
+def test_followers_pick_up_stored_jobs_over_notify(postgres_db):
+    async def scenario():
+        leader, follower = Worker(notify=True), Worker(notify=True)
+        await follower.store.start_listening()
+        leader.add_fajr()
+        await leader.store.flush()
+        for _ in range(50):
+            if follower.scheduler.get_job(JOB_ID):
+                break
+            await asyncio.sleep(0.1)
+        job = follower.scheduler.get_job(JOB_ID)
+        await follower.store.stop_listening()
+        leader.stop()
+        follower.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job is not None and job.args[1] == "Fajr"
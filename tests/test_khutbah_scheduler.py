@@ -0,0 +1,142 @@
+"""Tests for resumable khutbah distribution (bot.schedulers.khutbah_scheduler)"""
+
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendDocument
+from sqlalchemy import insert, select
+
+from bot.schedulers import khutbah_scheduler
+from database.models import Khutbah, KhutbahDelivery, KhutbahDistribution
+
+RUN_ID = 1
+
+
+class Crash(Exception):
+    """Stands in for the process dying mid-run"""
+
+
+class FakeSender:
+    """Replaces _send_khutbah_to_user; each user fails with their queued errors first"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def __call__(self, bot, khutbah, user_id, pdf_bytes):
+        if self.errors.get(user_id):
+            error = self.errors[user_id].pop(0)
+            if isinstance(error, Crash):
+                raise error
+            return error
+        self.sent.append(user_id)
+        return None
+
+
+def _network_error():
+    return TelegramNetworkError(SendDocument(chat_id=1, document="file"), "connection reset")
+
+
+def _blocked():
+    return TelegramForbiddenError(SendDocument(chat_id=1, document="file"), "bot was blocked by the user")
+
+
+@pytest.fixture
+def run(sqlite_db, monkeypatch):
+    monkeypatch.setattr(khutbah_scheduler, "KHUTBAH_BATCH_SIZE", 2)
+    monkeypatch.setattr(khutbah_scheduler, "KHUTBAH_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(khutbah_scheduler, "KHUTBAH_RETRY_DELAY_SECONDS", 0)
+    with sqlite_db.begin() as conn:
+        conn.execute(insert(Khutbah), [{"id": 1, "content_hash": "abc", "filename": "khutbah.pdf", "telegram_file_id": "file"}])
+        conn.execute(insert(KhutbahDistribution), [{"id": RUN_ID, "khutbah_id": 1, "status": "running"}])
+        conn.execute(insert(KhutbahDelivery), [{"distribution_id": RUN_ID, "user_id": user_id} for user_id in range(1, 6)])
+    return sqlite_db
+
+
+def _deliver(monkeypatch, sender: FakeSender):
+    monkeypatch.setattr(khutbah_scheduler, "_send_khutbah_to_user", sender)
+    asyncio.run(khutbah_scheduler._deliver_khutbah_distribution(None, RUN_ID, None))
+
+
+def _deliveries(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(select(KhutbahDelivery.user_id, KhutbahDelivery.status, KhutbahDelivery.attempts))
+        return {row.user_id: (row.status, row.attempts) for row in rows}
+
+
+def _run_state(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(KhutbahDistribution.status, KhutbahDistribution.sent_count, KhutbahDistribution.failed_count)
+        ).one()
+
+
+def test_transient_failures_are_retried_and_permanent_ones_are_not(run, monkeypatch):
+    sender = FakeSender({2: [_network_error()], 3: [_blocked()]})
+    _deliver(monkeypatch, sender)
+
+    assert sorted(sender.sent) == [1, 2, 4, 5]
+    assert _deliveries(run) == {
+        1: ("sent", 1), 2: ("sent", 2), 3: ("failed", 1), 4: ("sent", 1), 5: ("sent", 1),
+    }
+    assert tuple(_run_state(run)) == ("completed", 4, 1)
+
+
+def test_transient_failures_give_up_after_max_attempts(run, monkeypatch):
+    sender = FakeSender({2: [_network_error() for _ in range(5)]})
+    _deliver(monkeypatch, sender)
+
+    assert _deliveries(run)[2] == ("failed", 3)
+    assert tuple(_run_state(run)) == ("completed", 4, 1)
+
+
+def test_interrupted_run_resumes_after_the_last_checkpoint(run, monkeypatch):
+    # Dies while sending the second batch (users 3 and 4)
+    sender = FakeSender({4: [Crash()]})
+    with pytest.raises(Crash):
+        _deliver(monkeypatch, sender)
+    assert _deliveries(run) == {
+        1: ("sent", 1), 2: ("sent", 1), 3: ("pending", 0), 4: ("pending", 0), 5: ("pending", 0),
+    }
+    assert _run_state(run).status == "running"
+
+    resumed = FakeSender()
+    _deliver(monkeypatch, resumed)
+    assert resumed.sent == [3, 4, 5]
+    assert tuple(_run_state(run)) == ("completed", 5, 0)
+
+
+def test_resume_retries_transient_failures_only(run, monkeypatch):
+    with run.begin() as conn:
+        conn.execute(
+            KhutbahDelivery.__table__.update()
+            .where(KhutbahDelivery.user_id.in_([1, 3, 5]))
+            .values(status="sent", attempts=1)
+        )
+        conn.execute(
+            KhutbahDelivery.__table__.update()
+            .where(KhutbahDelivery.user_id == 4)
+            .values(status="failed", attempts=1, error="Forbidden: bot was blocked by the user")
+        )
+        # Failed transiently before the restart
+        conn.execute(
+            KhutbahDelivery.__table__.update()
+            .where(KhutbahDelivery.user_id == 2)
+            .values(attempts=1, error="connection reset")
+        )
+
+    sender = FakeSender()
+    _deliver(monkeypatch, sender)
+    assert sender.sent == [2]
+    assert _deliveries(run)[2] == ("sent", 2)
+    assert tuple(_run_state(run)) == ("completed", 4, 1)
+
+
+def test_finished_run_is_not_sent_again(run, monkeypatch):
+    with run.begin() as conn:
+        conn.execute(KhutbahDistribution.__table__.update().values(status="completed"))
+
+    sender = FakeSender()
+    _deliver(monkeypatch, sender)
+    assert sender.sent == []
@@ -0,0 +1,135 @@
+"""Tests for the Aladhan prayer times cache (bot.utils.prayer_cache)"""
+
+import asyncio
+from datetime import date, datetime
+
+import pytest
+import pytz
+
+from bot.utils import prayer_cache as prayer_cache_module
+from bot.utils.prayer_cache import PrayerTimesCache, worker_cache_path
+
+TIMINGS = {"Fajr": "06:10", "Sunrise": "08:00", "Dhuhr": "12:10", "Asr": "14:00", "Maghrib": "16:20", "Isha": "18:05"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen UTC time for the cache module; set clock.now to move it"""
+    class FrozenDatetime(datetime):
+        now_utc = pytz.utc.localize(datetime(2026, 1, 15, 12, 0))
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.now_utc.astimezone(tz) if tz else cls.now_utc.replace(tzinfo=None)
+
+    monkeypatch.setattr(prayer_cache_module, "datetime", FrozenDatetime)
+    return FrozenDatetime
+
+
+def _set(clock, *args):
+    clock.now_utc = pytz.utc.localize(datetime(*args))
+
+
+def _london(cache: PrayerTimesCache, day: date):
+    cache.put("London", "United Kingdom", day, TIMINGS, day.strftime("%d %b %Y"), "Europe/London", 51.5, -0.12)
+
+
+def test_entry_expires_at_the_city_local_midnight(clock, tmp_path):
+    cache = PrayerTimesCache(path=str(tmp_path / "cache.json"))
+    _london(cache, date(2026, 1, 15))
+
+    _set(clock, 2026, 1, 15, 23, 59)
+    assert cache.get("London", "United Kingdom", date(2026, 1, 15)) == (TIMINGS, "15 Jan 2026")
+
+    _set(clock, 2026, 1, 16, 0, 0)
+    assert cache.get("London", "United Kingdom", date(2026, 1, 15)) is None
+    assert len(cache) == 0
+
+
+def test_expiry_follows_daylight_saving(clock, tmp_path):
+    cache = PrayerTimesCache(path=str(tmp_path / "cache.json"))
+    _london(cache, date(2026, 7, 1))
+
+    # Local midnight is 23:00 UTC in British Summer Time
+    _set(clock, 2026, 7, 1, 22, 59)
+    assert cache.get("London", "United Kingdom", date(2026, 7, 1))
+    _set(clock, 2026, 7, 1, 23, 0)
+    assert cache.get("London", "United Kingdom", date(2026, 7, 1)) is None
+
+
+def test_lookup_defaults_to_the_city_local_date(clock, tmp_path):
+    cache = PrayerTimesCache(path=str(tmp_path / "cache.json"))
+    _london(cache, date(2026, 1, 15))
+
+    # Already the 16th in Singapore, still the 15th in London
+    _set(clock, 2026, 1, 15, 20, 0)
+    assert cache.local_date("London", "United Kingdom") == date(2026, 1, 15)
+    assert cache.get("london ", "UNITED  kingdom") == (TIMINGS, "15 Jan 2026")
+    assert cache.get("Paris", "France") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock, tmp_path):
+    cache = PrayerTimesCache(max_entries=2, path=str(tmp_path / "cache.json"))
+    _london(cache, date(2026, 1, 15))
+    _london(cache, date(2026, 1, 16))
+    assert cache.get("London", "United Kingdom", date(2026, 1, 15))
+    _london(cache, date(2026, 1, 17))
+
+    assert cache.evictions == 1
+    assert cache.get("London", "United Kingdom", date(2026, 1, 16)) is None
+    assert cache.get("London", "United Kingdom", date(2026, 1, 15))
+
+
+def test_persisted_entries_survive_a_restart_until_they_expire(clock, tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = PrayerTimesCache(path=path)
+    _london(cache, date(2026, 1, 15))
+    _london(cache, date(2026, 1, 16))
+    asyncio.run(cache.persist())
+
+    _set(clock, 2026, 1, 16, 9, 0)
+    restored = PrayerTimesCache(path=path)
+    assert restored.load() == 1
+    assert restored.city_info("London", "United Kingdom").timezone == "Europe/London"
+    assert restored.get("London", "United Kingdom") == (TIMINGS, "16 Jan 2026")
+
+
+def test_reserved_room_is_kept_on_top_of_the_configured_size(clock, tmp_path):
+    cache = PrayerTimesCache(max_entries=2, path=str(tmp_path / "cache.json"))
+    cache.reserve(3)
+    for day in range(15, 20):
+        _london(cache, date(2026, 1, day))
+    assert cache.evictions == 0
+
+    _london(cache, date(2026, 1, 20))
+    assert cache.evictions == 1
+    assert len(cache) == 5
+
+
+def test_days_already_over_are_not_stored(clock, tmp_path):
+    cache = PrayerTimesCache(path=str(tmp_path / "cache.json"))
+    for day in range(1, 17):
+        _london(cache, date(2026, 1, day))
+    assert len(cache) == 2
+    # The location is still learned from them
+    assert cache.city_info("London", "United Kingdom").timezone == "Europe/London"
+
+
+def test_reserved_size_survives_a_restart(clock, tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = PrayerTimesCache(max_entries=1, path=path)
+    cache.reserve(2)
+    _london(cache, date(2026, 1, 15))
+    _london(cache, date(2026, 1, 16))
+    _london(cache, date(2026, 1, 17))
+    asyncio.run(cache.persist())
+
+    restored = PrayerTimesCache(max_entries=1, path=path)
+    assert restored.load() == 3
+    assert restored.max_entries == 3
+
+
+def test_each_worker_persists_to_its_own_file():
+    assert worker_cache_path(".cache/prayer_times.json", workers=1, index=0) == ".cache/prayer_times.json"
+    paths = {worker_cache_path(".cache/prayer_times.json", workers=3, index=index) for index in range(3)}
+    assert paths == {f".cache/prayer_times.worker{index}.json" for index in range(3)}
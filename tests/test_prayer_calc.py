@@ -0,0 +1,90 @@
+"""Tests for the offline prayer time engine (bot.utils.prayer_calc)"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from bot.utils.muis_prayer_csv import MuisTimetable
+from bot.utils.prayer_calc import (
+    INVALID_TIME, MUIS, SINGAPORE_COORDINATES, _adjust_high_latitude, calculate_calendars,
+    calculate_prayer_times, compute_prayer_times, date_range, format_times, month_bounds
+)
+
+LONDON = (51.5074, -0.1278, "Europe/London")
+TROMSO = (69.6492, 18.9553, "Europe/Oslo")
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@pytest.mark.parametrize("day, expected", [
+    # Published sunrise, solar noon and sunset for London (same 0.833° rise/set altitude as MWL)
+    (date(2026, 6, 21), {"Sunrise": "04:43", "Dhuhr": "13:02", "Maghrib": "21:21"}),
+    (date(2026, 12, 21), {"Sunrise": "08:04", "Dhuhr": "11:58", "Maghrib": "15:53"}),
+])
+def test_london_solstices(day, expected):
+    timings = calculate_prayer_times(*LONDON, day)
+    for prayer, value in expected.items():
+        assert abs(_minutes(timings[prayer]) - _minutes(value)) <= 1, prayer
+
+
+def test_matches_muis_timetable():
+    timetable = MuisTimetable()
+    assert timetable.load()
+    days = [date(2026, 1, 1), date(2026, 3, 20), date(2026, 6, 21), date(2026, 9, 23), date(2026, 12, 31)]
+    calendar = calculate_calendars([SINGAPORE_COORDINATES], days, MUIS)[0]
+    for day in days:
+        official = timetable.get(day)
+        for prayer in ("Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"):
+            assert abs(_minutes(official[prayer]) - _minutes(calendar[day][prayer])) <= 2, (day, prayer)
+
+
+def test_high_latitude_summer_uses_angle_based_rule():
+    # The sun never gets 18° below London's horizon around the June solstice
+    latitude, longitude, _ = LONDON
+    times = compute_prayer_times([latitude], [longitude], [date(2026, 6, 21)], 1.0)
+    night = (times["Sunrise"] - times["Sunset"]) % 24
+    assert times["Fajr"] == pytest.approx(times["Sunrise"] - 18 / 60 * night)
+    assert times["Isha"] == pytest.approx(times["Sunset"] + 17 / 60 * night)
+
+
+def test_polar_night_has_no_sunrise():
+    timings = calculate_prayer_times(*TROMSO, date(2026, 12, 21))
+    assert timings["Sunrise"] == INVALID_TIME
+    assert timings["Maghrib"] == INVALID_TIME
+    assert timings["Dhuhr"] != INVALID_TIME
+
+
+def test_format_times_rounds_to_nearest_minute():
+    hours = np.array([12.0, 12 + 29 / 3600, 12 + 31 / 3600, 23 + 59.6 / 60, -0.5, np.nan])
+    assert list(format_times(hours)) == ["12:00", "12:00", "12:01", "00:00", "23:30", INVALID_TIME]
+
+
+def test_adjust_high_latitude():
+    base = np.array([6.0, 6.0, 6.0])
+    night = np.array([6.0, 6.0, 6.0])
+    # Portion is 18/60 of a 6 hour night: 1.8 hours before sunrise
+    times = np.array([5.0, 3.0, np.nan])
+    adjusted = _adjust_high_latitude(times, base, 18, night, before=True)
+    assert adjusted == pytest.approx([5.0, 4.2, 4.2])
+
+    adjusted = _adjust_high_latitude(np.array([19.0, 23.0]), np.array([18.0, 18.0]), 17, np.array([6.0, 6.0]), before=False)
+    assert adjusted == pytest.approx([19.0, 19.7])
+
+
+@pytest.mark.parametrize("year, month, first, last", [
+    (2026, 1, date(2026, 1, 1), date(2026, 1, 31)),
+    (2026, 2, date(2026, 2, 1), date(2026, 2, 28)),
+    (2028, 2, date(2028, 2, 1), date(2028, 2, 29)),
+    (2026, 12, date(2026, 12, 1), date(2026, 12, 31)),
+])
+def test_month_bounds(year, month, first, last):
+    assert month_bounds(year, month) == (first, last)
+
+
+def test_date_range_is_inclusive():
+    days = date_range(date(2026, 12, 30), date(2027, 1, 2))
+    assert days == [date(2026, 12, 30), date(2026, 12, 31), date(2027, 1, 1), date(2027, 1, 2)]
@@ -0,0 +1,78 @@
+"""Tests for prayer reminder scheduling (bot.schedulers.prayer_scheduler)"""
+
+import asyncio
+
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import insert, update
+
+from bot.schedulers import city_groups, prayer_scheduler
+from bot.schedulers.city_groups import LocalDayTracker
+from database.models import User, UserSettings
+
+TIMINGS = {"Fajr": "05:10", "Dhuhr": "12:05", "Asr": "15:20", "Maghrib": "17:45", "Isha": "19:05"}
+TIMEZONES = {"London": "Europe/London", "Cairo": "Africa/Cairo"}
+USERS = {1: "London", 2: "London", 3: "London", 4: "Cairo"}
+COUNTRIES = {"London": "United Kingdom", "Cairo": "Egypt"}
+
+
+@pytest.fixture
+def resolved(sqlite_db, monkeypatch):
+    """Per-user mode over USERS; returns the cities whose schedule was resolved"""
+    resolved = []
+
+    async def resolve_group_schedule(city, country):
+        resolved.append(city)
+        return TIMINGS, pytz.timezone(TIMEZONES[city])
+
+    monkeypatch.setattr(prayer_scheduler, "REMINDER_FANOUT_ENABLED", False)
+    monkeypatch.setattr(prayer_scheduler, "resolve_group_schedule", resolve_group_schedule)
+    monkeypatch.setattr(prayer_scheduler, "_synced_days", LocalDayTracker())
+    monkeypatch.setattr(city_groups, "get_location_timezone", lambda city, country: TIMEZONES[city])
+
+    with sqlite_db.begin() as conn:
+        conn.execute(insert(User), [{"id": user_id, "is_active": True} for user_id in USERS])
+        conn.execute(insert(UserSettings), [
+            {"user_id": user_id, "prayer_reminders": True, "city": city, "country": COUNTRIES[city]}
+            for user_id, city in USERS.items()
+        ])
+    return resolved
+
+
+def _passes(count: int, between=None):
+    """Run the per-user scheduling pass count times; returns the users with jobs after each"""
+    async def scenario():
+        scheduler = AsyncIOScheduler(timezone=pytz.utc)
+        scheduler.start(paused=True)
+        users = []
+        for index in range(count):
+            if index and between:
+                between()
+            await prayer_scheduler.schedule_all_prayer_reminders(scheduler, object())
+            jobs = scheduler.get_jobs()
+            users.append({user_id: sum(1 for job in jobs if job.args[1] == user_id) for user_id in USERS})
+        scheduler.shutdown(wait=False)
+        return users
+    return asyncio.run(scenario())
+
+
+def test_per_user_pass_resolves_each_city_once(resolved):
+    [users] = _passes(1)
+    assert sorted(resolved) == ["Cairo", "London"]
+    # Every prayer at both offsets for every subscriber
+    assert users == {1: 10, 2: 10, 3: 10, 4: 10}
+
+
+def test_per_user_pass_skips_cities_already_synced_today(resolved):
+    _passes(2)
+    assert sorted(resolved) == ["Cairo", "London"]
+
+
+def test_per_user_pass_drops_jobs_of_unsubscribed_users(resolved, sqlite_db):
+    def unsubscribe():
+        with sqlite_db.begin() as conn:
+            conn.execute(update(UserSettings).where(UserSettings.user_id == 2).values(prayer_reminders=False))
+
+    _, after = _passes(2, between=unsubscribe)
+    assert after == {1: 10, 2: 0, 3: 10, 4: 10}
@@ -0,0 +1,71 @@
+"""Tests for the prayer calendar prefetch (bot.schedulers.prefetch_scheduler)"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytz
+
+from bot.schedulers import prefetch_scheduler
+from bot.utils.prayer_cache import PrayerTimesCache
+from bot.utils.prayer_calc import month_bounds
+
+TIMINGS = {"Fajr": "05:00", "Sunrise": "06:30", "Dhuhr": "12:30", "Asr": "15:45", "Maghrib": "18:20", "Isha": "19:40"}
+CITIES = [("Kuala Lumpur", "Malaysia"), ("Jakarta", "Indonesia"), ("Brunei", "Brunei")]
+
+
+def test_months_to_prefetch_adds_next_month_within_lead_days():
+    assert prefetch_scheduler.months_to_prefetch(date(2026, 1, 20), lead_days=7) == [(2026, 1)]
+    assert prefetch_scheduler.months_to_prefetch(date(2026, 1, 25), lead_days=7) == [(2026, 1), (2026, 2)]
+    assert prefetch_scheduler.months_to_prefetch(date(2026, 12, 30), lead_days=7) == [(2026, 12), (2027, 1)]
+
+
+def test_window_days_runs_to_the_end_of_the_last_month():
+    assert prefetch_scheduler.window_days(date(2026, 1, 20), lead_days=7) == 12
+    assert prefetch_scheduler.window_days(date(2026, 1, 25), lead_days=7) == 35
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PrayerTimesCache(max_entries=5, path=str(tmp_path / "cache.json"))
+    monkeypatch.setattr(prefetch_scheduler, "prayer_cache", cache)
+    monkeypatch.setattr(prefetch_scheduler, "local_calc_available", lambda: False)
+
+    async def get_user_cities():
+        return CITIES
+
+    async def fetch_prayer_calendar(city, country, year, month):
+        # Like Aladhan, a calendar covers the whole month, past days included
+        first, last = month_bounds(year, month)
+        for offset in range((last - first).days + 1):
+            day = first + timedelta(days=offset)
+            cache.put(city, country, day, TIMINGS, day.strftime("%d %b %Y"), "Asia/Kuala_Lumpur")
+        return last.day
+
+    monkeypatch.setattr(prefetch_scheduler, "get_user_cities", get_user_cities)
+    monkeypatch.setattr(prefetch_scheduler, "fetch_prayer_calendar", fetch_prayer_calendar)
+    return cache
+
+
+def test_prefetch_reserves_its_window_and_evicts_nothing(cache, caplog):
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(prefetch_scheduler.prefetch_prayer_calendars())
+
+    assert cache.evictions == 0
+    assert "evicted" not in caplog.text
+    # Every remaining day of every prefetched month is served from the cache
+    for city, country in CITIES:
+        today = datetime.now(pytz.timezone("Asia/Kuala_Lumpur")).date()
+        for year, month in prefetch_scheduler.months_to_prefetch(today):
+            assert prefetch_scheduler._month_cached(city, country, year, month, today)
+
+
+def test_prefetch_logs_evictions(cache, monkeypatch, caplog):
+    # Undersize the reservation to force the prefetch to evict its own days
+    monkeypatch.setattr(cache, "reserve", lambda entries: None)
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(prefetch_scheduler.prefetch_prayer_calendars())
+
+    assert cache.evictions > 0
+    assert f"evicted {cache.evictions} cache entries" in caplog.text
@@ -0,0 +1,115 @@
+"""Tests for the startup reconcile of stored schedules (bot.schedulers.reconcile)"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import insert
+
+from bot.schedulers import prayer_scheduler, reconcile
+from bot.schedulers.city_groups import LocalDayTracker
+from bot.schedulers.job_store import PersistentJobStore, set_reconciled_at
+from database.models import User, UserSettings
+
+TIMINGS = {"Fajr": "05:10", "Dhuhr": "12:05", "Asr": "15:20", "Maghrib": "17:45", "Isha": "19:05"}
+TIMEZONES = {"London": "Europe/London", "Cairo": "Africa/Cairo"}
+
+
+@pytest.fixture
+def calls(sqlite_db, monkeypatch):
+    """Records which city groups were resolved and which adkar pass ran"""
+    calls = {"resolved": [], "adkar": []}
+
+    async def resolve_group_schedule(city, country):
+        calls["resolved"].append(city)
+        return TIMINGS, pytz.timezone(TIMEZONES[city])
+
+    async def schedule_all_adkar(scheduler, bot):
+        calls["adkar"].append("rebuild")
+
+    async def schedule_adkar_fanout(scheduler, bot, only_missing=False):
+        calls["adkar"].append("only_missing" if only_missing else "all")
+        return 0
+
+    async def sync_interval_slots(scheduler, bot):
+        return 0
+
+    monkeypatch.setattr(prayer_scheduler, "resolve_group_schedule", resolve_group_schedule)
+    monkeypatch.setattr(prayer_scheduler, "_synced_days", LocalDayTracker())
+    monkeypatch.setattr(reconcile, "REMINDER_FANOUT_ENABLED", True)
+    monkeypatch.setattr(reconcile, "schedule_all_adkar", schedule_all_adkar)
+    monkeypatch.setattr(reconcile, "schedule_adkar_fanout", schedule_adkar_fanout)
+    monkeypatch.setattr(reconcile, "sync_interval_slots", sync_interval_slots)
+    return calls
+
+
+def _subscribe(engine, user_id: int, city: str, country: str):
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": user_id, "is_active": True}])
+        conn.execute(insert(UserSettings), [{"user_id": user_id, "prayer_reminders": True, "city": city, "country": country}])
+
+
+def _reconcile(loaded: int, reconciled: bool = True, before=None):
+    """Run reconcile_schedules as after a restart that loaded this many stored jobs"""
+    async def scenario():
+        scheduler = AsyncIOScheduler(timezone=pytz.utc)
+        scheduler.start(paused=True)
+        if before:
+            await before(scheduler)
+        if reconciled:
+            await set_reconciled_at(datetime.now(pytz.utc))
+        store = PersistentJobStore()
+        store.loaded = loaded
+        await reconcile.reconcile_schedules(scheduler, object(), store)
+        fanout_jobs = sorted(job.id for job in scheduler.get_jobs())
+        scheduler.shutdown(wait=False)
+        return fanout_jobs
+    return asyncio.run(scenario())
+
+
+def test_nothing_stored_rebuilds_every_schedule(sqlite_db, calls):
+    _subscribe(sqlite_db, 1, "London", "United Kingdom")
+    _subscribe(sqlite_db, 2, "Cairo", "Egypt")
+
+    jobs = _reconcile(loaded=0)
+    assert sorted(calls["resolved"]) == ["Cairo", "London"]
+    assert calls["adkar"] == ["rebuild"]
+    # Every prayer at both offsets for both city groups
+    assert len(jobs) == 20
+
+
+def test_stored_schedules_only_get_missing_groups(sqlite_db, calls):
+    _subscribe(sqlite_db, 1, "London", "United Kingdom")
+    _subscribe(sqlite_db, 2, "Cairo", "Egypt")
+
+    async def london_already_scheduled(scheduler):
+        london = await prayer_scheduler.load_location_group(
+            "London", "United Kingdom", UserSettings.prayer_reminders == True
+        )
+        await prayer_scheduler.schedule_group_prayer_fanout(scheduler, object(), london)
+        calls["resolved"].clear()
+
+    jobs = _reconcile(loaded=10, before=london_already_scheduled)
+    assert calls["resolved"] == ["Cairo"]
+    assert calls["adkar"] == ["only_missing"]
+    assert len(jobs) == 20
+
+
+def test_first_reconcile_rebuilds_even_with_stored_jobs(sqlite_db, calls):
+    _subscribe(sqlite_db, 1, "London", "United Kingdom")
+
+    _reconcile(loaded=10, reconciled=False)
+    assert calls["resolved"] == ["London"]
+    assert calls["adkar"] == ["rebuild"]
+
+
+def test_reconcile_records_when_it_ran(sqlite_db, calls):
+    _subscribe(sqlite_db, 1, "London", "United Kingdom")
+    _reconcile(loaded=0, reconciled=False)
+
+    calls["adkar"].clear()
+    _reconcile(loaded=10, reconciled=False)
+    # The first run stored its timestamp, so this one only fills gaps
+    assert calls["adkar"] == ["only_missing"]
@@ -0,0 +1,123 @@
+"""Tests for the settings cache and its NOTIFY invalidation (bot.utils.settings_cache)"""
+
+import asyncio
+
+from sqlalchemy import func, select
+
+import database.db
+from bot.utils import settings_cache as settings_cache_module
+from bot.utils.settings_cache import SettingsCache, SettingsSnapshot
+
+
+def _snapshot(user_id: int, **values) -> SettingsSnapshot:
+    settings = {
+        "prayer_reminders": False, "morning_adkar": False, "evening_adkar": False, "sleep_adkar": False,
+        "allahu_allah_interval": None, "allahu_allah_phase": None,
+        "city": "Singapore", "country": "Singapore", "friday_khutbah": True,
+    }
+    return SettingsSnapshot(user_id=user_id, **{**settings, **values})
+
+
+def _cache(**kwargs) -> SettingsCache:
+    cache = SettingsCache(**{"max_entries": 100, "ttl_seconds": 60, **kwargs})
+    cache.enabled = True
+    return cache
+
+
+def _notify(cache: SettingsCache, payload: str, sender: str = "other-worker"):
+    """Deliver a change notification as the listener connection would"""
+    cache._on_notification(None, 0, cache.channel, f"{sender}:{payload}")
+
+
+def test_other_processes_changes_drop_the_entry():
+    cache = _cache()
+    cache.put(_snapshot(1))
+    cache.put(_snapshot(2))
+
+    _notify(cache, "1")
+    assert cache.get(1) is None
+    assert cache.get(2) == _snapshot(2)
+
+
+def test_change_of_every_user_empties_the_cache():
+    cache = _cache()
+    cache.put(_snapshot(1))
+    cache.put(_snapshot(2))
+
+    _notify(cache, "*")
+    assert len(cache) == 0
+
+
+def test_own_notifications_are_ignored():
+    cache = _cache()
+    cache.put(_snapshot(1))
+
+    _notify(cache, "1", sender=settings_cache_module._SENDER)
+    assert cache.get(1) == _snapshot(1)
+    assert cache.invalidations == 0
+
+
+def test_read_racing_a_notification_is_not_stored():
+    cache = _cache()
+    # A miss reads the row, and another process changes it before the read is stored
+    generation = cache.generation
+    _notify(cache, "1")
+    cache.put(_snapshot(1), generation)
+    assert cache.get(1) is None
+
+    cache.put(_snapshot(1), cache.generation)
+    assert cache.get(1) == _snapshot(1)
+
+
+def test_notification_names_the_sender_and_user():
+    cache = _cache()
+    payload = cache.notification(7).clauses.clauses[1].value
+    assert payload == f"{settings_cache_module._SENDER}:7"
+
+
+def test_expired_and_least_recently_used_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(settings_cache_module.time, "monotonic", lambda: now[0])
+    cache = _cache(max_entries=2, ttl_seconds=10)
+    cache.put(_snapshot(1))
+    cache.put(_snapshot(2))
+    cache.get(1)
+    cache.put(_snapshot(3))
+    assert (cache.get(2), cache.evictions) == (None, 1)
+
+    now[0] += 10
+    assert cache.get(1) is None
+
+
+def test_disconnected_listener_bypasses_the_cache():
+    cache = _cache()
+    cache.notify = True
+    cache.put(_snapshot(1))
+
+    asyncio.run(cache._release())
+    cache.put(_snapshot(2))
+    assert (cache.get(1), cache.get(2)) == (None, None)
+
+
+def test_other_processes_writes_reach_the_cache_over_notify(postgres_db):
+    cache = _cache()
+    cache.notify = True
+
+    async def scenario():
+        await cache.start()
+        cache.put(_snapshot(1))
+        cache.put(_snapshot(2))
+        async with database.db.async_session_maker() as session:
+            await session.execute(select(func.pg_notify(cache.channel, "other-worker:1")))
+            # Sent by this process, so ignored
+            await session.execute(select(cache.notification(2)))
+            await session.commit()
+        for _ in range(50):
+            if 1 not in cache._entries:
+                break
+            await asyncio.sleep(0.1)
+        cached = (cache.get(1), cache.get(2))
+        await cache.stop()
+        return cached
+
+    assert asyncio.run(scenario()) == (None, _snapshot(2))
@@ -0,0 +1,89 @@
+"""Tests for request coalescing (bot.utils.single_flight)"""
+
+import asyncio
+
+from bot.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight("test_shared")
+        calls = []
+
+        async def lookup(city):
+            calls.append(city)
+            await asyncio.sleep(0.01)
+            return {"city": city}
+
+        results = await asyncio.gather(*(flight.do(lookup, "Singapore") for _ in range(5)), flight.do(lookup, "London"))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert sorted(calls) == ["London", "Singapore"]
+    assert all(result is results[0] for result in results[:5])
+    assert flight.stats() == {"calls": 6, "executions": 2, "coalesced": 4, "in_flight": 0}
+
+
+def test_key_fn_coalesces_equivalent_arguments():
+    async def scenario():
+        flight = SingleFlight("test_key_fn", key_fn=lambda city: city.casefold())
+        calls = []
+
+        async def lookup(city):
+            calls.append(city)
+            await asyncio.sleep(0.01)
+            return city
+
+        await asyncio.gather(flight.do(lookup, "Singapore"), flight.do(lookup, "SINGAPORE"))
+        return calls
+
+    assert asyncio.run(scenario()) == ["Singapore"]
+
+
+def test_finished_calls_are_not_cached():
+    async def scenario():
+        flight = SingleFlight("test_not_cached")
+        calls = []
+
+        async def lookup(city):
+            calls.append(city)
+            return city
+
+        await flight.do(lookup, "Singapore")
+        await flight.do(lookup, "Singapore")
+        return calls
+
+    assert asyncio.run(scenario()) == ["Singapore", "Singapore"]
+
+
+def test_exceptions_are_shared():
+    async def scenario():
+        flight = SingleFlight("test_exceptions")
+
+        async def lookup(city):
+            await asyncio.sleep(0.01)
+            raise ValueError(city)
+
+        return await asyncio.gather(flight.do(lookup, "Nowhere"), flight.do(lookup, "Nowhere"), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, ValueError) and first is second
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight("test_cancel")
+
+        async def lookup(city):
+            await asyncio.sleep(0.02)
+            return city
+
+        impatient = asyncio.ensure_future(flight.do(lookup, "Singapore"))
+        patient = asyncio.ensure_future(flight.do(lookup, "Singapore"))
+        await asyncio.sleep(0.005)
+        impatient.cancel()
+        return await patient, impatient
+
+    result, impatient = asyncio.run(scenario())
+    assert result == "Singapore"
+    assert impatient.cancelled()
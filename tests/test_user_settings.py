@@ -0,0 +1,167 @@
+"""Tests for the user and settings repository (bot.utils.user_settings)"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import insert, select, update
+
+import database.db
+from bot.utils import settings_cache as settings_cache_module, user_settings
+from bot.utils.settings_cache import SettingsCache
+from database.models import Subscription, User, UserSettings
+
+USER_ID = 1
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """A fresh settings cache in place of the shared one"""
+    cache = SettingsCache(max_entries=100, ttl_seconds=60)
+    cache.notify, cache.enabled = False, True
+    monkeypatch.setattr(settings_cache_module, "settings_cache", cache)
+    monkeypatch.setattr(user_settings, "settings_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    """Snapshots passed to sync_subscriptions (its statement needs Postgres, so it isn't run here)"""
+    synced = []
+
+    async def sync_subscriptions(session, snapshot):
+        synced.append(snapshot)
+
+    monkeypatch.setattr(user_settings, "sync_subscriptions", sync_subscriptions)
+    return synced
+
+
+@pytest.fixture
+def user(sqlite_db, synced):
+    with sqlite_db.begin() as conn:
+        conn.execute(insert(User), [{"id": USER_ID, "is_active": True}])
+    return sqlite_db
+
+
+def _write(*calls, commit: bool = True):
+    """Run each (function, kwargs) in one session; returns their results"""
+    async def scenario():
+        async with database.db.async_session_maker() as session:
+            results = [await function(session, USER_ID, **kwargs) for function, kwargs in calls]
+            if commit:
+                await session.commit()
+            else:
+                await session.rollback()
+            return results
+    return asyncio.run(scenario())
+
+
+def _settings_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(UserSettings.user_id, UserSettings.morning_adkar, UserSettings.city)).all()
+
+
+def test_first_write_creates_the_settings_row(user, cache, synced):
+    [snapshot] = _write((user_settings.update_user_settings, {"morning_adkar": True}))
+
+    assert snapshot.morning_adkar and snapshot.city == "Singapore"
+    assert _settings_rows(user) == [(USER_ID, True, "Singapore")]
+    assert synced == [snapshot]
+
+
+def test_repeated_writes_update_the_same_row(user, cache):
+    # A double tap before the row exists: both writes go through the upsert
+    _write(
+        (user_settings.update_user_settings, {"morning_adkar": True}),
+        (user_settings.update_user_settings, {"city": "Cairo", "country": "Egypt"}),
+    )
+    assert _settings_rows(user) == [(USER_ID, True, "Cairo")]
+
+
+def test_committed_write_is_cached(user, cache):
+    [snapshot] = _write((user_settings.update_user_settings, {"morning_adkar": True}))
+    assert cache.get(USER_ID) == snapshot
+
+
+def test_rolled_back_write_is_not_cached(user, cache):
+    _write((user_settings.update_user_settings, {"morning_adkar": True}), commit=False)
+    assert cache.get(USER_ID) is None
+    assert _settings_rows(user) == []
+
+
+def test_write_matching_the_cache_is_skipped(user, cache, synced):
+    _write((user_settings.update_user_settings, {"morning_adkar": True}))
+    # Changed behind the cache's back: a skipped write leaves it alone
+    with user.begin() as conn:
+        conn.execute(update(UserSettings).values(morning_adkar=False))
+
+    [snapshot] = _write((user_settings.update_user_settings, {"morning_adkar": True}))
+    assert snapshot.morning_adkar
+    assert _settings_rows(user) == [(USER_ID, False, "Singapore")]
+    assert len(synced) == 1
+
+
+def test_write_without_create_leaves_users_without_settings_alone(user, cache):
+    [snapshot] = _write((user_settings.update_user_settings, {"create": False, "prayer_reminders": False}))
+    assert snapshot is None
+    assert _settings_rows(user) == []
+
+
+# The rest needs Postgres: xmax, data-modifying CTEs, and CTEs reading the row as it was
+# before the statement
+
+def _rows(*columns):
+    async def scenario():
+        async with database.db.async_session_maker() as session:
+            return (await session.execute(select(*columns))).all()
+    return asyncio.run(scenario())
+
+
+def _register(**profile):
+    profile = {"username": "user", "first_name": "First", "last_name": None, **profile}
+    [status] = _write((user_settings.register_user, profile))
+    return status
+
+
+def test_registration_tells_inserts_from_updates(postgres_db, cache):
+    assert _register() == "registered"
+    # Nothing changed: no write at all
+    assert _register() is None
+    assert _register(username="renamed") == "updated"
+
+    assert _rows(UserSettings.user_id) == [(USER_ID,)]
+    assert cache.get(USER_ID).user_id == USER_ID
+
+
+def test_registration_reactivates_blocked_users(postgres_db, cache):
+    _register()
+
+    async def deactivate():
+        async with database.db.async_session_maker() as session:
+            await session.execute(update(User).values(is_active=False))
+            await session.commit()
+
+    asyncio.run(deactivate())
+    assert _register() == "reactivated"
+    assert _register() is None
+
+
+def test_upsert_rewrites_subscriptions(postgres_db, cache):
+    _register()
+    _write(
+        (user_settings.update_user_settings, {"morning_adkar": True, "prayer_reminders": True}),
+        (user_settings.update_user_settings, {"prayer_reminders": False}),
+    )
+    assert sorted(feature for feature, in _rows(Subscription.feature)) == ["friday_khutbah", "morning_adkar"]
+
+
+def test_allahu_allah_returns_the_previous_slot(postgres_db, cache):
+    _register()
+    first, second, off = _write(
+        (user_settings.set_allahu_allah, {"interval": 2, "phase": 1}),
+        (user_settings.set_allahu_allah, {"interval": 3, "phase": 0}),
+        (user_settings.set_allahu_allah, {"interval": None, "phase": None}),
+    )
+    assert first[1] is None
+    assert second[1] == (2, 1)
+    assert off[1] == (3, 0)
+    assert off[0].allahu_allah_interval is None
@@ -0,0 +1,45 @@
+"""Tests for user sharding across scheduler workers (bot.schedulers.workers)"""
+
+from collections import Counter
+
+import pytest
+from sqlalchemy import BigInteger, Column, MetaData, Table, create_engine, insert, select
+
+from bot.schedulers import workers
+
+USER_IDS = range(100_000_000, 100_004_000)
+
+
+def test_single_worker_owns_everyone(monkeypatch):
+    monkeypatch.setattr(workers, "SCHEDULER_WORKERS", 1)
+    assert {workers.user_shard(user_id) for user_id in USER_IDS} == {0}
+    assert all(workers.owns_user(user_id) for user_id in USER_IDS)
+
+
+def test_users_are_spread_evenly(monkeypatch):
+    monkeypatch.setattr(workers, "SCHEDULER_WORKERS", 4)
+    shards = Counter(workers.user_shard(user_id) for user_id in USER_IDS)
+    assert set(shards) == {0, 1, 2, 3}
+    assert min(shards.values()) > len(USER_IDS) / 4 * 0.9
+    # Not the plain modulo other bucketings (e.g. interval phases) use
+    assert any(workers.user_shard(user_id) != user_id % 4 for user_id in USER_IDS)
+
+
+@pytest.mark.parametrize("index", [0, 1, 2])
+def test_each_user_is_owned_by_exactly_its_shard(monkeypatch, index):
+    monkeypatch.setattr(workers, "SCHEDULER_WORKERS", 3)
+    monkeypatch.setattr(workers, "SCHEDULER_WORKER_INDEX", index)
+    for user_id in USER_IDS:
+        assert workers.owns_user(user_id) == (workers.user_shard(user_id) == index)
+
+
+def test_sql_filter_matches_user_shard(monkeypatch):
+    monkeypatch.setattr(workers, "SCHEDULER_WORKERS", 3)
+    monkeypatch.setattr(workers, "SCHEDULER_WORKER_INDEX", 1)
+    users = Table("users", MetaData(), Column("id", BigInteger, primary_key=True))
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        users.create(conn)
+        conn.execute(insert(users), [{"id": user_id} for user_id in USER_IDS])
+        owned = set(conn.execute(select(users.c.id).where(workers.owned_recipient(users.c.id))).scalars())
+    assert owned == {user_id for user_id in USER_IDS if workers.owns_user(user_id)}